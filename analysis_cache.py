@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_prefs(user_prefs):
+    """
+    Canonical form of the preferences so equivalent inputs map to the same key
+    (key order, 5000 vs 5000.0). None (preference-independent analysis) stays None.
+    """
+    if user_prefs is None:
+        return None
+    normalized = {}
+    for key, value in user_prefs.items():
+        if key == "budget":
+            try:
+                value = float(value or 0)
+            except (TypeError, ValueError):
+                value = 0.0
+        normalized[key] = value
+    return normalized
+
+
+def make_cache_key(contract_text, user_prefs, legal_knowledge, prompt_version):
+    """
+    Content-addressed key: hash of the contract text, normalized preferences,
+    legal knowledge and prompt-template version.
+    """
+    parts = {
+        "contract": sha256_text(contract_text),
+        "prefs": normalize_prefs(user_prefs),
+        "legal": sha256_text(legal_knowledge),
+        "prompt_version": prompt_version,
+    }
+    return sha256_text(json.dumps(parts, sort_keys=True))
+
+
+class AnalysisCache:
+    """
+    Disk-backed (SQLite) cache for analyze_contract results.
+    Shared by all Streamlit sessions and processes that point to the same file.
+    Entries expire after ttl_seconds; least recently used entries are evicted
+    once max_entries or max_bytes is exceeded.
+    """
+
+    def __init__(self, path, max_entries=500, max_bytes=50 * 1024 * 1024, ttl_seconds=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _bump(self, conn, name):
+        conn.execute(
+            "INSERT INTO counters(name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self.misses += 1
+                self._bump(conn, "misses")
+                return None
+
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self._bump(conn, "hits")
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries(key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,))
+
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until both limits hold
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._bump(conn, "evictions")
+            count -= 1
+            total -= size
+
+    def stats(self):
+        """
+        Hit/miss counters for this process and across all processes sharing the file.
+        """
+        with self._connect() as conn:
+            totals = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "process_hits": self.hits,
+            "process_misses": self.misses,
+            "hits": totals.get("hits", 0),
+            "misses": totals.get("misses", 0),
+            "evictions": totals.get("evictions", 0),
+            "entries": count,
+            "bytes": total,
+        }
@@ -0,0 +1,164 @@
+from dataclasses import asdict, dataclass
+
+from json_stream import salvage_array
+from scoring import CATEGORIES, parse_amount
+
+# Typed model of the analysis output. The LLM JSON is parsed and validated once;
+# the UI, highlighting and negotiation drafts all read these objects.
+
+FINDING_CATEGORIES = CATEGORIES + ("budget", "missing_protection")
+
+# JSON schema of the analysis response (JSON mode wraps the array in an object)
+FINDINGS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "findings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "issue_name": {"type": "string"},
+                    "preference_category": {"type": "string", "enum": list(FINDING_CATEGORIES)},
+                    "rent_amount": {"type": "number"},
+                    "is_legal_violation": {"type": "boolean"},
+                    "exact_quote": {"type": "string"},
+                    "explanation": {"type": "string"},
+                    "negotiation_tip": {"type": "string"},
+                },
+                "required": [
+                    "issue_name", "preference_category", "rent_amount", "is_legal_violation",
+                    "exact_quote", "explanation", "negotiation_tip",
+                ],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["findings"],
+    "additionalProperties": False,
+}
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+
+@dataclass(slots=True, frozen=True)
+class Finding:
+    issue_name: str
+    preference_category: str
+    rent_amount: float
+    is_legal_violation: bool
+    exact_quote: str
+    explanation: str
+    negotiation_tip: str
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Validates one raw finding, coercing types the model often gets wrong
+        ("false" as a string, "9,200 NIS" as the rent).
+        """
+        return cls(
+            issue_name=str(data.get("issue_name") or "Clause Analysis"),
+            preference_category=str(data.get("preference_category") or ""),
+            rent_amount=parse_amount(data.get("rent_amount", 0)),
+            is_legal_violation=_as_bool(data.get("is_legal_violation", False)),
+            exact_quote=str(data.get("exact_quote") or "").strip(),
+            explanation=str(data.get("explanation") or "No explanation provided."),
+            negotiation_tip=str(data.get("negotiation_tip") or ""),
+        )
+
+    @property
+    def is_suggestion(self):
+        return self.preference_category == "missing_protection"
+
+    @property
+    def is_critical(self):
+        return self.is_legal_violation or self.preference_category == "budget"
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass(slots=True, frozen=True)
+class AnalysisResult:
+    """
+    Findings plus the partitions step 4 needs, computed once:
+    critical (legal violations / budget), ordinary risks and suggestions (missing protections).
+    """
+    findings: tuple
+    critical: tuple
+    ordinary: tuple
+    suggestions: tuple
+
+    @classmethod
+    def from_findings(cls, findings):
+        findings = tuple(findings)
+        risks = [f for f in findings if not f.is_suggestion]
+        return cls(
+            findings=findings,
+            critical=tuple(f for f in risks if f.is_critical),
+            ordinary=tuple(f for f in risks if not f.is_critical),
+            suggestions=tuple(f for f in findings if f.is_suggestion),
+        )
+
+    @property
+    def risks(self):
+        """
+        Risks in display order: critical first, then ordinary.
+        """
+        return self.critical + self.ordinary
+
+    def to_dicts(self):
+        return [f.to_dict() for f in self.findings]
+
+
+def _normalize_category(category):
+    return str(category or "").strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def validate_finding(data):
+    """
+    Returns (Finding, repaired) for one raw item, or (None, False) if it is unusable:
+    not an object, or without a title, quote and explanation.
+    repaired is True when a field had to be coerced to the schema.
+    """
+    if not isinstance(data, dict) or not any(data.get(k) for k in ("issue_name", "exact_quote", "explanation")):
+        return None, False
+
+    category = _normalize_category(data.get("preference_category"))
+    repaired = (
+        category != data.get("preference_category")
+        or not isinstance(data.get("is_legal_violation", False), bool)
+        or not isinstance(data.get("rent_amount", 0), (int, float))
+        or any(field not in data for field in FINDINGS_SCHEMA["properties"]["findings"]["items"]["required"])
+    )
+    return Finding.from_dict(dict(data, preference_category=category)), repaired
+
+
+def salvage_analysis(analysis_json):
+    """
+    Parses a complete, truncated or partly malformed response (bare array, JSON-mode
+    {"findings": [...]} object or fenced) into an AnalysisResult, keeping every valid
+    item. Returns (result, report) - see json_stream.salvage_array for the report keys.
+    """
+    items, report = salvage_array(analysis_json)
+    findings = []
+    for item in items:
+        finding, repaired = validate_finding(item)
+        if finding is None:
+            report["dropped"] += 1
+            continue
+        report["repaired"] += repaired
+        findings.append(finding)
+    return AnalysisResult.from_findings(findings), report
+
+
+def parse_analysis(analysis_json):
+    """
+    Parses and validates the model's JSON into an AnalysisResult.
+    Malformed items are repaired or dropped; this never raises on bad JSON.
+    """
+    return salvage_analysis(analysis_json)[0]
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Persistent record of every completed analysis (SQLite + content-addressed blob directory),
+# so a refresh or a sleep/wake cycle of the app does not throw away paid-for work. A record
+# holds the inputs (PDF, preferences), outputs (findings, highlighted PDF, reports, negotiation
+# drafts), token usage and timings. PDFs are stored once per content hash, however many
+# records use them; retention keeps the store within its record, byte and age limits.
+
+# Unreferenced blob files younger than this are left to the save that is writing them
+STRAY_MIN_AGE_SECONDS = 3600
+
+
+def blob_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """
+    Content-addressed files: root/ab/abcdef... named by the SHA-256 of their bytes.
+    Writing the same bytes twice stores them once.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        digest = blob_digest(data)
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Atomic: readers never see a partly written blob
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        try:
+            with open(self.path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def remove_unknown(self, known, min_age_seconds=STRAY_MIN_AGE_SECONDS):
+        """
+        Deletes the files that are not among the known digests (e.g. temporary files of
+        interrupted writes) and the emptied directories. Recent files may belong to a save
+        still in progress in another process and are kept.
+        """
+        cutoff = time.time() - min_age_seconds
+        for directory, _, files in os.walk(self.root, topdown=False):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    if name not in known and os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+            if directory != self.root and not os.listdir(directory):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    # A blob was just written into it
+                    pass
+
+
+class AnalysisStore:
+    """
+    Analysis records by ID, shared by all sessions and processes that point to the same files.
+    Records expire after ttl_seconds; least recently opened records are dropped once
+    max_records or max_bytes (record JSON plus the blobs only they use) is exceeded, and
+    blobs no record refers to are deleted.
+    """
+
+    def __init__(self, path, blob_dir, max_records=500, max_bytes=500 * 1024 * 1024,
+                 ttl_seconds=90 * 24 * 3600):
+        self.path = path
+        self.blobs = BlobStore(blob_dir)
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " id TEXT PRIMARY KEY, name TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL,"
+                " pdf_blob TEXT NOT NULL, highlighted_blob TEXT, record TEXT NOT NULL, size INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS analyses_accessed ON analyses(accessed)")
+            conn.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS drafts ("
+                " analysis_id TEXT NOT NULL, tone TEXT NOT NULL, text TEXT NOT NULL, updated REAL NOT NULL,"
+                " PRIMARY KEY (analysis_id, tone))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _put_blob(self, conn, data):
+        digest = self.blobs.put(data)
+        conn.execute("INSERT OR IGNORE INTO blobs(digest, size) VALUES (?, ?)", (digest, len(data)))
+        return digest
+
+    def save(self, name, pdf_bytes, highlighted_pdf, **record):
+        """
+        Stores one analysis and returns its ID. record holds the JSON-serializable parts:
+        e.g. contract_text, user_prefs, findings, reports, usage (tokens) and timings.
+        """
+        analysis_id = uuid.uuid4().hex
+        now = time.time()
+        value = json.dumps(record, ensure_ascii=False)
+        with self._lock, self._connect() as conn:
+            pdf_blob = self._put_blob(conn, pdf_bytes)
+            highlighted_blob = self._put_blob(conn, highlighted_pdf) if highlighted_pdf else None
+            conn.execute(
+                "INSERT INTO analyses(id, name, created, accessed, pdf_blob, highlighted_blob, record, size)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (analysis_id, name, now, now, pdf_blob, highlighted_blob, value, len(value.encode("utf-8"))),
+            )
+            self._evict(conn, now)
+        return analysis_id
+
+    def load(self, analysis_id):
+        """
+        The stored analysis as a dict (record fields plus id, name, created, pdf_bytes,
+        highlighted_pdf and drafts {tone: text}, latest last), or None if unknown, expired or incomplete.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT name, created, pdf_blob, highlighted_blob, record FROM analyses WHERE id = ?", (analysis_id,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                return None
+            conn.execute("UPDATE analyses SET accessed = ? WHERE id = ?", (now, analysis_id))
+            drafts = dict(conn.execute(
+                "SELECT tone, text FROM drafts WHERE analysis_id = ? ORDER BY updated", (analysis_id,)
+            ))
+
+        pdf_bytes = self.blobs.get(row[2])
+        if pdf_bytes is None:
+            return None
+        return {
+            **json.loads(row[4]),
+            "id": analysis_id,
+            "name": row[0],
+            "created": row[1],
+            "pdf_bytes": pdf_bytes,
+            "highlighted_pdf": self.blobs.get(row[3]) if row[3] else None,
+            "drafts": drafts,
+        }
+
+    def save_draft(self, analysis_id, tone, text):
+        """
+        Keeps the latest negotiation draft of the analysis per tone.
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO drafts(analysis_id, tone, text, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(analysis_id, tone) DO UPDATE SET text = excluded.text, updated = excluded.updated",
+                (analysis_id, tone, text, time.time()),
+            )
+
+    def _total_bytes(self, conn):
+        records = conn.execute("SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+        blobs = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        return records + blobs
+
+    def _evict(self, conn, now):
+        expired = [r[0] for r in conn.execute("SELECT id FROM analyses WHERE created < ?", (now - self.ttl_seconds,))]
+        self._delete(conn, expired)
+
+        count = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        if count > self.max_records or self._total_bytes(conn) > self.max_bytes:
+            # Least recently opened first, until both limits hold (shared blobs free nothing until their last user goes)
+            for (analysis_id,) in conn.execute("SELECT id FROM analyses ORDER BY accessed ASC").fetchall():
+                if count <= self.max_records and self._total_bytes(conn) <= self.max_bytes:
+                    break
+                self._delete(conn, [analysis_id])
+                count -= 1
+        self._collect_blobs(conn)
+
+    def _delete(self, conn, analysis_ids):
+        for analysis_id in analysis_ids:
+            conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+            conn.execute("DELETE FROM drafts WHERE analysis_id = ?", (analysis_id,))
+        if analysis_ids:
+            self._collect_blobs(conn)
+
+    def _collect_blobs(self, conn):
+        orphans = conn.execute(
+            "SELECT digest FROM blobs WHERE digest NOT IN (SELECT pdf_blob FROM analyses)"
+            " AND digest NOT IN (SELECT highlighted_blob FROM analyses WHERE highlighted_blob IS NOT NULL)"
+        ).fetchall()
+        for (digest,) in orphans:
+            conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self.blobs.delete(digest)
+
+    def compact(self, min_age_seconds=STRAY_MIN_AGE_SECONDS):
+        """
+        Applies the retention limits, deletes blob files no record refers to (e.g. left by an
+        interrupted write, once older than min_age_seconds) and reclaims the free space of the database file.
+        """
+        with self._lock:
+            with self._connect() as conn:
+                self._evict(conn, time.time())
+                known = {r[0] for r in conn.execute("SELECT digest FROM blobs")}
+            self.blobs.remove_unknown(known, min_age_seconds)
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+        return self.stats()
+
+    def stats(self):
+        with self._connect() as conn:
+            records = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+            blobs, blob_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            total = self._total_bytes(conn)
+        return {"records": records, "blobs": blobs, "blob_bytes": blob_bytes, "bytes": total}
@@ -1,321 +1,587 @@
-from openai import OpenAI
+import sys
+import time
+
+_run_started = time.perf_counter()
+
 import streamlit as st
-import fitz
-import io
-from streamlit_pdf_viewer import pdf_viewer
+from resources import cached_file_resource, lazy_import, record_rerun, timing_report
+from scoring import CATEGORIES, apply_preferences, resolve_importance
+from analysis_model import AnalysisResult, Finding
+import tracing
 
+# Local metrics endpoint (/metrics, /metrics.json) - started once per process
+tracing.start_metrics_server()
 
-def local_css(file_name):
-    with open(file_name, encoding="utf-8") as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
 
+def local_css(file_name):
+    # The file is read once per process (re-read only if it changes); the style tag
+    # itself must be emitted on every run because Streamlit rebuilds the page.
+    st.markdown(f'<style>{cached_file_resource(file_name)}</style>', unsafe_allow_html=True)
 
-local_css("style.css")
 
-def highlight_pdf(original_pdf_bytes, analysis_json, user_prefs):
+def load_engine():
     """
-    Highlights the PDF based on user preference importance levels:
-    - Low: No highlighting (user doesn't care)
-    - Medium: Yellow highlighting (might be problematic but acceptable)
-    - High: Red highlighting (critical, cannot compromise)
+    Imports the analysis engine (PyMuPDF, OpenAI) on the steps that need it, and
+    initializes the DeepSeek client once per process using the API key from secrets.
     """
-    import json
-    clean_json = analysis_json.replace("```json", "").replace("```", "").strip()
-    risks = json.loads(clean_json)
+    engine = lazy_import("engine")
+    engine.configure(api_key=st.secrets["DEEPSEEK_API_KEY"])
+    return engine
+
 
-    doc = fitz.open(stream=original_pdf_bytes, filetype="pdf")
+local_css("style.css")
 
-    # Color map based on USER PREFERENCE importance level
-    color_map = {
-        "High": (1, 0, 0),
-        "Medium": (1, 1, 0),
+# --- Page Configuration ---
+st.set_page_config(
+    page_title="RightRent",
+    page_icon="icon_page.svg",
+    layout="wide"
+)
 
+# --- Initialize Session State ---
+if 'step' not in st.session_state:
+    st.session_state.step = 1
+if 'user_prefs' not in st.session_state:
+    st.session_state.user_prefs = {
+        "rent_increase": "Low",
+        "termination": "Low",
+        "repairs": "Low",
+        "pets": "Low",
+        "subletting": "Low",
+        "deposit": "Low",
+        "budget": 0
     }
 
-    for risk in risks:
-        quote = risk.get("exact_quote", "").strip()
-        category = risk.get("preference_category", "")
-        is_legal_violation = risk.get("is_legal_violation", False)
-
-        # LEGAL VIOLATIONS are ALWAYS highlighted in RED, regardless of user preference
-        if is_legal_violation:
-            importance = "High"
-        # Special handling for budget - verify with Python math (AI can't be trusted with math)
-        elif category == "budget":
-            raw_rent = risk.get("rent_amount", 0)
-            try:
-                rent_amount = float(str(raw_rent).replace(',', '').replace('$', '').replace('₪', '').strip())
-            except ValueError:
-                rent_amount = 0
-
-            user_budget = float(user_prefs.get("budget", 0))
-
-            if rent_amount > user_budget:
-                importance = "High"
-            else:
-                importance = "Low"
 
-        else:
-            # Look up the user's importance level for this category
-            importance = user_prefs.get(category, "Medium")  # Default to Medium if unknown
+# --- Navigation ---
+def go_to_step(step_number):
+    st.session_state.step = step_number
+    st.rerun()
 
-        # Skip highlighting for Low importance - user doesn't care
-        # BUT never skip legal violations!
-        if importance == "Low" and not is_legal_violation:
-            continue
 
-        color = color_map.get(importance, (1, 1, 0))  # Default yellow if importance not found
+def apply_user_preferences(doc=None):
+    """
+    Re-applies the current preferences and budget to the stored findings (parsed once,
+    see analysis_model). Runs locally (no API call) - re-drives the step-4 risk lists and highlights.
+    doc: the already opened original PDF (first run after the analysis), consumed here.
+    """
+    engine = load_engine()
+    all_findings = st.session_state.all_findings
+    st.session_state.analysis = AnalysisResult.from_findings(
+        apply_preferences(all_findings.findings, st.session_state.user_prefs)
+    )
+    st.session_state.highlighted_pdf, st.session_state.anchor_report = engine.highlight_pdf_with_report(
+        st.session_state.pdf_bytes, all_findings.findings, st.session_state.user_prefs,
+        anchor_index=st.session_state.get("anchor_index"), doc=doc
+    )
+    st.session_state.highlighted_pdf_hash = lazy_import("pdf_pages").document_hash(st.session_state.highlighted_pdf)
+
+
+# Step-3 status labels per traced phase; the percentages come from the measured phase durations
+PHASE_LABELS = {
+    "extract": "Reading your contract",
+    "retrieval": "Selecting the relevant laws",
+    "prompt_build": "Preparing the analysis",
+    "llm_request": "Checking legal compliance",
+    "highlight": "Highlighting key clauses",
+}
 
-        if len(quote) > 3:
-            for page in doc:
-                # First attempt: exact search
-                text_instances = page.search_for(quote)
 
-                # Second attempt: search first 20 characters if not found
-                if not text_instances and len(quote) > 20:
-                    text_instances = page.search_for(quote[:20])
+# Page-windowed viewer: only the pages around the current one (or the risk pages) are sent,
+# as cached page images; "Full document" embeds the whole PDF as before.
+VIEWER_MODES = ["Around current page", "Pages with risks", "Full document"]
+VIEWER_FULL_MAX_PAGES = 5
 
-                for inst in text_instances:
-                    highlight = page.add_highlight_annot(inst)
-                    highlight.set_colors(stroke=color)
 
-                    # --- ADDED FOR XAI: Attach the explanation to the highlight ---
-                    explanation = risk.get("explanation", "No explanation provided.")
-                    issue_name = risk.get("issue_name", "Clause Analysis")
-                    highlight.set_info(title=issue_name, content=explanation)
+def jump_to_page(page):
+    """
+    Button/select callback (runs before the rerun): shows the given page in the viewer.
+    """
+    st.session_state.viewer_page = page
+    st.session_state.viewer_mode = VIEWER_MODES[0]
 
-                    highlight.update()
 
-    output_stream = io.BytesIO()
-    output_stream.write(doc.tobytes())
-    doc.close()
-    return output_stream.getvalue()
+def jump_to_selected_risk():
+    page = st.session_state.viewer_jump
+    if page:
+        jump_to_page(page)
 
 
-# Initialize the DeepSeek client using the API key from secrets
-client = OpenAI(
-    api_key=st.secrets["DEEPSEEK_API_KEY"],
-    base_url="https://api.deepseek.com"
-)
+def switch_draft_tone():
+    """
+    Tone radio callback: swaps in the memoized draft of the new tone for the same issues,
+    unless the current draft was edited by hand. Drafts still being written wait for Generate.
+    """
+    if st.session_state.get("negotiation_text") != st.session_state.get("pop_generated_msg"):
+        return
+    selection = st.session_state.get("draft_selection")
+    draft = selection and load_engine().get_draft_store().peek(selection, st.session_state.tone_sel)
+    if draft and draft.ready:
+        st.session_state.pop_generated_msg = draft.text
+        st.session_state.negotiation_text = draft.text
+        st.session_state.is_confirmed = False
 
 
-def analyze_contract(contract_text, user_prefs):
+def render_pdf_viewer(anchor_report, risks):
     """
-    Analyzes the contract using Retrieval-Augmented Generation (RAG).
-    Cross-references the contract with legal_context.txt using DeepSeek-R1.
+    Step-4 viewer. In the windowed modes only the needed pages are rasterized (once per
+    document/page, see pdf_pages) and sent to the browser.
     """
-    # 1. Load the Israeli Legal Context (Ground Truth)
-    try:
-        with open("legal_context.txt", "r", encoding="utf-8") as f:
-            legal_knowledge = f.read()
-    except FileNotFoundError:
-        # Fallback if file is missing (crucial for stability)
-        legal_knowledge = "Landlord must fix structural issues. Cash deposit max 3 months. Fair Rental Law 2017 applies."
+    pdf_pages = lazy_import("pdf_pages")
+    pdf_bytes = st.session_state.highlighted_pdf
+    doc_hash = st.session_state.get("highlighted_pdf_hash") or pdf_pages.document_hash(pdf_bytes)
+    page_count = pdf_pages.render_cache.page_count(pdf_bytes, doc_hash)
+    pages_with_risks = pdf_pages.risk_pages(anchor_report)
+
+    if "viewer_mode" not in st.session_state:
+        st.session_state.viewer_mode = VIEWER_MODES[2] if page_count <= VIEWER_FULL_MAX_PAGES else VIEWER_MODES[0]
+    if not st.session_state.get("viewer_page"):
+        st.session_state.viewer_page = pages_with_risks[0] if pages_with_risks else 1
+
+    mode_col, jump_col = st.columns([1.4, 1])
+    with mode_col:
+        mode = st.radio("Viewer", VIEWER_MODES, horizontal=True, key="viewer_mode", label_visibility="collapsed")
+    with jump_col:
+        # Jump-to-risk: loads only the page of the selected finding
+        targets = {}
+        for item in risks:
+            anchor = anchor_report["by_quote"].get(item.exact_quote)
+            if anchor and anchor["page"]:
+                targets.setdefault(anchor["page"], []).append(item.issue_name)
+        st.selectbox(
+            "Jump to risk", [None] + sorted(targets), key="viewer_jump", on_change=jump_to_selected_risk,
+            format_func=lambda p: "📍 Jump to risk..." if p is None else f"Page {p}: {', '.join(targets[p])}",
+            label_visibility="collapsed",
+        )
 
-    # 2. Craft the High-Precision RAG Prompt
-    # We include numerical instructions to ensure the budget check is performed.
-    system_prompt = f"""
-    You are an expert Israeli Legal AI Assistant specializing in residential rental agreements.
-    Your task: Identify clauses that relate to the Tenant's Preferences AND any clauses that VIOLATE Israeli law.
+    if mode == VIEWER_MODES[2]:
+        pdf_viewer = lazy_import("streamlit_pdf_viewer").pdf_viewer
+        pdf_viewer(pdf_bytes, width=pdf_pages.VIEWER_WIDTH, height=900)
+        return
 
-    ### LEGAL KNOWLEDGE BASE (Ground Truth - Israeli Law):
-    {legal_knowledge}
+    if mode == VIEWER_MODES[1]:
+        pages = pages_with_risks or [1]
+    else:
+        current = min(st.session_state.viewer_page, page_count)
+        prev_col, page_col, next_col = st.columns([1, 2, 1])
+        with prev_col:
+            st.button("◀ Previous", on_click=jump_to_page, args=(max(1, current - 1),),
+                      disabled=current <= 1, use_container_width=True)
+        with page_col:
+            st.markdown(f"<p style='text-align: center;'>Page {current} of {page_count}</p>", unsafe_allow_html=True)
+        with next_col:
+            st.button("Next ▶", on_click=jump_to_page, args=(min(page_count, current + 1),),
+                      disabled=current >= page_count, use_container_width=True)
+        pages = pdf_pages.page_window(current, page_count)
+
+    for number in pages:
+        st.image(
+            pdf_pages.render_cache.render(pdf_bytes, number, doc_hash=doc_hash),
+            caption=f"Page {number} of {page_count}", use_container_width=True,
+        )
 
-    ### TENANT PREFERENCES (User Input):
-    {user_prefs}
 
-    ---
-    ### ANALYSIS PROTOCOL:
-
-    **STEP 1 - BUDGET CHECK (MANDATORY):**
-    - Find the monthly rent amount in the contract (usually in NIS/Shekels).
-    - User's maximum budget is: ₪{user_prefs.get('budget', 'Not specified')} per month.
-    - Ensure you convert or recognize the currency correctly as Israeli New Shekels (NIS).
-    - ONLY if rent is GREATER than budget → Include with preference_category "budget".
-    - Do NOT include rent if it is LESS THAN or EQUAL TO the budget - this is fine!
-
-    **STEP 2 - PREFERENCE-BY-PREFERENCE SCAN:**
-    For EACH user preference, search the contract for relevant clauses.
-    Use these EXACT preference_category values:
-    - "rent_increase": Rent adjustment, increase, or indexation clauses
-    - "termination": Early exit, cancellation, or notice period clauses
-    - "repairs": Maintenance and repair responsibility clauses
-    - "pets": Animal/pet policies
-    - "subletting": Sublease or roommate clauses
-    - "deposit": Security deposit, guarantee, or collateral terms
-
-    **STEP 3 - LEGAL VIOLATIONS (CRITICAL):**
-    Cross-reference ALL contract clauses against the Legal Knowledge Base.
-    You MUST identify ANY clause that violates Israeli law, even if the user did not express a preference.
-
-    Key laws to check:
-    - Article 7 & 25H: Landlord must repair structural defects within 30 days
-    - Article 25Y: SECURITY deposit cannot exceed 3 months rent; landlord must notify before using it
-    - Article 25T(b): Tenant cannot be charged for building insurance or brokerage fees
-    - Article 25YG: If landlord has cancellation rights, tenant must have equivalent rights
-    - Article 8: "As-Is" clauses may be void if landlord knew of defects
-
-    **IMPORTANT - These are NOT legal violations:**
-    - Pet policies (allowing or prohibiting pets) - these are landlord's discretion
-    - Pet deposits (separate from security deposit) - these are legal
-    - Requiring landlord consent for subletting - this is standard and legal (Article 22)
-    - Reasonable late fees - these are legal if not excessive
+# Step-3 analysis jobs (see jobs.py): the analysis runs on the engine's worker pool and the
+# session keeps its ticket for the job (also in the URL, so a page reload finds the running or finished job)
+JOB_POLL_SECONDS = 0.25
 
-    ---
-    ### EXACT_QUOTE RULES (CRITICAL FOR PDF HIGHLIGHTING):
-    The "exact_quote" field MUST be a VERBATIM copy-paste from the contract text.
-    - Quote COMPLETE SENTENCES - start from the beginning of a sentence to the period.
-    - Copy the EXACT characters, including punctuation and spacing.
-    - Do NOT paraphrase, summarize, or translate.
-    - Include enough context for clear highlighting (aim for 50-150 characters).
-    - Example GOOD quote: "The Tenant is responsible for all repairs and maintenance, including structural issues."
-    - Example BAD quote: "structural issues" (too short, no context)
 
-    ---
-    ### OUTPUT FORMAT:
-    Return ONLY a valid JSON array. No markdown, no explanation, no ```json``` wrapper.
-
-    Each object MUST have these 7 fields:
-    {{
-        "issue_name": "Brief title",
-        "preference_category": "rent_increase" | "termination" | "repairs" | "pets" | "subletting" | "deposit" | "budget",
-        "rent_amount": 2500,  # <-- NEW: Extract the raw number found in the contract (0 if not budget related)
-        "is_legal_violation": true | false,
-        "exact_quote": "Verbatim text from contract",
-        "explanation": "A transparent justification (XAI) that clearly states: 1) The legal issue/clause involved, 2)
-        Why it is risky according to the Legal Knowledge Base, and 3) How it relates to the specific Tenant Preferences provided.",
-        "negotiation_tip": "How to fix it"
-    }}
-
-    **STEP 4 - GAP ANALYSIS (MISSING PROTECTIONS):**
-    Identify standard protective clauses that are MISSING from this contract.
-    If the contract is silent on these, recommend them as "missing_protection".
-    Examples include:
-    - Maximum repair time (e.g., landlord must fix urgent issues within 24-48 hours).
-    - Grace period for late payment (e.g., 3-5 days before a penalty).
-    - Clear mechanism for renewing the contract (Option).
-    - Professional cleaning requirements (making sure they are mutual).
-    
-    -CRITICAL RULE FOR MISSING CLAUSES: 
-      If a protection is missing because a clause explicitly DENIES it (e.g., 'Tenant has NO option to extend'), 
-      this is NOT a "missing_protection". It is a "termination" or "rent_increase" issue. 
-      In this case, you MUST provide the "exact_quote" from the contract so it can be highlighted.
-      Use "missing_protection" ONLY if the contract is completely silent on the topic.
-
-    # Update the preference_category list in the prompt to include "missing_protection"
-    "preference_category": "rent_increase" | "termination" | ... | "missing_protection" | "budget",
-
-    # Update the exact_quote rule:
-    - If it is a "missing_protection", set "exact_quote" to "N/A (Missing Clause)".
-
-    IMPORTANT: 
-    - Set is_legal_violation to TRUE if the clause violates any Article in the Legal Knowledge Base.
-    - Legal violations MUST always be included, even for "Low" importance user preferences.
-    - If no issues found, return an empty array: []
-    
-     
-    STRICT ADHERENCE REQUIRED:
-    1. You MUST NOT skip any clause that violates Israeli Law.
-    2. You MUST NOT skip the budget check.
-    3. If a clause is identified as 'is_legal_violation: true', it is MANDATORY to include it in the JSON array.
-    4. If a clause is identified as 'is_legal_violation: true' OR it conflicts with a Tenant Preference, it is MANDATORY to include it in the JSON array.
-    
-    FAILURE TO INCLUDE LEGAL VIOLATIONS IS A CRITICAL SYSTEM ERROR.
-    """
-
-
-    # 3. Call DeepSeek Chat (Fast model)
-    # Using 'deepseek-chat' for fast responses (deepseek-reasoner is too slow - 10+ minutes)
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"CONTRACT TEXT TO ANALYZE:\n{contract_text}"},
-        ],
-        temperature=0,
-        stream=False
+def submit_analysis_job(uploaded_file, revision_mode):
+    """
+    Submits the analysis of the uploaded PDF (or its revision against the loaded contract).
+    Submitting the same PDF again joins the existing job instead of paying for a new analysis.
+    """
+    engine = load_engine()
+    pdf_bytes = uploaded_file.getvalue()
+    previous = ()
+    if revision_mode:
+        previous = (st.session_state.contract_text, st.session_state.all_findings.to_dicts())
+    # The payload is shared by everyone who submits the same PDF; preferences and the file name are this session's
+    submitter = {"name": uploaded_file.name, "user_prefs": dict(st.session_state.user_prefs)}
+    _, ticket = engine.get_job_queue().submit(
+        engine.analysis_job_key(pdf_bytes, previous[0] if previous else None), {"pdf_bytes": pdf_bytes},
+        pdf_bytes, *previous, submitter=submitter
     )
+    st.session_state.job_ticket = ticket
+    st.session_state.pop("analysis_id", None)
+    st.query_params.pop("analysis", None)
+    st.query_params["job"] = ticket
+
 
-    # Return the analysis result
-    return response.choices[0].message.content
+def load_job_result(job, submitter):
+    """
+    Loads a finished job into the session like a completed step 3 (preferences and highlights applied locally).
+    submitter: this session's submission data (file name and preferences, see submit_analysis_job).
+    """
+    result = job.result
+    st.session_state.pdf_bytes = job.payload["pdf_bytes"]
+    st.session_state.contract_text = result["contract_text"]
+    st.session_state.contract_name = submitter["name"]
+    st.session_state.revision_report = result["revision_report"]
+    st.session_state.anchor_index = result["anchor_index"]
+    # Parsed and validated once - every later rerun reads the typed model
+    st.session_state.all_findings = result["all_findings"]
+    # The first session to pick up the job highlights the document the job opened (the PDF is
+    # parsed once); sessions that joined the job or reload it later open their own copy
+    apply_user_preferences(doc=result.pop("doc", None))
+    st.session_state.pop("viewer_page", None)
+    st.session_state.retrieval_report = result["retrieval_report"]
+    st.session_state.last_trace = result["trace"]
+    st.session_state.pop("job_ticket", None)
+    record_analysis(job, submitter)
+
+
+def record_analysis(job, submitter):
+    """
+    Saves the finished analysis in the persistent store and puts its ID in the URL, so the
+    result survives server restarts and sleep mode (see analysis_store.py). Every submission
+    gets its own record (its preferences, highlights and drafts), even when it joined another
+    session's job; the ID stays with the submission, never with the shared job.
+    """
+    if "analysis_id" not in submitter:
+        result = job.result
+        submitter["analysis_id"] = load_engine().get_analysis_store().save(
+            submitter["name"], job.payload["pdf_bytes"], st.session_state.highlighted_pdf,
+            contract_text=result["contract_text"],
+            user_prefs=submitter["user_prefs"],
+            findings=result["all_findings"].to_dicts(),
+            anchor_report=st.session_state.anchor_report,
+            retrieval_report=result["retrieval_report"],
+            revision_report=result["revision_report"],
+            from_cache=result["from_cache"],
+            # Token usage and per-phase timings
+            trace=result["trace"],
+        )
+    st.session_state.analysis_id = submitter["analysis_id"]
+    st.query_params.pop("job", None)
+    st.query_params["analysis"] = st.session_state.analysis_id
 
 
-def extract_text_from_pdf(uploaded_file):
+def restore_analysis_from_url():
     """
-    Reads the uploaded PDF file and extracts text from every page.
+    After a page reload (or days later, from a bookmark) the analysis ID in the URL reopens
+    the stored analysis in step 4 without an API call, with its preferences and latest draft.
     """
-    # Open the PDF directly from the Streamlit UploadedFile object
-    doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-    full_text = ""
+    st.session_state.analysis_restored = True
+    record = load_engine().get_analysis_store().load(st.query_params["analysis"])
+    if record is None:
+        st.query_params.pop("analysis", None)
+        return
+    st.session_state.user_prefs = dict(record["user_prefs"])
+    st.session_state.pdf_bytes = record["pdf_bytes"]
+    st.session_state.contract_text = record["contract_text"]
+    st.session_state.contract_name = record["name"]
+    st.session_state.revision_report = record["revision_report"]
+    st.session_state.pop("anchor_index", None)
+    st.session_state.all_findings = AnalysisResult.from_findings(
+        Finding.from_dict(item) for item in record["findings"]
+    )
+    if record["highlighted_pdf"] is None:
+        apply_user_preferences()
+    else:
+        # Stored with these preferences - no re-highlighting needed
+        st.session_state.analysis = AnalysisResult.from_findings(
+            apply_preferences(st.session_state.all_findings.findings, st.session_state.user_prefs)
+        )
+        st.session_state.highlighted_pdf = record["highlighted_pdf"]
+        st.session_state.anchor_report = record["anchor_report"]
+        st.session_state.highlighted_pdf_hash = lazy_import("pdf_pages").document_hash(record["highlighted_pdf"])
+    st.session_state.retrieval_report = record["retrieval_report"]
+    st.session_state.last_trace = record["trace"]
+    st.session_state.analysis_id = record["id"]
+    if record["drafts"]:
+        tone, text = list(record["drafts"].items())[-1]
+        st.session_state.tone_sel = tone
+        st.session_state.pop_generated_msg = text
+        st.session_state.negotiation_text = text
+    st.session_state.step = 4
+
+
+def save_draft(tone, text):
+    """
+    Persists the negotiation draft of the current analysis (generated or confirmed) per tone.
+    """
+    if "analysis_id" in st.session_state:
+        load_engine().get_analysis_store().save_draft(st.session_state.analysis_id, tone, text)
 
-    for page in doc:
-        full_text += page.get_text()
 
-    doc.close()
-    return full_text
+def follow_analysis_job():
+    """
+    Polls the session's analysis job and renders the findings reported so far; the job keeps
+    running if this run is interrupted (a click reruns the script and resumes the view).
+    Moves on to step 4 when the job is done.
+    """
+    jobs = lazy_import("jobs")
+    job, submitter = load_engine().get_job_queue().get(st.session_state.job_ticket)
+    if job is None:
+        # Evicted, or the server restarted
+        st.session_state.pop("job_ticket", None)
+        st.query_params.pop("job", None)
+        st.warning("The previous analysis is no longer available - please upload the contract again.")
+        return
+
+    shown = 0
+    with st.status("Starting AI Analysis...", expanded=True) as status:
+        while True:
+            finished = job.wait(JOB_POLL_SECONDS)
+            snapshot = job.snapshot(shown)
+            for risk in snapshot["findings"]:
+                finding = Finding.from_dict(risk)
+                level = resolve_importance(finding, st.session_state.user_prefs)
+                icon = {"High": "🔴", "Medium": "🟡"}.get(level, "⚪")
+                st.write(f"{icon} Found: **{finding.issue_name}**")
+            shown = snapshot["finding_count"]
+
+            label = PHASE_LABELS.get(snapshot["phase"], "Starting AI Analysis")
+            if snapshot["phase"] == "llm_request" and snapshot["received_chars"]:
+                label += (f" (~{snapshot['received_chars'] // 4} tokens received, "
+                          f"{snapshot['finding_count']} findings so far)")
+            status.update(label=f"{label}... {snapshot['progress']:.0%}", state="running")
+            if finished:
+                break
+
+        if job.status == jobs.FAILED:
+            status.update(label="Analysis Interrupted", state="error")
+            st.error(f"Technical details: {job.error}")
+            st.session_state.pop("job_ticket", None)
+            # A reload must not pick up the failed job again
+            st.query_params.pop("job", None)
+            return
+
+        retrieval_report = job.result["retrieval_report"]
+        article_ids = ", ".join(a["id"] for a in retrieval_report["articles"])
+        st.write(f"Used {len(retrieval_report['articles'])} relevant articles "
+                 f"(~{retrieval_report['tokens']} of {retrieval_report['full_tokens']} tokens): {article_ids}")
+        if job.result["revision_report"]:
+            report = job.result["revision_report"]
+            st.write(f"Revision: {report['changed']} changed, {report['added']} added and {report['removed']} "
+                     f"removed clause(s); {report['carried']} findings kept.")
+        if job.result["from_cache"]:
+            cache_stats = load_engine().get_analysis_cache().stats()
+            st.write(f"Loaded a previous analysis of this contract "
+                     f"(cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses).")
+        st.write("Highlighting key clauses and organizing your results...")
+        load_job_result(job, submitter)
+        status.update(label=f"Analysis complete in {snapshot['seconds']:.1f}s", state="complete", expanded=False)
+    go_to_step(4)
+
+
+def restore_job_from_url():
+    """
+    After a page reload the session is new: the job ticket in the URL picks up the analysis with
+    this submission's preferences - finished jobs go straight to step 4, running ones are followed in step 3.
+    """
+    st.session_state.job_restored = True
+    job, submitter = load_engine().get_job_queue().get(st.query_params["job"])
+    if job is None:
+        return
+    st.session_state.user_prefs = dict(submitter["user_prefs"])
+    if job.done.is_set() and job.result is not None:
+        load_job_result(job, submitter)
+        st.session_state.step = 4
+    else:
+        st.session_state.job_ticket = st.query_params["job"]
+        st.session_state.step = 3
+
 
+# Step-3 comparison mode (see comparison.py)
+COMPARE_MAX_FILES = 10
+LEVEL_ICONS = {"High": "🔴", "Medium": "🟡", "Low": "⚪"}
 
-# --- Page Configuration ---
-st.set_page_config(
-    page_title="RightRent",
-    page_icon="icon_page.svg",
-    layout="wide"
-)
 
-# --- Initialize Session State ---
-if 'step' not in st.session_state:
-    st.session_state.step = 1
-if 'user_prefs' not in st.session_state:
-    st.session_state.user_prefs = {
-        "rent_increase": "Low",
-        "termination": "Low",
-        "repairs": "Low",
-        "pets": "Low",
-        "subletting": "Low",
-        "deposit": "Low",
-        "budget": 0
-    }
+def submit_comparison_jobs(named_pdfs):
+    """
+    Submits one analysis job per contract [(name, pdf_bytes)] - the same jobs as a single upload,
+    so contracts analyzed (or being analyzed) by anyone are joined instead of analyzed again.
+    """
+    engine = load_engine()
+    user_prefs = dict(st.session_state.user_prefs)
+    tickets = []
+    for name, pdf_bytes in named_pdfs:
+        _, ticket = engine.get_job_queue().submit(
+            engine.analysis_job_key(pdf_bytes), {"pdf_bytes": pdf_bytes}, pdf_bytes,
+            submitter={"name": name, "user_prefs": user_prefs}
+        )
+        tickets.append((name, ticket))
+    st.session_state.comparison_tickets = tickets
+    st.session_state.pop("comparison", None)
+    st.query_params["compare"] = ",".join(ticket for _, ticket in tickets)
 
 
-# --- Navigation ---
-def go_to_step(step_number):
-    st.session_state.step = step_number
-    st.rerun()
+def compared_result(result):
+    """
+    The part of a finished analysis job that the comparison keeps (see comparison.py).
+    """
+    doc = result.pop("doc", None)
+    if doc is not None:
+        # Not highlighted here - a contract opened in the full review is highlighted with its own copy
+        doc.close()
+    return {
+        "all_findings": result["all_findings"].to_dicts(),
+        "terms": result["terms"],
+        "retrieval_report": result["retrieval_report"],
+        "from_cache": result["from_cache"],
+        "trace": result["trace"],
+    }
 
 
-def generate_negotiation_message(selected_items, tone):
+def follow_comparison_jobs():
     """
-    Generates a negotiation message from the tenant's first-person perspective.
-    Ensures a consistent sign-off and WhatsApp formatting.
+    Polls the analysis jobs of the compared contracts and reports each one as it finishes; like
+    a single analysis they keep running if this run is interrupted. Builds the comparison when all are done.
     """
-    issues_summary = "\n".join([f"- {item['issue_name']}: {item['explanation']}" for item in selected_items])
+    jobs = lazy_import("jobs")
+    queue = load_engine().get_job_queue()
+    followed = []
+    for name, ticket in st.session_state.comparison_tickets:
+        job, _ = queue.get(ticket)
+        if job is None:
+            # Evicted, or the server restarted
+            st.session_state.pop("comparison_tickets", None)
+            st.query_params.pop("compare", None)
+            st.warning("The previous comparison is no longer available - please upload the contracts again.")
+            return
+        followed.append((name, job))
+
+    reported = set()
+    with st.status(f"Analyzing {len(followed)} contracts...", expanded=True) as status:
+        while True:
+            for name, job in followed:
+                if job.done.is_set() and name not in reported:
+                    reported.add(name)
+                    if job.status == jobs.DONE:
+                        source = "cache" if job.result["from_cache"] else "AI analysis"
+                        st.write(f"✔️ **{name}**: {len(job.result['all_findings'].findings)} findings ({source})")
+            if len(reported) == len(followed):
+                break
+            status.update(label=f"Analyzing {len(followed)} contracts... {len(reported)} done", state="running")
+            next(job for name, job in followed if name not in reported).wait(JOB_POLL_SECONDS)
+
+        failed = [(name, job) for name, job in followed if job.status == jobs.FAILED]
+        st.session_state.pop("comparison_tickets", None)
+        if failed:
+            status.update(label="Comparison Interrupted", state="error")
+            st.error(f"Technical details ({failed[0][0]}): {failed[0][1].error}")
+            st.query_params.pop("compare", None)
+            return
+        st.session_state.comparison = [(name, compared_result(job.result)) for name, job in followed]
+        st.session_state.comparison_pdfs = {name: job.payload["pdf_bytes"] for name, job in followed}
+        status.update(label="Comparison ready", state="complete", expanded=False)
+
+
+def restore_comparison_from_url():
+    """
+    After a page reload the tickets in the URL pick up the comparison's jobs (running or finished)
+    with the preferences they were submitted with.
+    """
+    st.session_state.comparison_restored = True
+    queue = load_engine().get_job_queue()
+    tickets = []
+    for ticket in st.query_params["compare"].split(","):
+        job, submitter = queue.get(ticket)
+        if job is None:
+            st.query_params.pop("compare", None)
+            return
+        tickets.append((submitter["name"], ticket))
+    st.session_state.user_prefs = dict(submitter["user_prefs"])
+    st.session_state.comparison_tickets = tickets
+    st.session_state.compare_mode = True
+    st.session_state.step = 3
+
+
+def open_compared_contract(pdf_bytes, result):
+    """
+    Loads one compared contract into step 4 like a single upload - no new analysis.
+    """
+    st.session_state.pdf_bytes = pdf_bytes
+    st.session_state.pop("anchor_index", None)
+    st.session_state.pop("contract_text", None)
+    st.session_state.pop("revision_report", None)
+    # Not a stored analysis - a reload returns to the comparison (its tickets stay in the URL)
+    st.session_state.pop("analysis_id", None)
+    st.query_params.pop("analysis", None)
+    st.session_state.all_findings = AnalysisResult.from_findings(
+        Finding.from_dict(item) for item in result["all_findings"]
+    )
+    apply_user_preferences()
+    st.session_state.pop("viewer_page", None)
+    st.session_state.retrieval_report = result["retrieval_report"]
+    st.session_state.last_trace = result["trace"]
+    go_to_step(4)
 
-    system_prompt = f"""
-    You are the TENANT. Write a {tone} message to your potential landlord.
-    Focus ONLY on these issues: 
-    {issues_summary}
 
-    ### CRITICAL IDENTITY RULES:
-    - ALWAYS write in the FIRST person (use "I", "my", "me", "mine").
-    - NEVER speak as an advocate, lawyer, or third party.
+def matrix_cell(cell):
+    if not cell["count"]:
+        return "—"
+    text = f"{LEVEL_ICONS.get(cell['level'], '')} {cell['count']}"
+    return text + (f" ({cell['violations']} illegal)" if cell["violations"] else "")
 
-    ### WHATSAPP FORMATTING:
-    - Use single asterisks for bold: *Text*.
-    - No Markdown headers (#).
-    - Clear line breaks between paragraphs.
 
-    ### MANDATORY SIGN-OFF:
-    - You MUST end the message EXACTLY with:
-      Best regards,
-      [Your Name]
+def render_comparison():
     """
-
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[{"role": "system", "content": system_prompt}],
-        stream=False
-    )
-    return response.choices[0].message.content
+    Step-3 comparison mode: 2-10 leases are analyzed as background jobs (contracts analyzed
+    before are reused), then ranked against the preferences and shown side by side.
+    """
+    comparison = lazy_import("comparison")
+    files = st.file_uploader("Upload PDFs", type=["pdf"], accept_multiple_files=True,
+                             label_visibility="collapsed", key="compare_files")
+    if len(files) > COMPARE_MAX_FILES:
+        st.warning(f"Only the first {COMPARE_MAX_FILES} contracts are compared.")
+        files = files[:COMPARE_MAX_FILES]
+
+    if len(files) >= 2 and st.button("Compare contracts →", type="primary", use_container_width=True):
+        # Unique names - they label the matrix columns
+        named_pdfs = []
+        for uploaded in files:
+            name = uploaded.name
+            while name in dict(named_pdfs):
+                name = f"{name} (2)"
+            named_pdfs.append((name, uploaded.getvalue()))
+
+        submit_comparison_jobs(named_pdfs)
+
+    # Shown until every contract is analyzed (also after a rerun)
+    if st.session_state.get("comparison_tickets"):
+        follow_comparison_jobs()
+
+    compared = st.session_state.get("comparison")
+    if not compared:
+        return
+    user_prefs = st.session_state.user_prefs
+    ranking = comparison.rank_contracts(compared, user_prefs)
+
+    st.subheader("🏆 Ranking")
+    st.caption("Score out of 100: legal violations, risks that matter to you, missing protections "
+               "and rent above your budget lower it.")
+    st.dataframe([
+        {
+            "Rank": row["rank"],
+            "Contract": row["name"],
+            "Score": row["score"],
+            "Rent (₪)": f"{row['rent']:,.0f}" if row["rent"] else "?",
+            "Legal violations": row["violations"],
+            "High risks": row["high"],
+            "Medium risks": row["medium"],
+            "Missing protections": row["missing"],
+            "Over budget": f"+{row['over_budget_pct']:g}%" if row["over_budget_pct"] else "",
+        }
+        for row in ranking
+    ], hide_index=True, use_container_width=True)
+
+    st.subheader("📊 Risks side by side")
+    names = [row["name"] for row in ranking]
+    matrix = comparison.risk_matrix(compared, user_prefs)
+    st.dataframe([
+        {"Category": category.replace("_", " ").title(), **{name: matrix_cell(cells[name]) for name in names}}
+        for category, cells in matrix.items()
+    ], hide_index=True, use_container_width=True)
+
+    open_col, button_col = st.columns([3, 1], vertical_alignment="bottom")
+    with open_col:
+        choice = st.selectbox("Open a contract in the full review:", names, key="compare_open")
+    with button_col:
+        if st.button("Review →", use_container_width=True):
+            open_compared_contract(st.session_state.comparison_pdfs[choice], dict(compared)[choice])
 
 
 def importance_row(label, key, category_name, help_text):
@@ -377,6 +643,17 @@ def render_stepper(current_step):
 
     st.markdown(stepper_html, unsafe_allow_html=True)
 
+
+# --- Page reload with a stored analysis, an analysis job or a comparison in the URL ---
+if ("analysis" in st.query_params and "analysis_restored" not in st.session_state
+        and "all_findings" not in st.session_state):
+    restore_analysis_from_url()
+if "job" in st.query_params and "job_restored" not in st.session_state and "all_findings" not in st.session_state:
+    restore_job_from_url()
+if ("compare" in st.query_params and "comparison_restored" not in st.session_state
+        and "comparison" not in st.session_state):
+    restore_comparison_from_url()
+
 # ==========================================
 # Step 1: Welcome & Homepage
 # ==========================================
@@ -582,7 +859,18 @@ elif st.session_state.step == 3:
 
 
     with col_main:
-        uploaded_file = st.file_uploader("Upload PDF", type=["pdf"], label_visibility="collapsed")
+        compare_mode = st.toggle("Compare several contracts", key="compare_mode",
+                                 help="Upload 2-10 leases to rank them against your preferences and budget.")
+        uploaded_file = None
+        revision_mode = False
+        if not compare_mode:
+            uploaded_file = st.file_uploader("Upload PDF", type=["pdf"], label_visibility="collapsed")
+            if "contract_text" in st.session_state:
+                revision_mode = st.checkbox(
+                    f"This is a revised version of '{st.session_state.get('contract_name', 'the previous contract')}'",
+                    key="revision_mode",
+                    help="Only the changed clauses are analyzed again; the other findings are kept."
+                )
 
         if uploaded_file is not None:
             st.markdown(f"""
@@ -595,47 +883,14 @@ elif st.session_state.step == 3:
             col_empty1, col_btn, col_empty2 = st.columns([0.6, 1, 0.6])
             with col_btn:
                 if st.button("Upload & analyze →", type="primary", use_container_width=True):
-                    with st.status("Starting AI Analysis... 0%", expanded=True) as status:
-                        try:
-                            import time
-
-                            # --- PHASE 1: Data Ingestion (0% - 30%) ---
-                            status.update(label="Reading your contract... 15%", state="running")
-                            st.write("Scanning the document text...")
-
-                            pdf_bytes = uploaded_file.getvalue()
-                            uploaded_file.seek(0)
-                            contract_text = extract_text_from_pdf(uploaded_file)
-                            time.sleep(0.5)
-
-                            # --- PHASE 2: Core Analysis (31% - 75%) ---
-                            status.update(label="Checking legal compliance... 45%", state="running")
-                            st.write("Comparing clauses with Israeli rental laws...")
-
-                            # The actual AI Processing
-                            analysis_results = analyze_contract(contract_text, st.session_state.user_prefs)
-
-                            status.update(label="Matching your preferences... 70%", state="running")
-                            st.write("Checking how the contract fits your needs...")
-                            time.sleep(0.5)
-
-                            # --- PHASE 3: Report Generation (76% - 100%) ---
-                            status.update(label="Finalizing your review... 90%", state="running")
-                            st.write("Highlighting key clauses and organizing your results...")
+                    submit_analysis_job(uploaded_file, revision_mode)
 
-                            highlighted_pdf = highlight_pdf(pdf_bytes, analysis_results, st.session_state.user_prefs)
+        # The analysis runs as a background job - shown here until it is done (also after a rerun)
+        if not compare_mode and st.session_state.get("job_ticket"):
+            follow_analysis_job()
 
-                            # --- PHASE 4: Completion ---
-                            status.update(label="Analysis complete! 100%", state="complete", expanded=False)
-
-                            st.session_state.highlighted_pdf = highlighted_pdf
-                            st.session_state.analysis_results = analysis_results
-                            time.sleep(0.5)
-                            go_to_step(4)
-
-                        except Exception as e:
-                            status.update(label="Analysis Interrupted", state="error")
-                            st.error(f"Technical details: {e}")
+    if compare_mode:
+        render_comparison()
 
     st.markdown("<br>", unsafe_allow_html=True)
     if st.button("← Back to Preference ", key="back_to_2"):
@@ -666,6 +921,27 @@ elif st.session_state.step == 4:
         if st.button("← Back to Upload", use_container_width=True):
             go_to_step(3)
 
+        # --- Local re-scoring: change preferences without a new analysis ---
+        if "all_findings" in st.session_state:
+            with st.expander("⚙️ Adjust preferences"):
+                options = ["Low", "Medium", "High"]
+                new_prefs = {}
+                for category in CATEGORIES:
+                    new_prefs[category] = st.radio(
+                        category.replace("_", " ").capitalize(), options,
+                        index=options.index(st.session_state.user_prefs.get(category, "Medium")),
+                        horizontal=True, key=f"adj_{category}"
+                    )
+                new_prefs["budget"] = st.number_input(
+                    "Max monthly rent (₪)", min_value=0, step=100,
+                    value=st.session_state.user_prefs.get("budget", 0), key="adj_budget"
+                )
+
+                if new_prefs != st.session_state.user_prefs:
+                    st.session_state.user_prefs = new_prefs
+                    apply_user_preferences()
+                    st.rerun()
+
 
     # --- Standardized Header Logic ---
     header_left, header_right = st.columns([9, 1])
@@ -689,6 +965,25 @@ elif st.session_state.step == 4:
     st.markdown("<div id='rental-document'></div>", unsafe_allow_html=True)
     st.markdown("<h1 style='text-align: center;'>Your rental contract - reviewed</h1>", unsafe_allow_html=True)
 
+    # Revised contract: what changed since the previous version
+    revision_report = st.session_state.get("revision_report")
+    if revision_report:
+        st.info(f"Revised contract: {revision_report['changed']} clause(s) changed, {revision_report['added']} "
+                f"added, {revision_report['removed']} removed - {revision_report['carried']} earlier findings kept, "
+                f"{len(revision_report['new'])} new, {len(revision_report['resolved'])} resolved "
+                f"(only {revision_report['sent_share']:.0%} of the contract was analyzed again).")
+        if revision_report["resolved"]:
+            with st.expander(f"✅ Resolved since the previous version ({len(revision_report['resolved'])})"):
+                for item in revision_report["resolved"]:
+                    violation = " (legal violation)" if item.get("is_legal_violation") else ""
+                    st.markdown(f"- **{item['issue_name']}**{violation}")
+
+    # Parsed once in step 3; the partitions are precomputed on the model
+    analysis = st.session_state.analysis
+    all_ordered_risks = analysis.risks
+    suggestions = analysis.suggestions
+    anchor_report = st.session_state.get("anchor_report", {"by_quote": {}, "unanchored": 0})
+
     # --- Integrated PDF View ---
     pdf_col_l, pdf_col_main, pdf_col_r = st.columns([0.1, 5.8, 0.1])
 
@@ -704,61 +999,51 @@ elif st.session_state.step == 4:
             )
 
             st.markdown('<div class="pdf-container-box">', unsafe_allow_html=True)
-            pdf_viewer(st.session_state.highlighted_pdf, width=1000, height=900)
+            render_pdf_viewer(anchor_report, all_ordered_risks)
             st.markdown('</div>', unsafe_allow_html=True)
 
 
     st.markdown("---")
 
-    import json
-
-    clean_json = st.session_state.analysis_results.replace("```json", "").replace("```", "").strip()
-    analysis_data = json.loads(clean_json)
-
-    risks_found = [i for i in analysis_data if i.get("preference_category") != "missing_protection"]
-    suggestions = [i for i in analysis_data if i.get("preference_category") == "missing_protection"]
-
-    critical_items = []
-    ordinary_risk_items = []
-
-    for item in risks_found:
-        is_violation = item.get("is_legal_violation", False)
-        is_critical = is_violation or item.get("preference_category") == "budget"
-
-        if is_critical:
-            critical_items.append(item)
-        else:
-            ordinary_risk_items.append(item)
-
-    all_ordered_risks = critical_items + ordinary_risk_items
-
     # 2. (Show Risks)
     st.markdown("<div id='critical-risks'></div>", unsafe_allow_html=True)
     st.markdown("### 🔍 Critical Issues & Risks")
 
+    if anchor_report["unanchored"]:
+        st.caption(f"{anchor_report['unanchored']} quoted clause(s) could not be located in the PDF "
+                   f"and are listed below without a highlight.")
+
     if not all_ordered_risks:
         st.success("No critical risks found!")
     else:
-        for item in all_ordered_risks:
-            is_violation = item.get("is_legal_violation", False)
-            is_critical = is_violation or item.get("preference_category") == "budget"
+        for idx, item in enumerate(all_ordered_risks):
+            is_critical = item.is_critical
 
             status_label = "🚨 CRITICAL" if is_critical else "⚠️ RISK"
             color = "#d32f2f" if is_critical else "#ffa000"
 
-            with st.expander(f"{status_label} | {item.get('issue_name')}"):
+            anchor = anchor_report["by_quote"].get(item.exact_quote)
+            location = ""
+            if anchor and anchor["page"]:
+                location = f" (page {anchor['page']}"
+                location += ")" if anchor["method"] == "exact" else f", {anchor['confidence']:.0%} match)"
+
+            with st.expander(f"{status_label} | {item.issue_name}"):
                 st.markdown(f"""
                             <div style="border-left: 5px solid {color}; padding-left: 15px; margin-top: 10px;">
-                                <p style="margin-bottom: 5px;"><b>📄 Found in Contract:</b></p>
-                                <i style="color: #555;">"{item.get('exact_quote')}"</i>
+                                <p style="margin-bottom: 5px;"><b>📄 Found in Contract{location}:</b></p>
+                                <i style="color: #555;">"{item.exact_quote}"</i>
                                 <div style="margin-top: 15px;"></div>
                                 <p style="margin-bottom: 5px;"><b>💡 Why it's a risk:</b></p>
-                                <p style="color: #333;">{item.get('explanation')}</p>
+                                <p style="color: #333;">{item.explanation}</p>
                                 <div style="margin-top: 15px;"></div>
                                 <p style="margin-bottom: 5px; color: {color};"><b>💬 Negotiation Tip:</b></p>
-                                <p>{item.get('negotiation_tip')}</p>
+                                <p>{item.negotiation_tip}</p>
                             </div>
                         """, unsafe_allow_html=True)
+                if anchor and anchor["page"]:
+                    st.button(f"📍 Show in PDF (page {anchor['page']})", key=f"show_risk_{idx}",
+                              on_click=jump_to_page, args=(anchor["page"],))
 
     # 3. Show Suggested Add-ons (🔵/💡) - Only if they exist
     if suggestions:
@@ -769,14 +1054,14 @@ elif st.session_state.step == 4:
         st.info("These clauses are not in your contract but would protect you if added.")
 
         for item in suggestions:
-            with st.expander(f"🔵 RECOMMENDED | {item.get('issue_name')}"):
+            with st.expander(f"🔵 RECOMMENDED | {item.issue_name}"):
                 st.markdown(f"""
                     <div style="border-left: 5px solid #1976d2; padding-left: 15px; margin-top: 10px;">
                         <p style="margin-bottom: 5px;"><b>🔍 Recommendation:</b></p>
-                        <p style="color: #333;">{item.get('explanation')}</p>
+                        <p style="color: #333;">{item.explanation}</p>
                         <div style="margin-top: 15px;"></div>
                         <p style="margin-bottom: 5px; color: #1976d2;"><b>📝 Suggested Phrasing:</b></p>
-                        <p>{item.get('negotiation_tip')}</p>
+                        <p>{item.negotiation_tip}</p>
                     </div>
                 """, unsafe_allow_html=True)
 
@@ -794,8 +1079,8 @@ elif st.session_state.step == 4:
     selected_items = []
 
     # Data separation (remains the same)
-    risks_in_popup = [i for i in analysis_data if i.get("preference_category") != "missing_protection"]
-    suggestions_in_popup = [i for i in analysis_data if i.get("preference_category") == "missing_protection"]
+    risks_in_popup = analysis.risks
+    suggestions_in_popup = analysis.suggestions
 
     # Simplified to 2 columns with a small gap
     col_left, col_right = st.columns([1, 1], gap="medium")
@@ -807,7 +1092,7 @@ elif st.session_state.step == 4:
         if not risks_in_popup:
             st.caption("No risks found.")
         for idx, item in enumerate(risks_in_popup):
-            if st.checkbox(item['issue_name'], value=True, key=f"sel_risk_{idx}"):
+            if st.checkbox(item.issue_name, value=True, key=f"sel_risk_{idx}"):
                 selected_items.append(item)
 
     with col_right:
@@ -817,13 +1102,19 @@ elif st.session_state.step == 4:
         if not suggestions_in_popup:
             st.caption("No recommendations found.")
         for idx, item in enumerate(suggestions_in_popup):
-            if st.checkbox(item['issue_name'], value=True, key=f"sel_sug_{idx}"):
+            if st.checkbox(item.issue_name, value=True, key=f"sel_sug_{idx}"):
                 selected_items.append(item)
 
     st.markdown("<div style='margin-top: 30px;'></div>", unsafe_allow_html=True)
 
+    # All tones of the default selection are drafted in the background as soon as step 4 loads
+    draft_store = load_engine().get_draft_store()
+    if selected_items and len(selected_items) == len(risks_in_popup) + len(suggestions_in_popup):
+        draft_store.prefetch(selected_items)
+
     st.write("**2. Choose tone:**")
-    chosen_tone = st.radio("Tone:", ["Polite", "Neutral", "Firm"], horizontal=True, key="tone_sel")
+    chosen_tone = st.radio("Tone:", ["Polite", "Neutral", "Firm"], horizontal=True, key="tone_sel",
+                           on_change=switch_draft_tone)
 
     st.markdown("<div style='margin-top: 20px;'></div>", unsafe_allow_html=True)
     # PHASE 2: GENERATION
@@ -834,11 +1125,20 @@ elif st.session_state.step == 4:
             if not selected_items:
                 st.error("Please select at least one issue to negotiate.")
             else:
-                with st.spinner("AI is writing..."):
-                    new_draft = generate_negotiation_message(selected_items, chosen_tone)
-                    st.session_state.pop_generated_msg = new_draft
-                    st.session_state.negotiation_text = new_draft
+                # Chosen tone first; the other tones follow in the background
+                draft = draft_store.get(selected_items, chosen_tone)
+                draft_store.prefetch(selected_items)
+                try:
+                    if not draft.ready:
+                        st.write_stream(draft.stream())
+                except Exception as e:
+                    st.error(f"Could not write the draft: {e}")
+                else:
+                    st.session_state.pop_generated_msg = draft.text
+                    st.session_state.negotiation_text = draft.text
+                    st.session_state.draft_selection = selected_items
                     st.session_state.is_confirmed = False
+                    save_draft(chosen_tone, draft.text)
                     st.rerun()
 
     # PHASE 3: EDITING & CONFIRMING
@@ -865,6 +1165,7 @@ elif st.session_state.step == 4:
                 # Save the current state of the text area into a 'confirmed' variable
                 st.session_state.confirmed_final_msg = st.session_state.negotiation_text
                 st.session_state.is_confirmed = True
+                save_draft(chosen_tone, st.session_state.negotiation_text)
 
 
         # PHASE 4: SENDING (Balanced side-by-side layout)
@@ -894,4 +1195,17 @@ elif st.session_state.step == 4:
                     f'style="display: flex; align-items: center; justify-content: center; height: 45px; margin: 0; text-decoration: none; width: 100%; font-size: 14px;">'
                     f'Send via WhatsApp</a>',
                     unsafe_allow_html=True
-                )
\ No newline at end of file
+                )
+
+# --- Startup / rerun timing report (cold start after sleep mode, lazy imports, reruns) ---
+record_rerun(time.perf_counter() - _run_started)
+if "timings" in st.query_params:
+    with st.sidebar.expander("⏱️ Timing report"):
+        st.json(timing_report())
+        if "last_trace" in st.session_state:
+            # Per-phase wall time and token usage of the last analysis
+            st.json(st.session_state.last_trace)
+        st.json(tracing.metrics_report())
+        if "engine" in sys.modules:
+            # Malformed model output: repaired/dropped items, continuations and wasted tokens
+            st.json(sys.modules["engine"].format_report())
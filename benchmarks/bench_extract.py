@@ -0,0 +1,56 @@
+"""
+Serial text extraction against the shared process pool of pdf_text.extract_text_map, per
+document size. Reports the one-time pool start-up and the warm-pool time, so
+PARALLEL_MIN_PAGES can be set from the crossover on the target machine (--workers forces
+the pool size, e.g. on a single-CPU machine where it is otherwise never used).
+
+    python benchmarks/bench_extract.py --pages 48 200 400 800 --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pdf_text  # noqa: E402
+from synthetic import build_lease  # noqa: E402
+
+
+def best_of(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[48, 200, 400, 800])
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 1, 8))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if args.workers < 2:
+        print(f"{os.cpu_count()} CPU(s): the pool is not used - pass --workers to force it")
+        return 0
+
+    # Every size goes through the pool here, whatever PARALLEL_MIN_PAGES says
+    pdf_text.PARALLEL_MIN_PAGES = 1
+    started = time.perf_counter()
+    pdf_text.extract_text_map(build_lease(1, 1)[0], max_workers=args.workers)
+    print(f"pool start-up ({args.workers} workers, first call only): {time.perf_counter() - started:.2f} s")
+
+    for pages in args.pages:
+        pdf_bytes, _ = build_lease(pages, 4)
+        serial, expected = best_of(lambda: pdf_text.extract_text_map(pdf_bytes, max_workers=1), args.repeat)
+        pooled, result = best_of(lambda: pdf_text.extract_text_map(pdf_bytes, max_workers=args.workers), args.repeat)
+        same = result.text == expected.text and result.word_rects == expected.word_rects
+        print(f"{pages:5d} pages: serial {serial * 1000:8.1f} ms | pool {pooled * 1000:8.1f} ms "
+              f"({serial / pooled:4.2f}x) | same output: {same}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Compares quote resolution in highlight_pdf_with_report: the old per-risk, per-page
+page.search_for() loop against the single-pass TextMap + QuoteAnchorIndex.
+
+    python benchmarks/bench_highlight.py --pages 50 --risks 15
+"""
+import argparse
+import os
+import sys
+import time
+
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_text import TextMap, QuoteAnchorIndex  # noqa: E402
+
+FILLER = (
+    "{n}. GENERAL PROVISION {n} The parties agree that the terms of this section apply for the entire "
+    "lease period and shall be read together with the other provisions of this agreement. "
+)
+PLANTED = "{n}. SPECIAL TERM {n} The Tenant shall pay a special maintenance fee number {n} every month."
+
+
+def build_pdf(pages, risks):
+    doc = fitz.open()
+    planted_pages = {round(i * (pages - 1) / max(risks - 1, 1)) for i in range(risks)}
+    quotes = []
+    clause = 1
+    for p in range(pages):
+        page = doc.new_page()
+        text = ""
+        for _ in range(12):
+            text += FILLER.format(n=clause)
+            clause += 1
+        if p in planted_pages:
+            quote = PLANTED.format(n=clause).split(" ", 1)[1]
+            quotes.append(quote)
+            text += PLANTED.format(n=clause)
+            clause += 1
+        page.insert_textbox(fitz.Rect(50, 50, 545, 800), text, fontsize=10)
+    return doc.tobytes(), quotes
+
+
+def old_path(pdf_bytes, quotes):
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    found = 0
+    for quote in quotes:
+        for page in doc:
+            instances = page.search_for(quote)
+            if not instances and len(quote) > 20:
+                instances = page.search_for(quote[:20])
+            found += len(instances)
+    doc.close()
+    return found
+
+
+def new_path(pdf_bytes, quotes):
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    index = QuoteAnchorIndex(TextMap.from_document(doc))
+    found = 0
+    for quote in quotes:
+        for first, last in index.anchor(quote)["spans"]:
+            found += sum(len(r) for r in index.text_map.rects_for_words(first, last).values())
+    doc.close()
+    return found
+
+
+def timed(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--risks", type=int, default=15)
+    args = parser.parse_args()
+
+    pdf_bytes, quotes = build_pdf(args.pages, args.risks)
+    # Half of the quotes are slightly off (as LLM quotes often are) to exercise the fallback
+    quotes = [q if i % 2 else q.replace("every month", "each month") for i, q in enumerate(quotes)]
+
+    old_time, old_rects = timed(old_path, pdf_bytes, quotes)
+    new_time, new_rects = timed(new_path, pdf_bytes, quotes)
+    print(f"{args.pages} pages, {len(quotes)} risks")
+    print(f"  page.search_for loop : {old_time * 1000:8.1f} ms  ({old_rects} rects)")
+    print(f"  QuoteAnchorIndex     : {new_time * 1000:8.1f} ms  ({new_rects} rects)")
+    print(f"  speedup              : {old_time / new_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Measures the relevance filter (relevance.py) that prunes clauses before the analysis call:
+token reduction, and recall of the clauses that can produce a finding on a labeled set -
+the hand-labeled contract below (English and Hebrew clauses, with the usual boilerplate),
+test.pdf and the planted clauses of synthetic leases. Recall must stay at 100%.
+
+    python benchmarks/bench_relevance.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clauses import segment_clauses  # noqa: E402
+from pdf_text import extract_text_map  # noqa: E402
+from relevance import select_relevant_clauses  # noqa: E402
+from synthetic import build_lease  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (clause, can it produce a finding?)
+LABELED_CONTRACT = [
+    ("RESIDENTIAL LEASE AGREEMENT\n", False),
+    ("1. THE PARTIES This agreement is made on March 3, 2026 between Ms. Dana Levi, ID 012345678, "
+     "of 4 Herzl St., Haifa (the \"Landlord\") and Mr. Avi Cohen, ID 087654321 (the \"Tenant\").\n", False),
+    ("2. RECITALS Whereas the Landlord is the owner of the apartment and whereas the Tenant wishes to "
+     "lease it, the parties have agreed as follows.\n", False),
+    ("3. DEFINITIONS In this agreement, \"Apartment\" means the 3-room apartment on the second floor "
+     "of the building at 4 Herzl St., Haifa, including its storage room.\n", False),
+    ("4. RENT The monthly rent shall be 6,500 NIS, payable on the first day of each month.\n", True),
+    ("5. INDEXATION The rent is linked to the consumer price index published on the payment date.\n", True),
+    ("6. SECURITY The Tenant shall provide a bank guarantee of 26,000 NIS.\n", True),
+    ("7. REPAIRS The Tenant shall bear the cost of all repairs, including defects in the plumbing.\n", True),
+    ("8. CONDITION The Tenant accepts the apartment as-is and waives any claim regarding its condition.\n", True),
+    ("9. EARLY EXIT The Landlord may cancel this agreement with 30 days notice.\n", True),
+    ("10. PETS No animals are allowed in the apartment.\n", True),
+    ("11. SUBLETTING The Tenant shall not sublet the apartment without the Landlord's written consent.\n", True),
+    ("12. BROKERAGE The Tenant shall pay the brokerage commission of the Landlord's agent.\n", True),
+    ("13. ENTRY The Landlord may enter the apartment at any time without prior coordination.\n", True),
+    ("14. LATE PAYMENT A late payment shall bear interest of 2% per week.\n", True),
+    ("15. GOVERNING LAW The courts of Haifa shall have exclusive jurisdiction over this agreement.\n", False),
+    ("16. ENTIRE AGREEMENT This document constitutes the entire agreement between the parties.\n", False),
+    ("17. דמי השכירות יעודכנו בהתאם למדד המחירים לצרכן אחת לשנה.\n", True),
+    ("18. השוכר יפקיד בידי המשכיר פיקדון בסך 20,000 ש\"ח.\n", True),
+    ("19. הצדדים מצהירים כי קראו את ההסכם והבינו את תוכנו.\n", False),
+    ("20. SIGNATURES In witness whereof the parties have signed: ____________ (Landlord) "
+     "____________ (Tenant)\n", False),
+]
+# test.pdf clauses by number (0: the title) that can produce a finding
+TEST_PDF_RELEVANT = {3, 4, 5, 6, 7, 8, 9, 10, 11, 12}
+SYNTHETIC_CASES = [(10, 6), (50, 15)]
+
+
+def normalized(text):
+    return " ".join(text.split())
+
+
+def measure(name, text, relevant_snippets):
+    pruned_text, report = select_relevant_clauses(text)
+    kept = normalized(pruned_text)
+    hits = sum(1 for snippet in relevant_snippets if normalized(snippet) in kept)
+    print(f"{name:>18}: {report['kept']:>4}/{report['clauses']:<4} clauses kept | "
+          f"tokens {report['tokens_before']:>6} -> {report['tokens_after']:<6} ({report['reduction']:.0%} less) | "
+          f"recall {hits}/{len(relevant_snippets)}")
+    return hits, len(relevant_snippets)
+
+
+def main():
+    results = []
+
+    contract = "".join(clause for clause, _ in LABELED_CONTRACT)
+    results.append(measure("labeled contract", contract, [c for c, relevant in LABELED_CONTRACT if relevant]))
+
+    with open(os.path.join(ROOT, "test.pdf"), "rb") as f:
+        text = extract_text_map(f.read()).text
+    clauses = segment_clauses(text)
+    results.append(measure("test.pdf", text, [clauses[i]["text"] for i in TEST_PDF_RELEVANT]))
+
+    for pages, risks in SYNTHETIC_CASES:
+        pdf_bytes, expected = build_lease(pages, risks)
+        text = extract_text_map(pdf_bytes).text
+        results.append(measure(f"synthetic {pages}p", text, [f["exact_quote"] for f in expected]))
+
+    hits = sum(h for h, _ in results)
+    total = sum(t for _, t in results)
+    print(f"overall recall {hits}/{total}")
+    return 0 if hits == total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
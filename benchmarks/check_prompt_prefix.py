@@ -0,0 +1,99 @@
+"""
+Checks that the analysis prompt keeps a byte-stable prefix for the provider's
+prefix cache (see prompts.py), then measures the cache hits reported in the
+responses of the local mock server for a few consecutive analyses.
+
+    python benchmarks/check_prompt_prefix.py
+
+Exits with status 1 if a per-user or per-contract value leaks into the prefix
+(tests/test_prompt_prefix.py runs the same checks under pytest).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import engine  # noqa: E402
+import tracing  # noqa: E402
+from prompts import ANALYSIS_PROTOCOL  # noqa: E402
+from mock_llm import start_server  # noqa: E402
+from synthetic import build_lease  # noqa: E402
+
+PREFERENCES = [
+    None,
+    {"rent_increase": "High", "termination": "Low", "repairs": "Medium", "pets": "Low",
+     "subletting": "Low", "deposit": "High", "budget": 7000},
+    # Same preferences in another key order, another budget
+    {"budget": 5200, "deposit": "High", "subletting": "Low", "pets": "High",
+     "repairs": "Medium", "termination": "Low", "rent_increase": "High"},
+]
+
+
+def contracts():
+    texts = []
+    for pages, risks, seed in ((1, 2, 0), (3, 4, 1), (5, 6, 2)):
+        pdf_bytes, _ = build_lease(pages, risks, seed=seed)
+        texts.append(engine.extract_text_from_pdf(pdf_bytes)[0])
+    return texts
+
+
+def check_prefix(texts):
+    failures = []
+    systems = {}
+    for index, text in enumerate(texts):
+        legal_context, _ = engine.select_legal_context(text, None)
+        for prefs in PREFERENCES:
+            for scope in ("full", "clauses", "gaps"):
+                system = engine.build_analysis_messages(text, prefs, legal_context, scope)[0]["content"]
+                systems.setdefault(index, set()).add(system)
+                if not system.startswith(ANALYSIS_PROTOCOL):
+                    failures.append(f"contract {index}, {scope}: system prompt does not start with the protocol")
+                if prefs and str(prefs["budget"]) in system:
+                    failures.append(f"contract {index}, {scope}: the budget leaks into the system prompt")
+                if text.strip()[:200] in system:
+                    failures.append(f"contract {index}, {scope}: contract text in the system prompt")
+
+    for index, variants in systems.items():
+        if len(variants) != 1:
+            failures.append(f"contract {index}: {len(variants)} different system prompts for the same law")
+
+    # Across contracts the shared prefix must cover the protocol (and the core Articles)
+    prefix = os.path.commonprefix([next(iter(v)) for v in systems.values()])
+    print(f"system prompt shared by all contracts: {len(prefix)} chars "
+          f"(protocol: {len(ANALYSIS_PROTOCOL)} chars)")
+    return failures
+
+
+def measure_cache_hits(texts):
+    """
+    Analyzes every contract with and without preferences against the mock server.
+    Returns [(contract index, preferences, cached prompt tokens, prompt tokens)] in request order.
+    """
+    server, base_url = start_server(latency=0)
+    engine.configure("prefix-check", base_url)
+    hits = []
+    for index, text in enumerate(texts):
+        for prefs in PREFERENCES[:2]:
+            with tracing.trace("prefix_check") as run_trace:
+                legal_context, _ = engine.select_legal_context(text, None)
+                engine.analyze_contract(text, prefs, legal_context)
+            tokens = run_trace.summary()["tokens"]
+            hits.append((index, prefs, tokens["cached"], tokens["prompt"]))
+    server.shutdown()
+    return hits
+
+
+def main():
+    texts = contracts()
+    failures = check_prefix(texts)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    for index, prefs, cached, prompt in measure_cache_hits(texts):
+        print(f"contract {index}, prefs {'none' if prefs is None else 'set'}: "
+              f"{cached}/{prompt} prompt tokens from the prefix cache")
+    if not failures:
+        print("prompt prefix is stable")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Local OpenAI-compatible stand-in for DeepSeek, so the pipeline can be measured
+without an API key. POST /chat/completions answers in JSON mode ({"findings": [...]}),
+streamed or not, after a configurable latency, with the model's limits (prompts over the
+context are rejected, answers are cut at max_tokens). Usage includes simulated prefix-cache
+hits (prompt_cache_hit_tokens), so prompt-layout changes can be measured offline.
+
+Findings are either recorded (--recorded file with a JSON array, returned for every
+analysis call) or synthetic: the planted clauses of benchmarks/synthetic.py found in
+the contract text of the request, so shard and gap calls get matching answers.
+
+    python benchmarks/mock_llm.py --port 8765 --latency 0.5 --tokens-per-second 300
+    DEEPSEEK_API_KEY=x DEEPSEEK_BASE_URL=http://127.0.0.1:8765 python cli.py contracts/
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import findings_in_text
+
+GAP_FINDING = {
+    "issue_name": "Grace period for late payment",
+    "preference_category": "missing_protection",
+    "rent_amount": 0,
+    "is_legal_violation": False,
+    "exact_quote": "N/A (Missing Clause)",
+    "explanation": "The contract has no grace period before late-payment penalties.",
+    "negotiation_tip": "Ask for a 5-day grace period.",
+}
+STREAM_CHUNK_CHARS = 40
+# deepseek-chat limits: longer prompts are rejected, answers are cut at max_tokens
+CONTEXT_TOKENS = 65536
+DEFAULT_MAX_TOKENS = 4096
+# Prefix cache simulation: DeepSeek caches prompt prefixes in 64-token units
+CACHE_UNIT_TOKENS = 64
+MAX_CACHED_PROMPTS = 256
+
+
+class MockSettings:
+    def __init__(self, latency=0.2, tokens_per_second=0, recorded=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.recorded = recorded
+        self.requests = 0
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def cached_tokens(self, prompt):
+        """
+        Tokens of the longest prefix shared with an earlier prompt, like the provider's prefix cache.
+        """
+        with self.lock:
+            shared = max((len(os.path.commonprefix([prompt, seen])) for seen in self.prompts), default=0)
+            self.prompts = (self.prompts + [prompt])[-MAX_CACHED_PROMPTS:]
+        return shared // 4 // CACHE_UNIT_TOKENS * CACHE_UNIT_TOKENS
+
+
+def answer(messages, settings):
+    """
+    The findings for one chat request, following the scopes of engine.build_analysis_messages.
+    """
+    prompt = "".join(m["content"] for m in messages)
+    last = messages[-1]["content"] if messages else ""
+    if "cut off" in last:
+        return []
+    if "GAP ANALYSIS ONLY" in prompt:
+        return [GAP_FINDING]
+    if settings.recorded is not None:
+        return settings.recorded
+    contract = last.split("### CONTRACT TEXT TO ANALYZE:")[-1]
+    findings = findings_in_text(contract)
+    if "REVISED CONTRACT" in prompt:
+        # Only a previously missing protection that the changed clauses do not add
+        if GAP_FINDING["issue_name"] in last and "grace period" not in contract.lower():
+            findings.append(GAP_FINDING)
+    elif "EXCERPT ANALYSIS" not in prompt:
+        findings.append(GAP_FINDING)
+    return findings
+
+
+def make_handler(settings):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with settings.lock:
+                settings.requests += 1
+            messages = body.get("messages", [])
+            if "findings" in (messages[0]["content"] if messages else ""):
+                text = json.dumps({"findings": answer(messages, settings)}, ensure_ascii=False)
+            else:
+                # Not an analysis call (e.g. a negotiation draft)
+                text = "Hello, I would like to discuss a few clauses.\n\nBest regards,\n[Your Name]"
+            prompt = "".join(m["content"] for m in messages)
+            prompt_tokens = len(prompt) // 4
+            max_tokens = body.get("max_tokens") or DEFAULT_MAX_TOKENS
+            if prompt_tokens + max_tokens > CONTEXT_TOKENS:
+                self._send_json({"error": {"message": "This model's maximum context length is "
+                                                      f"{CONTEXT_TOKENS} tokens", "type": "invalid_request_error"}},
+                                status=400)
+                return
+            finish_reason = "stop"
+            if len(text) // 4 > max_tokens:
+                text, finish_reason = text[:max_tokens * 4], "length"
+            cached = settings.cached_tokens(prompt)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(text) // 4,
+                "total_tokens": prompt_tokens + len(text) // 4,
+                "prompt_cache_hit_tokens": cached,
+                "prompt_cache_miss_tokens": prompt_tokens - cached,
+            }
+
+            time.sleep(settings.latency)
+            if body.get("stream"):
+                self._stream(text, usage, finish_reason)
+            else:
+                self._send_json({
+                    "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": finish_reason}],
+                    "usage": usage,
+                })
+
+        def _send_json(self, payload, status=200):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, text, usage, finish_reason="stop"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            # ~4 characters per token
+            delay = STREAM_CHUNK_CHARS / 4 / settings.tokens_per_second if settings.tokens_per_second else 0
+            for i in range(0, len(text), STREAM_CHUNK_CHARS):
+                self._event({"index": 0, "delta": {"content": text[i:i + STREAM_CHUNK_CHARS]}, "finish_reason": None})
+                if delay:
+                    time.sleep(delay)
+            self._event({"index": 0, "delta": {}, "finish_reason": finish_reason}, usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _event(self, choice, usage=None):
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": "deepseek-chat", "choices": [choice]}
+            if usage:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    return Handler
+
+
+def start_server(port=0, latency=0.2, tokens_per_second=0, recorded=None):
+    """
+    Starts the mock server on a daemon thread. Returns (server, base_url); server.settings
+    holds the configuration and the request counter.
+    """
+    settings = MockSettings(latency, tokens_per_second, recorded)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(settings))
+    server.daemon_threads = True
+    server.settings = settings
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first byte of every answer")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Streaming speed (0: no delay)")
+    parser.add_argument("--recorded", help="JSON file with a findings array to return for every analysis call")
+    args = parser.parse_args()
+
+    recorded = None
+    if args.recorded:
+        with open(args.recorded, encoding="utf-8") as f:
+            recorded = json.load(f)
+    settings = MockSettings(args.latency, args.tokens_per_second, recorded)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(settings))
+    print(f"Mock DeepSeek API on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
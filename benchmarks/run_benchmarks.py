@@ -0,0 +1,163 @@
+"""
+Offline benchmark suite: synthetic leases (benchmarks/synthetic.py) from 1 to 200
+pages, analyzed against the local mock LLM server (benchmarks/mock_llm.py).
+
+For every case it reports the latency and throughput of extract_text_from_pdf,
+highlight_pdf_with_report and the end-to-end analyze_pdf (analysis cache disabled), plus the
+share of planted quotes that were highlighted. Results are compared with
+benchmarks/baseline.json; a metric more than --tolerance slower than its baseline
+is flagged and the exit status is 1 (differences below 5 ms are treated as noise).
+
+    python benchmarks/run_benchmarks.py                  # compare with the baseline
+    python benchmarks/run_benchmarks.py --save-baseline  # record a new baseline
+    python benchmarks/run_benchmarks.py --quick --llm-latency 0
+    python benchmarks/run_benchmarks.py --llm-rate 5 --llm-burst 10   # with the provider's rate limit
+
+The mock server has no rate limit, so by default the gateway's token bucket is opened
+wide (MOCK_REQUESTS_PER_SECOND) and the pipeline itself is measured.
+
+The baseline is machine-specific: re-record it on the machine you compare on.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import engine  # noqa: E402
+from analysis_model import parse_analysis  # noqa: E402
+from scoring import CATEGORIES  # noqa: E402
+from mock_llm import start_server  # noqa: E402
+from synthetic import build_lease  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# (pages, planted risks)
+CASES = [(1, 2), (10, 6), (50, 15), (200, 40)]
+QUICK_CASES = [(1, 2), (10, 6)]
+
+# Gateway rate limit against the mock server (engine.LLM_REQUESTS_PER_SECOND / LLM_BURST are the provider's)
+MOCK_REQUESTS_PER_SECOND = 1000.0
+MOCK_BURST = 1000
+
+# Tenant preferences under which every planted finding is highlighted
+BENCH_PREFS = {category: "High" for category in CATEGORIES}
+BENCH_PREFS["budget"] = 1000
+
+
+def timed(fn, *args, repeat=3, **kwargs):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_case(pages, risks, repeat):
+    pdf_bytes, expected = build_lease(pages, risks)
+    findings = parse_analysis(json.dumps(expected)).findings
+
+    extract_seconds, (_, text_map) = timed(engine.extract_text_from_pdf, pdf_bytes, repeat=repeat)
+    highlight_seconds, _ = timed(
+        engine.highlight_pdf_with_report, pdf_bytes, findings, BENCH_PREFS,
+        anchor_index=engine.QuoteAnchorIndex(text_map), repeat=repeat,
+    )
+
+    # End to end: every run is a cache miss (fresh cache file per run)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        def analyze():
+            engine.get_analysis_cache.cache_clear()
+            engine.ANALYSIS_CACHE_PATH = os.path.join(cache_dir, f"{time.perf_counter_ns()}.sqlite")
+            return engine.analyze_pdf(pdf_bytes, BENCH_PREFS)
+
+        analyze_seconds, result = timed(analyze, repeat=repeat)
+        engine.get_analysis_cache.cache_clear()
+    expected_quotes = {f.exact_quote for f in findings}
+    anchored = sum(1 for quote, entry in result["anchor_report"]["by_quote"].items()
+                   if quote in expected_quotes and entry["page"])
+
+    return {
+        "extract_seconds": round(extract_seconds, 4),
+        "extract_pages_per_second": round(pages / extract_seconds, 1),
+        "highlight_seconds": round(highlight_seconds, 4),
+        "highlight_findings_per_second": round(len(findings) / highlight_seconds, 1),
+        "analyze_seconds": round(analyze_seconds, 4),
+        "planted_quotes_highlighted": f"{anchored}/{len(expected_quotes)}",
+    }
+
+
+def compare(results, baseline, tolerance, min_delta=0.005):
+    """
+    Returns the regressions: (case, metric, baseline, current) for every *_seconds
+    metric more than tolerance (and min_delta seconds) above its baseline, or any lost highlight.
+    """
+    regressions = []
+    for case, metrics in results.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        for metric, value in metrics.items():
+            if metric not in base:
+                continue
+            if metric.endswith("_seconds") and value > base[metric] * (1 + tolerance) and value - base[metric] > min_delta:
+                regressions.append((case, metric, base[metric], value))
+            elif metric == "planted_quotes_highlighted" and value != base[metric]:
+                regressions.append((case, metric, base[metric], value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Only the small cases")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mock LLM latency per call (seconds)")
+    parser.add_argument("--llm-rate", type=float, default=MOCK_REQUESTS_PER_SECOND,
+                        help="Gateway rate limit (requests/s) against the mock server")
+    parser.add_argument("--llm-burst", type=int, default=MOCK_BURST, help="Gateway burst against the mock server")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.llm_latency)
+    engine.configure("benchmark", base_url, requests_per_second=args.llm_rate, burst=args.llm_burst)
+
+    results = {}
+    for pages, risks in QUICK_CASES if args.quick else CASES:
+        case = f"{pages}p_{risks}r"
+        results[case] = run_case(pages, risks, args.repeat)
+        metrics = results[case]
+        print(f"{case:>10}: extract {metrics['extract_seconds'] * 1000:8.1f} ms "
+              f"({metrics['extract_pages_per_second']:7.1f} pages/s) | "
+              f"highlight {metrics['highlight_seconds'] * 1000:7.1f} ms | "
+              f"analyze_pdf {metrics['analyze_seconds']:6.2f} s | "
+              f"highlighted {metrics['planted_quotes_highlighted']}")
+    print(f"mock LLM: {server.settings.requests} requests, {args.llm_latency}s latency each")
+    server.shutdown()
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline - run with --save-baseline first")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for case, metric, before, after in regressions:
+        print(f"REGRESSION {case} {metric}: {before} -> {after}")
+    if not regressions:
+        print(f"no regressions against {os.path.basename(args.baseline)} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Synthetic lease contracts for the benchmarks: numbered clauses over any number of
+pages, with risky clauses planted at known positions. build_lease() returns the PDF
+bytes together with the findings a perfect analysis would report for it.
+"""
+import random
+import re
+
+import fitz
+
+FILLER = [
+    "The parties agree that the terms of this section apply for the entire lease period and shall be "
+    "read together with the other provisions of this agreement.",
+    "All notices under this agreement shall be delivered in writing to the addresses listed above or "
+    "to any other address that a party notifies in writing.",
+    "The Tenant shall use the apartment for residential purposes only and shall keep it clean and in "
+    "good order throughout the lease period.",
+    "Payments shall be made by bank transfer on the first business day of each month to the account "
+    "designated by the Landlord.",
+    "Any change to this agreement is valid only if made in writing and signed by both parties.",
+]
+
+# Risky clauses per category: (template, is_legal_violation). Each planted clause is
+# unique through its clause number, so every finding has exactly one expected location.
+RISKY = {
+    "rent_increase": ("Under clause {n}, the Landlord may increase the monthly rent by {pct} percent at any "
+                      "time during the lease period.", False),
+    "termination": ("Under clause {n}, the Landlord may terminate this agreement with {days} days notice "
+                    "while the Tenant may not terminate it early.", True),
+    "repairs": ("Under clause {n}, the Tenant is responsible for all repairs including structural defects "
+                "costing up to {amount} NIS.", True),
+    "pets": ("Under clause {n}, no animals of any kind are permitted in the apartment.", False),
+    "subletting": ("Under clause {n}, the Tenant may not sublet any part of the apartment or take in "
+                   "a roommate.", False),
+    "deposit": ("Under clause {n}, the Tenant shall provide a security deposit of {amount} NIS before "
+                "receiving the keys.", True),
+}
+RENT_CLAUSE = "The monthly rent shall be {rent} NIS."
+CLAUSES_PER_PAGE = 9
+
+
+def _pattern(template):
+    # Extracted text breaks lines anywhere - words may be separated by any whitespace
+    escaped = re.escape(template)
+    escaped = re.sub(r"\\\{\w+\\\}", r"[\\d,]+", escaped)
+    return re.compile(re.sub(r"(?:\\ )+", r"\\s+", escaped))
+
+
+RISK_PATTERNS = {category: _pattern(template) for category, (template, _) in RISKY.items()}
+RENT_PATTERN = re.compile(r"The\s+monthly\s+rent\s+shall\s+be\s+([\d,]+)\s+NIS\.")
+
+
+def finding(category, quote, is_legal_violation, rent_amount=0):
+    return {
+        "issue_name": category.replace("_", " ").title(),
+        "preference_category": category,
+        "rent_amount": rent_amount,
+        "is_legal_violation": is_legal_violation,
+        "exact_quote": quote,
+        "explanation": f"Synthetic {category} clause planted by the benchmark.",
+        "negotiation_tip": "Ask the landlord to remove or balance this clause.",
+    }
+
+
+def findings_in_text(text):
+    """
+    The findings a perfect analysis reports for a synthetic contract text (or an excerpt of it).
+    """
+    found = []
+    rent = RENT_PATTERN.search(text)
+    if rent:
+        quote = " ".join(rent.group(0).split())
+        found.append(finding("budget", quote, False, rent_amount=rent.group(1)))
+    for category, pattern in RISK_PATTERNS.items():
+        for match in pattern.finditer(text):
+            found.append(finding(category, " ".join(match.group(0).split()), RISKY[category][1]))
+    return found
+
+
+def build_lease(pages, risks, seed=0):
+    """
+    Returns (pdf_bytes, findings) for a lease of the given number of pages with
+    risks risky clauses spread evenly over the pages (plus the rent clause on page 1).
+    """
+    rng = random.Random(seed)
+    categories = list(RISKY)
+    planted_pages = [round(i * (pages - 1) / max(risks - 1, 1)) for i in range(risks)] if risks else []
+    rent = rng.choice([4800, 6500, 7900, 9200])
+    expected = [finding("budget", RENT_CLAUSE.format(rent=f"{rent:,}"), False, rent_amount=rent)]
+
+    doc = fitz.open()
+    clause = 1
+    planted = 0
+    for page_number in range(pages):
+        lines = []
+        if page_number == 0:
+            lines.append(f"RESIDENTIAL LEASE AGREEMENT\n{clause}. RENT {RENT_CLAUSE.format(rent=f'{rent:,}')}")
+            clause += 1
+        for _ in range(CLAUSES_PER_PAGE):
+            lines.append(f"{clause}. GENERAL {rng.choice(FILLER)}")
+            clause += 1
+        while planted < len(planted_pages) and planted_pages[planted] == page_number:
+            category = categories[planted % len(categories)]
+            template, is_violation = RISKY[category]
+            quote = template.format(n=clause, pct=rng.randint(5, 30), days=rng.randint(7, 60),
+                                    amount=f"{rng.randint(5, 60) * 1000:,}")
+            lines.append(f"{clause}. SPECIAL TERMS {quote}")
+            expected.append(finding(category, quote, is_violation))
+            clause += 1
+            planted += 1
+
+        page = doc.new_page()
+        overflow = page.insert_textbox(fitz.Rect(50, 50, 545, 800), "\n".join(lines), fontsize=9)
+        if overflow < 0:
+            raise ValueError(f"page {page_number + 1} overflows - plant fewer risks per page")
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes, expected
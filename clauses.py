@@ -0,0 +1,63 @@
+import re
+
+# A clause starts at a numbered heading at the beginning of a line:
+# "1. THE PARTIES", "5.2 ...", "12) ...", "Section 4", "Article 7", "סעיף 3"
+_CLAUSE_HEADING_RE = re.compile(
+    r"^[ \t]*(?:\d{1,3}(?:\.\d{1,3})*[.)]\s|(?:Section|Article|Clause)\s+\d|סעיף\s+\d)",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+def _spans_to_clauses(text, starts):
+    clauses = []
+    bounds = sorted(set(starts)) + [len(text)]
+    for start, end in zip(bounds, bounds[1:]):
+        chunk = text[start:end]
+        if chunk.strip():
+            clauses.append({"start": start, "end": end, "text": chunk})
+    return clauses
+
+
+def count_clause_headings(contract_text):
+    return sum(1 for _ in _CLAUSE_HEADING_RE.finditer(contract_text))
+
+
+def segment_clauses(contract_text):
+    """
+    Splits the contract into clauses (numbered sections, else paragraphs, else lines).
+    Returns a list of dicts {"start", "end", "text"} in document order
+    (whitespace-only spans are dropped).
+    """
+    starts = [m.start() for m in _CLAUSE_HEADING_RE.finditer(contract_text)]
+    if len(starts) >= 2:
+        return _spans_to_clauses(contract_text, [0] + starts)
+
+    paragraph_starts = [m.end() for m in re.finditer(r"\n[ \t]*\n", contract_text)]
+    if paragraph_starts:
+        return _spans_to_clauses(contract_text, [0] + paragraph_starts)
+
+    line_starts = [m.end() for m in re.finditer(r"\n", contract_text)]
+    return _spans_to_clauses(contract_text, [0] + line_starts)
+
+
+def split_clauses(clauses, max_chars):
+    """
+    The clause texts in document order, with every clause longer than max_chars
+    split on line boundaries into pieces of at most max_chars characters.
+    """
+    pieces = []
+    for clause in clauses:
+        text = clause["text"]
+        if len(text) <= max_chars:
+            pieces.append(text)
+            continue
+        current = ""
+        for line in text.splitlines(keepends=True):
+            if current and len(current) + len(line) > max_chars:
+                pieces.append(current)
+                current = ""
+            current += line
+        if current:
+            pieces.append(current)
+    return pieces
+
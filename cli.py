@@ -0,0 +1,133 @@
+"""
+Batch analysis of a directory of rental contracts, without Streamlit.
+
+    DEEPSEEK_API_KEY=... python cli.py contracts/ --prefs prefs.json --out reports/ --concurrency 4
+
+prefs.json uses the same shape as the app's preferences, e.g.
+    {"rent_increase": "High", "termination": "Medium", "repairs": "Low",
+     "pets": "Low", "subletting": "Low", "deposit": "High", "budget": 7000}
+
+For every <name>.pdf the CLI writes <name>.json (findings and reports) and
+<name>_highlighted.pdf. Contracts whose outputs already exist are skipped unless
+--force is given, so an interrupted overnight run can simply be restarted.
+With --compare, all contracts of the directory are ranked against the preferences
+(see comparison.py) and the ranking and risk matrix are written to comparison.json.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import engine
+from comparison import rank_contracts, risk_matrix
+from scoring import CATEGORIES
+
+DEFAULT_PREFS = {category: "Medium" for category in CATEGORIES}
+DEFAULT_PREFS["budget"] = 0
+
+
+def load_prefs(path):
+    prefs = dict(DEFAULT_PREFS)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            prefs.update(json.load(f))
+    return prefs
+
+
+def output_paths(out_dir, pdf_path):
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(out_dir, f"{name}.json"), os.path.join(out_dir, f"{name}_highlighted.pdf")
+
+
+def process_contract(pdf_path, user_prefs, out_dir):
+    """
+    Analyzes one PDF and writes its JSON report and highlighted PDF.
+    """
+    started = time.perf_counter()
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+
+    result = engine.analyze_pdf(pdf_bytes, user_prefs)
+    report_path, highlighted_path = output_paths(out_dir, pdf_path)
+
+    with open(highlighted_path, "wb") as f:
+        f.write(result.pop("highlighted_pdf"))
+
+    result["source"] = os.path.abspath(pdf_path)
+    result["preferences"] = user_prefs
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return result
+
+
+def write_comparison(pdf_paths, user_prefs, out_dir):
+    """
+    Ranks every contract that has a report (from this or an earlier run) and writes comparison.json.
+    """
+    compared = []
+    for path in pdf_paths:
+        report_path, _ = output_paths(out_dir, path)
+        if os.path.exists(report_path):
+            with open(report_path, encoding="utf-8") as f:
+                compared.append((os.path.basename(path), json.load(f)))
+    ranking = rank_contracts(compared, user_prefs)
+    for row in ranking:
+        print(f"#{row['rank']:<3} {row['score']:5.1f}  {row['name']}  (rent {row['rent']:,.0f}, "
+              f"{row['violations']} violations, {row['high']} high risks)")
+    with open(os.path.join(out_dir, "comparison.json"), "w", encoding="utf-8") as f:
+        json.dump({"preferences": user_prefs, "ranking": ranking, "risk_matrix": risk_matrix(compared, user_prefs)},
+                  f, ensure_ascii=False, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analyze a directory of rental contract PDFs with RightRent.",
+        epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("contracts_dir", help="Directory containing the contract PDFs")
+    parser.add_argument("--prefs", help="JSON file with tenant preferences (default: all Medium, no budget)")
+    parser.add_argument("--out", default="reports", help="Output directory (default: reports)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Contracts analyzed at the same time")
+    parser.add_argument("--force", action="store_true", help="Re-analyze contracts that already have outputs")
+    parser.add_argument("--compare", action="store_true", help="Rank all contracts and write comparison.json")
+    args = parser.parse_args(argv)
+
+    user_prefs = load_prefs(args.prefs)
+    os.makedirs(args.out, exist_ok=True)
+
+    pdf_paths = sorted(
+        os.path.join(args.contracts_dir, name)
+        for name in os.listdir(args.contracts_dir)
+        if name.lower().endswith(".pdf")
+    )
+    pending = [
+        path for path in pdf_paths
+        if args.force or not all(os.path.exists(p) for p in output_paths(args.out, path))
+    ]
+    print(f"{len(pdf_paths)} contracts found, {len(pdf_paths) - len(pending)} already done, {len(pending)} to analyze")
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = {pool.submit(process_contract, path, user_prefs, args.out): path for path in pending}
+        for future in as_completed(futures):
+            name = os.path.basename(futures[future])
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAILED  {name}: {e}", file=sys.stderr)
+                continue
+            source = "cache" if result["from_cache"] else "model"
+            print(f"done    {name}: {len(result['findings'])} findings ({source}, {result['seconds']}s)")
+
+    if args.compare:
+        write_comparison(pdf_paths, user_prefs, args.out)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
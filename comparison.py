@@ -0,0 +1,97 @@
+from analysis_model import AnalysisResult, Finding
+from scoring import CATEGORIES, resolve_importance
+
+# Comparison of several leases: the contracts are analyzed through the normal pipeline
+# (the app submits one analysis job per contract, the CLI runs engine.analyze_pdf - the
+# analysis cache is shared), then ranked with a deterministic score and laid out side by
+# side per category. Ranking and the matrix only read the preference-independent findings
+# ("all_findings" dicts and the extracted "terms"), so new preferences re-rank locally.
+
+MATRIX_CATEGORIES = CATEGORIES + ("missing_protection",)
+
+# Penalty points (score = 100 - penalties, floored at 0)
+LEGAL_VIOLATION_PENALTY = 25
+IMPORTANCE_PENALTY = {"High": 10, "Medium": 4, "Low": 0}
+MISSING_PROTECTION_PENALTY = 2
+# Rent above the budget: a fixed penalty plus one point per percent above it
+OVER_BUDGET_PENALTY = 20
+
+
+def _analysis(result):
+    return AnalysisResult.from_findings(Finding.from_dict(item) for item in result["all_findings"])
+
+
+def _rent(result, analysis):
+    rent = result.get("terms", {}).get("rent")
+    if rent:
+        return rent
+    return max((f.rent_amount for f in analysis.findings if f.preference_category == "budget"), default=0)
+
+
+def contract_score(result, user_prefs):
+    """
+    Deterministic score 0-100 of one analysis result (all_findings and terms) for these preferences, with its breakdown.
+    """
+    analysis = _analysis(result)
+    rent = _rent(result, analysis)
+    budget = float(user_prefs.get("budget", 0) or 0)
+    breakdown = {"rent": rent, "violations": 0, "high": 0, "medium": 0, "missing": 0, "over_budget_pct": 0.0}
+    penalty = 0.0
+
+    for finding in analysis.findings:
+        if finding.preference_category == "budget":
+            continue
+        if finding.is_legal_violation:
+            breakdown["violations"] += 1
+            penalty += LEGAL_VIOLATION_PENALTY
+        elif finding.is_suggestion:
+            breakdown["missing"] += 1
+            penalty += MISSING_PROTECTION_PENALTY
+        else:
+            level = resolve_importance(finding, user_prefs)
+            if level in ("High", "Medium"):
+                breakdown[level.lower()] += 1
+            penalty += IMPORTANCE_PENALTY.get(level, 0)
+
+    # Budget 0 means no budget was given
+    if budget and rent > budget:
+        breakdown["over_budget_pct"] = round((rent - budget) / budget * 100, 1)
+        penalty += OVER_BUDGET_PENALTY + breakdown["over_budget_pct"]
+
+    return round(max(0.0, 100 - penalty), 1), breakdown
+
+
+def rank_contracts(compared, user_prefs):
+    """
+    Ranks [(name, result)] best first: by score, then the lower rent, then the name.
+    Returns one row dict per contract: rank, name, score and the score breakdown.
+    """
+    rows = []
+    for name, result in compared:
+        score, breakdown = contract_score(result, user_prefs)
+        rows.append({"name": name, "score": score, **breakdown})
+    rows.sort(key=lambda row: (-row["score"], row["rent"] or float("inf"), row["name"]))
+    return [{"rank": i + 1, **row} for i, row in enumerate(rows)]
+
+
+def risk_matrix(compared, user_prefs):
+    """
+    Side-by-side risks: {category: {name: {"count", "violations", "level"}}} over MATRIX_CATEGORIES,
+    level being the highest importance of the category's findings for this user ("" if none).
+    """
+    order = {"": 0, "Low": 1, "Medium": 2, "High": 3}
+    matrix = {category: {} for category in MATRIX_CATEGORIES}
+    for name, result in compared:
+        cells = {category: {"count": 0, "violations": 0, "level": ""} for category in MATRIX_CATEGORIES}
+        for finding in _analysis(result).findings:
+            cell = cells.get(finding.preference_category)
+            if cell is None:
+                continue
+            level = resolve_importance(finding, user_prefs)
+            cell["count"] += 1
+            cell["violations"] += finding.is_legal_violation
+            if order[level] > order[cell["level"]]:
+                cell["level"] = level
+        for category, cell in cells.items():
+            matrix[category][name] = cell
+    return matrix
@@ -0,0 +1,309 @@
+import re
+from dataclasses import asdict, dataclass
+
+# Rule-based extraction of the numeric contract terms (rent, security deposit, notice
+# period, indexation, lease term) from English or Hebrew contract text, with digits,
+# ₪/NIS amounts and number words. Terms read from an unambiguous sentence are marked verified:
+# the analysis gets them as facts, and the budget and Article 25Y deposit-cap findings are
+# computed here instead of by the LLM. The other terms are only given to the model as hints.
+
+# Article 25Y(b): total security <= min(3 months' rent, rent for one-third of the lease period)
+DEPOSIT_CAP_MONTHS = 3
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+    "אחד": 1, "אחת": 1, "שניים": 2, "שנים": 2, "שתיים": 2, "שני": 2, "שתי": 2, "שלושה": 3, "שלוש": 3,
+    "שלושת": 3, "ארבעה": 4, "ארבע": 4, "ארבעת": 4, "חמישה": 5, "חמש": 5, "חמשת": 5, "שישה": 6, "שש": 6,
+    "ששת": 6, "שבעה": 7, "שבע": 7, "שבעת": 7, "שמונה": 8, "שמונת": 8, "תשעה": 9, "תשע": 9, "תשעת": 9,
+    "עשרה": 10, "עשר": 10, "עשרת": 10, "עשרים": 20, "שלושים": 30, "ארבעים": 40, "חמישים": 50,
+    "שישים": 60, "ששים": 60, "שבעים": 70, "שמונים": 80, "תשעים": 90, "מאה": 100, "מאתיים": 200,
+    "אלף": 1000, "אלפיים": 2000,
+}
+HUNDREDS = {"hundred", "מאות"}
+THOUSANDS = {"thousand", "אלפים", "אלף"}
+
+_WORD = "|".join(sorted(list(NUMBER_WORDS) + list(HUNDREDS) + ["thousand", "אלפים"], key=len, reverse=True))
+# Hebrew joins numbers with the prefix ו ("and"): תשעת אלפים ומאתיים
+_WORD_TOKEN = rf"(?:and\s+)?ו?(?:{_WORD})(?!\w)"
+WORDS = rf"{_WORD_TOKEN}(?:[\s-]+{_WORD_TOKEN})*"
+NUM = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+CURRENCY = r"₪|NIS\b|ILS\b|ש[\"״']ח|שקלים|שקל|(?:new\s+israeli\s+)?shekels?\b"
+
+AMOUNT_RE = re.compile(
+    rf"(?:(?:{CURRENCY})\s*({NUM}))|(?:(?:({NUM})|({WORDS}))\s*\(?[\d,.]*\)?\s*(?:{CURRENCY}))", re.IGNORECASE
+)
+UNIT_DAYS = {"day": 1, "days": 1, "יום": 1, "ימים": 1, "month": 30, "months": 30, "חודש": 30, "חודשים": 30,
+             "חודשי": 30, "year": 365, "years": 365, "שנה": 365, "שנים": 365}
+# Units whose number is part of the word (חודשיים = two months)
+DUAL_UNITS = {"יומיים": 2.0, "חודשיים": 60.0, "שנתיים": 730.0}
+DURATION_RE = re.compile(
+    rf"(?:(?:({NUM})\)?|({WORDS}))[\s-]*(days?|months?|years?|ימים|יום|חודשים|חודשי|חודש|שנים|שנה)(?!\w))"
+    rf"|(?<!\w)({'|'.join(DUAL_UNITS)})(?!\w)",
+    re.IGNORECASE,
+)
+PERCENT_RE = re.compile(rf"({NUM})\s*(?:%|percent|per\s+cent|אחוזים|אחוז)", re.IGNORECASE)
+
+RENT_RE = re.compile(r"\brent\b|rental\s+fee|דמי\s+ה?שכירות|שכר\s+ה?דירה|שכ[\"״]ד", re.IGNORECASE)
+MONTHLY_RE = re.compile(r"month|לחודש|חודשי|בחודש", re.IGNORECASE)
+# Payments charged on top of the rent ("a fee of 150 NIS per month of delay") are not the rent
+FEE_RE = re.compile(
+    r"(?<!rental\s)\bfees?\b|penalt|\bfines?\b|\blate\b|delay|interest|arrears|compensation|"
+    r"קנס|ריבית|פיגור|איחור|פיצוי",
+    re.IGNORECASE,
+)
+# "a deposit of three months' rent", "ארבעה חודשי שכירות"
+RENT_MONTHS_RE = re.compile(r"months?['’]?\s+(?:of\s+)?rent|חודשי\s+ה?שכירות|חודשי\s+שכ[\"״]ד", re.IGNORECASE)
+DEPOSIT_RE = re.compile(
+    r"deposit|bank\s+guarantee|collateral|as\s+security|cash\s+security|security\s+in\s+cash|"
+    r"פיקדון|פקדון|ערבון|ערובה|בטוחה|ערבות\s+בנקאית",
+    re.IGNORECASE,
+)
+# Article 25Y(b) caps only the security the tenant pays for; a third party's personal
+# guarantee ("a guarantor shall sign a personal guarantee for up to 100,000 NIS") is not one
+GUARANTOR_RE = re.compile(
+    r"guarantor|personal\s+guarantee|(?<!\w)[וה]?ה?ערבים?(?!\w)|ערבות\s+אישית",
+    re.IGNORECASE,
+)
+# A pet deposit is a separate, legal payment (see the analysis protocol)
+PET_RE = re.compile(r"\bpets?\b|animal|חיית|חיות|כלב", re.IGNORECASE)
+NOTICE_RE = re.compile(r"notice|הודעה|התראה", re.IGNORECASE)
+INDEX_RE = re.compile(r"\bindex|\bCPI\b|consumer\s+price|מדד|צמוד|הצמדה", re.IGNORECASE)
+INCREASE_RE = re.compile(r"increase|raise|adjust|העלא|יעלה|תוספת|יגדל", re.IGNORECASE)
+TERM_RE = re.compile(r"lease\s+(?:period|term)|term\s+of|period\s+of|תקופת\s+השכירות|לתקופה", re.IGNORECASE)
+# The notice period is the duration next to the notice word ("a 14-day written notice"),
+# not another duration of the sentence ("after the first six months")
+NOTICE_DISTANCE_CHARS = 30
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+")
+# A label before a colon ("Rent: 7,000 NIS per month") stays with its value
+LABEL_MAX_WORDS = 4
+# Clause headings in capitals before the sentence ("SPECIAL TERMS Under clause 7, ...")
+_HEADING = re.compile(r"^(?:[A-Z][A-Z&/-]*\s+)+(?=[A-Z][a-z])")
+
+
+def words_to_number(words):
+    """
+    Value of a sequence of number words ("nine thousand two hundred", "תשעת אלפים ומאתיים").
+    """
+    total = current = 0
+    for token in re.findall(_WORD_TOKEN, words, re.IGNORECASE):
+        word = token.lower().removeprefix("and").strip()
+        if word not in NUMBER_WORDS and word not in HUNDREDS and word not in THOUSANDS:
+            word = word[1:]
+        if word in HUNDREDS:
+            current = (current or 1) * 100
+        elif word in THOUSANDS and not (word == "אלף" and not current):
+            total += (current or 1) * 1000
+            current = 0
+        else:
+            current += NUMBER_WORDS.get(word, 0)
+    return total + current
+
+
+def _number(digits, words):
+    if digits:
+        return float(digits.replace(",", ""))
+    return float(words_to_number(words)) if words else 0.0
+
+
+def sentences(text):
+    """
+    Whitespace-normalized sentences of the contract text (the highlighter anchors normalized quotes).
+    """
+    label = ""
+    for sentence in _SENTENCE_END.split(" ".join(text.split())):
+        sentence = label + _HEADING.sub("", sentence).strip()
+        label = ""
+        if sentence.endswith(":") and len(sentence.split()) <= LABEL_MAX_WORDS:
+            label = sentence + " "
+        elif sentence:
+            yield sentence
+    if label:
+        yield label.strip()
+
+
+def amounts(sentence):
+    return [_number(m.group(1) or m.group(2), m.group(3)) for m in AMOUNT_RE.finditer(sentence)]
+
+
+def _durations(sentence):
+    for m in DURATION_RE.finditer(sentence):
+        if m.group(4):
+            yield DUAL_UNITS[m.group(4)], m
+        else:
+            count = _number(m.group(1), m.group(2))
+            if count:
+                yield count * UNIT_DAYS[m.group(3).lower()], m
+
+
+def durations_in_days(sentence):
+    return [days for days, _ in _durations(sentence)]
+
+
+def notice_days(sentence):
+    """
+    The first duration within NOTICE_DISTANCE_CHARS of a notice word (0 if there is none).
+    """
+    notices = [m.span() for m in NOTICE_RE.finditer(sentence)]
+    for days, m in _durations(sentence):
+        if any(m.start() - end <= NOTICE_DISTANCE_CHARS and start - m.end() <= NOTICE_DISTANCE_CHARS
+               for start, end in notices):
+            return days
+    return 0.0
+
+
+@dataclass(slots=True, frozen=True)
+class ContractTerms:
+    rent: float = 0.0
+    rent_quote: str = ""
+    deposit: float = 0.0
+    deposit_quote: str = ""
+    notice_days: float = 0.0
+    notice_quote: str = ""
+    indexation_quote: str = ""
+    increase_percent: float = 0.0
+    lease_months: float = 0.0
+    # Names of the fields read from an unambiguous sentence; the others are hints
+    verified: tuple = ()
+
+    @property
+    def rent_verified(self):
+        return "rent" in self.verified
+
+    @property
+    def deposit_verified(self):
+        """
+        The deposit and the rent it is compared with are both verified (the cap check is reliable).
+        """
+        return self.rent_verified and "deposit" in self.verified
+
+    @property
+    def deposit_months(self):
+        return round(self.deposit / self.rent, 2) if self.rent and self.deposit else 0.0
+
+    @property
+    def deposit_cap(self):
+        """
+        The Article 25Y(b) cap on the total security (0 if the rent is unknown).
+        """
+        if not self.rent:
+            return 0.0
+        caps = [self.rent * DEPOSIT_CAP_MONTHS]
+        if self.lease_months:
+            caps.append(self.rent * self.lease_months / 3)
+        return min(caps)
+
+    @property
+    def deposit_exceeds_cap(self):
+        return bool(self.deposit and self.deposit_cap and self.deposit > self.deposit_cap + 0.5)
+
+    def to_dict(self):
+        data = asdict(self)
+        data.update(verified=list(self.verified), deposit_months=self.deposit_months, deposit_cap=self.deposit_cap,
+                    deposit_exceeds_cap=self.deposit_exceeds_cap)
+        return data
+
+
+def extract_terms(contract_text):
+    """
+    Extracts the numeric terms from the contract text. Fields that were not found stay 0 / "".
+    A term is verified when its sentence states it unambiguously: one amount (or duration),
+    and for the rent no increase in the same sentence.
+    """
+    terms = {}
+    verified = set()
+    deposit_months = 0.0
+    for sentence in sentences(contract_text):
+        is_deposit = (bool(DEPOSIT_RE.search(sentence)) and not PET_RE.search(sentence)
+                      and not GUARANTOR_RE.search(sentence))
+        is_rent = bool(RENT_RE.search(sentence))
+
+        if (is_rent and not is_deposit and "rent" not in terms and MONTHLY_RE.search(sentence)
+                and not FEE_RE.search(sentence)):
+            found = [a for a in amounts(sentence) if a]
+            if found:
+                terms.update(rent=found[0], rent_quote=sentence)
+                if len(set(found)) == 1 and not INCREASE_RE.search(sentence):
+                    verified.add("rent")
+
+        if is_deposit:
+            # The largest security wins (the same deposit is often mentioned again, e.g. on its return)
+            found = [a for a in amounts(sentence) if a]
+            if found and max(found) > terms.get("deposit", 0):
+                terms.update(deposit=max(found), deposit_quote=sentence)
+                if len(set(found)) == 1:
+                    verified.add("deposit")
+                else:
+                    verified.discard("deposit")
+            elif not found and (is_rent or RENT_MONTHS_RE.search(sentence)) and not deposit_months:
+                # "a deposit of three months' rent"
+                months = [d / 30 for d in durations_in_days(sentence) if d >= 30]
+                if months:
+                    deposit_months = months[0]
+                    terms.setdefault("deposit_quote", sentence)
+                    if len(months) == 1:
+                        verified.add("deposit_months")
+
+        if "notice_days" not in terms and NOTICE_RE.search(sentence):
+            days = notice_days(sentence)
+            if days:
+                terms.update(notice_days=days, notice_quote=sentence)
+                verified.add("notice_days")
+
+        if "indexation_quote" not in terms and INDEX_RE.search(sentence) and is_rent:
+            terms["indexation_quote"] = sentence
+        if "increase_percent" not in terms and is_rent and INCREASE_RE.search(sentence):
+            percent = PERCENT_RE.search(sentence)
+            if percent:
+                terms["increase_percent"] = float(percent.group(1).replace(",", ""))
+
+        if "lease_months" not in terms and TERM_RE.search(sentence):
+            found = [d for d in durations_in_days(sentence) if d >= 30]
+            if found:
+                terms["lease_months"] = round(found[0] / 30, 1) if found[0] % 365 else found[0] / 365 * 12
+                if len(set(found)) == 1:
+                    verified.add("lease_months")
+
+    if deposit_months and not terms.get("deposit") and terms.get("rent"):
+        terms["deposit"] = deposit_months * terms["rent"]
+        if "deposit_months" in verified:
+            verified.add("deposit")
+    verified.discard("deposit_months")
+    return ContractTerms(**terms, verified=tuple(sorted(verified)))
+
+
+def terms_findings(terms):
+    """
+    The findings decided by the verified terms alone, as finding dicts: the rent clause
+    (category "budget", compared with the budget locally) and a security above the Article 25Y cap.
+    """
+    findings = []
+    if terms.rent_verified:
+        findings.append({
+            "issue_name": "Monthly rent",
+            "preference_category": "budget",
+            "rent_amount": terms.rent,
+            "is_legal_violation": False,
+            "exact_quote": terms.rent_quote,
+            "explanation": f"The contract sets the monthly rent at ₪{terms.rent:,.0f} "
+                           "(read directly from the contract text and compared with your budget).",
+            "negotiation_tip": "If the rent is above your budget, ask for a lower rent or for extras "
+                               "(furniture, repairs) in return.",
+        })
+    if terms.deposit_verified and terms.deposit_exceeds_cap:
+        findings.append({
+            "issue_name": "Security deposit above the legal cap",
+            "preference_category": "deposit",
+            "rent_amount": 0,
+            "is_legal_violation": True,
+            "exact_quote": terms.deposit_quote,
+            "explanation": f"The security of ₪{terms.deposit:,.0f} equals {terms.deposit_months:g} months' rent. "
+                           "Article 25Y(b) limits the total security to the lower of three months' rent and "
+                           f"the rent for one-third of the lease period - ₪{terms.deposit_cap:,.0f} for this contract.",
+            "negotiation_tip": f"Ask to reduce the total security to at most ₪{terms.deposit_cap:,.0f}, "
+                               "as the law requires.",
+        })
+    return findings
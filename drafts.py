@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Negotiation drafts generated in the background and memoized by (selected issues, tone),
+# so every tone of a selection costs one LLM call per process and switching tones is instant.
+
+TONES = ("Polite", "Neutral", "Firm")
+MAX_DRAFTS = 128
+
+
+def selection_key(selected_items):
+    """
+    Order-independent key of the selected findings.
+    """
+    return frozenset((item.issue_name, item.explanation) for item in selected_items)
+
+
+class Draft:
+    """
+    One draft; its text grows while the model streams it. done is set when complete
+    (error holds the exception if generation failed).
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._lock = threading.Lock()
+        self.done = threading.Event()
+        self.error = None
+
+    @property
+    def text(self):
+        with self._lock:
+            return "".join(self._parts)
+
+    @property
+    def ready(self):
+        return self.done.is_set() and self.error is None
+
+    def append(self, delta):
+        with self._lock:
+            self._parts.append(delta)
+
+    def stream(self, poll_seconds=0.05):
+        """
+        Yields the text as it arrives (e.g. for st.write_stream) until the draft is complete.
+        """
+        sent = 0
+        while True:
+            finished = self.done.wait(poll_seconds)
+            text = self.text
+            if len(text) > sent:
+                yield text[sent:]
+                sent = len(text)
+            if finished:
+                break
+        if self.error is not None:
+            raise self.error
+
+
+class DraftStore:
+    """
+    Process-wide LRU of drafts. generate_stream(items, tone) yields text deltas; it runs
+    on a small thread pool, so the drafts of all tones are generated concurrently.
+    Failed drafts are forgotten, so asking again retries them.
+    """
+
+    def __init__(self, generate_stream, max_workers=len(TONES), max_drafts=MAX_DRAFTS):
+        self.generate_stream = generate_stream
+        self.max_drafts = max_drafts
+        self._drafts = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="draft")
+
+    def peek(self, selected_items, tone):
+        """
+        The memoized draft, or None if it was never requested.
+        """
+        with self._lock:
+            return self._drafts.get((selection_key(selected_items), tone))
+
+    def get(self, selected_items, tone):
+        """
+        The draft for this selection and tone, starting its generation if needed.
+        """
+        key = (selection_key(selected_items), tone)
+        with self._lock:
+            draft = self._drafts.get(key)
+            if draft is not None:
+                self._drafts.move_to_end(key)
+                return draft
+            draft = self._drafts[key] = Draft()
+            while len(self._drafts) > self.max_drafts:
+                self._drafts.popitem(last=False)
+        # Stable issue order - the same selection always gets the same prompt
+        items = sorted(selected_items, key=lambda item: (item.issue_name, item.explanation))
+        self._pool.submit(self._generate, key, draft, items, tone)
+        return draft
+
+    def prefetch(self, selected_items, tones=TONES):
+        return [self.get(selected_items, tone) for tone in tones]
+
+    def _generate(self, key, draft, items, tone):
+        try:
+            for delta in self.generate_stream(items, tone):
+                draft.append(delta)
+        except Exception as e:
+            draft.error = e
+            with self._lock:
+                if self._drafts.get(key) is draft:
+                    del self._drafts[key]
+        finally:
+            draft.done.set()
@@ -0,0 +1,879 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+import fitz
+
+from legal_retrieval import LegalIndex, estimate_tokens
+from analysis_cache import AnalysisCache, make_cache_key, sha256_text
+from scoring import apply_preferences, resolve_importance
+from analysis_model import parse_analysis, salvage_analysis
+from prompts import build_messages
+from contract_terms import extract_terms, terms_findings
+from relevance import select_relevant_clauses
+from revisions import (drop_removed_quotes, plan_revision, resolved_by_key, resolved_findings, revision_report,
+                       split_previous_facts)
+from json_stream import IncrementalArrayParser
+from clauses import segment_clauses
+from token_budget import (CONTEXT_TOKENS, MAX_OUTPUT_TOKENS, build_windows, condense_for_gaps, output_budget,
+                          plan_request, window_limits)
+from sharding import analyze_in_shards, finding_key, merge_findings
+from pdf_text import TextMap, QuoteAnchorIndex, extract_text_map
+from resources import cached_file_resource
+from tracing import expected_completion_tokens, record_usage, register_collector, span, trace, usage_tokens
+from llm_gateway import LLMGateway
+from drafts import DraftStore
+from jobs import JobQueue
+from analysis_store import AnalysisStore
+
+# Analysis engine - no Streamlit dependency, shared by app.py and cli.py
+
+# Retrieval settings for the legal knowledge base injected into the prompt
+LEGAL_TOP_K = 8
+LEGAL_TOKEN_BUDGET = 3000
+LEGAL_CONTEXT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "legal_context.txt")
+
+# Bump whenever the analysis prompt or its input (contract_terms extraction, relevance
+# filter) changes so cached results are not reused
+PROMPT_VERSION = "9"
+ANALYSIS_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "analysis_cache.sqlite")
+# Completed analyses (reloadable by ID) and their PDFs, see analysis_store.py
+ANALYSIS_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "analyses.sqlite")
+ANALYSIS_BLOBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "blobs")
+
+# A revision whose changed clauses exceed this share of the contract is analyzed in full
+REVISION_MAX_SHARE = 0.6
+
+# Long contracts (or contracts over the token budget, see token_budget.py) are split into
+# overlapping clause windows analyzed concurrently
+SHARDING_MIN_CHARS = 12000
+SHARD_MAX_CHARS = 6000
+ANALYSIS_MAX_WORKERS = 4
+
+# DeepSeek's JSON mode guarantees one valid JSON object ({"findings": [...]}).
+# Endpoints with structured outputs can use the strict schema instead:
+# {"type": "json_schema", "json_schema": {"name": "findings", "strict": True, "schema": FINDINGS_SCHEMA}}
+ANALYSIS_RESPONSE_FORMAT = {"type": "json_object"}
+# A truncated response is completed with at most this many continuation requests
+MAX_CONTINUATIONS = 2
+
+# Process-wide counters of malformed output, to measure the tokens wasted on format failures
+_format_lock = threading.Lock()
+format_stats = {
+    "responses": 0,
+    "repaired_items": 0,
+    "dropped_items": 0,
+    "truncated_responses": 0,
+    "continuations": 0,
+    "wasted_output_tokens": 0,
+    "continuation_prompt_tokens": 0,
+    "continuation_completion_tokens": 0,
+}
+
+# LLM gateway (see llm_gateway.py): process-wide limits shared by all sessions
+LLM_MAX_CONCURRENCY = 8
+# Set for the provider's limits; offline benchmarks pass their own to configure()
+LLM_REQUESTS_PER_SECOND = 5.0
+LLM_BURST = 10
+LLM_MAX_RETRIES = 4
+# Per-call deadlines (seconds), including queueing and retries
+ANALYSIS_DEADLINE_SECONDS = 300
+NEGOTIATION_DEADLINE_SECONDS = 90
+
+_client = None
+_client_config = None
+_rate_limit = (LLM_REQUESTS_PER_SECOND, LLM_BURST)
+
+
+def configure(api_key, base_url="https://api.deepseek.com", requests_per_second=None, burst=None):
+    """
+    Initializes the DeepSeek client (app.py passes the key from st.secrets).
+    Calling it again with the same settings keeps the existing client.
+    requests_per_second / burst replace the gateway's rate limit (e.g. for a local mock
+    server); by default the provider's limits apply.
+    """
+    global _client, _client_config, _rate_limit
+    rate_limit = (requests_per_second or LLM_REQUESTS_PER_SECOND, burst or LLM_BURST)
+    if rate_limit != _rate_limit:
+        _rate_limit = rate_limit
+        # The next call builds the gateway with the new limit
+        get_gateway.cache_clear()
+    if _client is not None and _client_config == (api_key, base_url):
+        return
+    from openai import OpenAI
+
+    # Retries are done by the gateway (with its deadline), not by the client
+    _client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    _client_config = (api_key, base_url)
+
+
+def get_client():
+    """
+    Returns the DeepSeek client, creating it from the DEEPSEEK_API_KEY (and optional
+    DEEPSEEK_BASE_URL) environment variables if configure() was not called.
+    """
+    if _client is None:
+        api_key = os.environ.get("DEEPSEEK_API_KEY")
+        if not api_key:
+            raise RuntimeError("DeepSeek API key missing: call engine.configure() or set DEEPSEEK_API_KEY.")
+        configure(api_key, os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com"))
+    return _client
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    """
+    The process-wide LLM gateway every call goes through; its metrics are served with the trace metrics.
+    """
+    gateway = LLMGateway(
+        get_client, max_concurrency=LLM_MAX_CONCURRENCY, requests_per_second=_rate_limit[0],
+        burst=_rate_limit[1], max_retries=LLM_MAX_RETRIES, deadline_seconds=ANALYSIS_DEADLINE_SECONDS,
+    )
+    register_collector("llm_gateway", gateway.metrics)
+    return gateway
+
+
+def parse_findings(analysis_json):
+    """
+    Parses the model's JSON into validated finding dicts (malformed items repaired or dropped).
+    Use analysis_model.parse_analysis for the typed model.
+    """
+    return parse_analysis(analysis_json).to_dicts()
+
+
+def format_report():
+    with _format_lock:
+        return dict(format_stats)
+
+
+def _record_format(report, continuation_usage=None):
+    with _format_lock:
+        format_stats["repaired_items"] += report["repaired"]
+        format_stats["dropped_items"] += report["dropped"]
+        # ~4 characters per token, as in legal_retrieval.estimate_tokens
+        format_stats["wasted_output_tokens"] += (report["dropped_chars"] + report["lost_chars"]) // 4
+        if continuation_usage is None:
+            format_stats["responses"] += 1
+        else:
+            format_stats["continuations"] += 1
+            format_stats["continuation_prompt_tokens"] += continuation_usage[0]
+            format_stats["continuation_completion_tokens"] += continuation_usage[1]
+
+
+def _continuation_messages(messages, partial_text, findings):
+    received = "\n".join(f"- {f.issue_name}" for f in findings) or "- (none)"
+    return messages + [
+        {"role": "assistant", "content": partial_text},
+        {"role": "user", "content": (
+            "Your previous response was cut off. Do NOT repeat findings that were already complete:\n"
+            f"{received}\n"
+            'Continue the analysis and return ONLY the remaining findings as {"findings": [...]} '
+            '(or {"findings": []} if nothing is left).'
+        )},
+    ]
+
+
+def repair_analysis(messages, response_text, finish_reason):
+    """
+    Validates one analysis response instead of re-running it on bad JSON: valid items are
+    kept, malformed ones repaired or dropped. If the response was cut off (finish_reason
+    "length" or an unclosed array) only the remaining findings are requested, up to
+    MAX_CONTINUATIONS times. Returns (findings, added) - added are the findings that
+    only the continuations produced.
+    """
+    result, report = salvage_analysis(response_text)
+    _record_format(report)
+    findings = list(result.findings)
+    seen = {finding_key(f.to_dict()) for f in findings}
+    added = []
+
+    truncated = finish_reason == "length" or report["truncated"]
+    partial_text = response_text
+    if truncated:
+        # Once per cut-off response; its continuations are counted by _record_format
+        with _format_lock:
+            format_stats["truncated_responses"] += 1
+    for _ in range(MAX_CONTINUATIONS if truncated else 0):
+        with span("llm_request", continuation=True) as span_attrs:
+            response = get_gateway().create(
+                model="deepseek-chat",
+                messages=_continuation_messages(messages, partial_text, findings),
+                temperature=0,
+                response_format=ANALYSIS_RESPONSE_FORMAT,
+                max_tokens=MAX_OUTPUT_TOKENS,
+                stream=False
+            )
+            _record_request_usage(span_attrs, response.usage)
+        choice = response.choices[0]
+        usage = response.usage
+        text = choice.message.content or ""
+        result, report = salvage_analysis(text)
+        _record_format(report, (usage.prompt_tokens, usage.completion_tokens) if usage else (0, estimate_tokens(text)))
+
+        for finding in result.findings:
+            key = finding_key(finding.to_dict())
+            if key not in seen:
+                seen.add(key)
+                findings.append(finding)
+                added.append(finding)
+        if not (choice.finish_reason == "length" or report["truncated"]):
+            break
+        partial_text = text
+    return findings, added
+
+
+def _record_request_usage(span_attrs, usage):
+    record_usage(usage)
+    prompt, completion, cached = usage_tokens(usage)
+    # cache_hit_rate: share of the prompt served from the provider's prefix cache
+    span_attrs.update(prompt_tokens=prompt, completion_tokens=completion, cached_tokens=cached,
+                      cache_hit_rate=round(cached / prompt, 3) if prompt else None)
+
+
+def findings_json(findings):
+    return json.dumps([f.to_dict() for f in findings], ensure_ascii=False)
+
+
+def highlight_pdf_with_report(original_pdf_bytes, findings, user_prefs, anchor_index=None, doc=None):
+    """
+    Highlights the PDF (findings: Finding objects) based on user preference importance levels:
+    - Low: No highlighting (user doesn't care)
+    - Medium: Yellow highlighting (might be problematic but acceptable)
+    - High: Red highlighting (critical, cannot compromise)
+    Returns (highlighted_pdf, report) - the anchoring report is
+    {"by_quote": {quote: {"page", "confidence", "method"}}, "anchored": n, "unanchored": n}.
+    anchor_index (a QuoteAnchorIndex of the same PDF) can be passed to skip text extraction,
+    and doc (the already opened document of original_pdf_bytes) to skip parsing it again -
+    it is annotated and closed here.
+    """
+    with span("highlight", findings=len(findings)) as span_attrs:
+        if doc is None:
+            doc = fitz.open(stream=original_pdf_bytes, filetype="pdf")
+        if anchor_index is None:
+            # Words, offsets and rects of the whole document, extracted once
+            anchor_index = QuoteAnchorIndex(TextMap.from_document(doc))
+        text_map = anchor_index.text_map
+
+        # Color map based on USER PREFERENCE importance level
+        color_map = {
+            "High": (1, 0, 0),
+            "Medium": (1, 1, 0),
+
+        }
+        report = {"by_quote": {}, "anchored": 0, "unanchored": 0}
+
+        for risk in findings:
+            quote = risk.exact_quote
+            is_legal_violation = risk.is_legal_violation
+
+            # Legal violations -> High, budget checked with Python math, otherwise the user's level
+            importance = resolve_importance(risk, user_prefs)
+
+            # Skip highlighting for Low importance - user doesn't care
+            # BUT never skip legal violations!
+            if importance == "Low" and not is_legal_violation:
+                continue
+
+            color = color_map.get(importance, (1, 1, 0))  # Default yellow if importance not found
+
+            if len(quote) > 3 and not risk.is_suggestion:
+                # Anchor the quote (normalized, then fuzzy) - no per-page search
+                anchor = anchor_index.anchor(quote)
+                first_page = None
+
+                for first_word, last_word in anchor["spans"]:
+                    for page_number, rects in text_map.rects_for_words(first_word, last_word).items():
+                        if first_page is None:
+                            first_page = page_number
+                        # Keep a reference to the page - annotations are unbound once it is collected
+                        page = doc[page_number]
+                        highlight = page.add_highlight_annot(rects)
+                        highlight.set_colors(stroke=color)
+
+                        # --- ADDED FOR XAI: Attach the explanation to the highlight ---
+                        highlight.set_info(title=risk.issue_name, content=risk.explanation)
+
+                        highlight.update()
+
+                report["by_quote"][quote] = {
+                    "page": first_page + 1 if first_page is not None else None,
+                    "confidence": anchor["confidence"],
+                    "method": anchor["method"],
+                }
+                report["anchored" if anchor["spans"] else "unanchored"] += 1
+
+        quotes = report["anchored"] + report["unanchored"]
+        span_attrs.update(anchored=report["anchored"], unanchored=report["unanchored"],
+                          hit_rate=round(report["anchored"] / quotes, 3) if quotes else None)
+        output_stream = io.BytesIO()
+        output_stream.write(doc.tobytes())
+        doc.close()
+    return output_stream.getvalue(), report
+
+
+def load_legal_index():
+    """
+    Loads legal_context.txt once per process and indexes it at Article level.
+    The index is rebuilt only when the file's mtime changes.
+    """
+    try:
+        return cached_file_resource(LEGAL_CONTEXT_PATH, LegalIndex)
+    except FileNotFoundError:
+        # Fallback if file is missing (crucial for stability)
+        return _fallback_legal_index()
+
+
+@lru_cache(maxsize=None)
+def _fallback_legal_index():
+    return LegalIndex("Landlord must fix structural issues. Cash deposit max 3 months. Fair Rental Law 2017 applies.")
+
+
+def select_legal_context(contract_text, user_prefs):
+    """
+    Retrieves only the Articles relevant to this contract and the user's Medium/High categories.
+    Returns (legal_context, report) - the report lists the injected Articles.
+    """
+    with span("retrieval") as span_attrs:
+        legal_context, report = load_legal_index().retrieve(
+            contract_text, user_prefs, top_k=LEGAL_TOP_K, token_budget=LEGAL_TOKEN_BUDGET
+        )
+        span_attrs.update(articles=len(report["articles"]), tokens=report["tokens"])
+    return legal_context, report
+
+
+def build_analysis_messages(contract_text, user_prefs=None, legal_context=None, scope="full", terms=None,
+                            revision=None):
+    """
+    Builds the RAG chat messages for the contract analysis.
+    With user_prefs=None the analysis is preference-independent: every categorized clause
+    is returned and preferences/budget are applied locally (see scoring.apply_preferences).
+    scope: "full" (whole protocol), "clauses" (an excerpt - no gap analysis)
+    or "gaps" (only the gap analysis over the full contract), "revision" (the changed clauses of
+    a revised contract, with the revision dict of prompts.request_prompt).
+    terms (contract_terms.ContractTerms) replace the rent/budget step with extracted facts.
+    The layout keeps the provider's prompt-prefix cache warm - see prompts.py.
+    """
+    # 1. Retrieve the relevant Israeli Legal Context (Ground Truth)
+    if legal_context is None:
+        legal_context, _ = select_legal_context(contract_text, user_prefs)
+
+    # 2. Static protocol + law first (cacheable prefix), per-request variables after it
+    return build_messages(contract_text, legal_context, user_prefs, scope, terms, revision)
+
+
+def request_budget(messages, contract_text, scope="full"):
+    """
+    Token plan of one analysis request (see token_budget.plan_request): prompt size,
+    expected findings and the max_tokens that leaves room for all of them.
+    """
+    fixed = estimate_tokens("".join(m["content"] for m in messages)) - estimate_tokens(contract_text)
+    return plan_request(fixed, contract_text, scope)
+
+
+def analyze_contract(contract_text, user_prefs=None, legal_context=None, scope="full", terms=None, max_tokens=None):
+    """
+    Analyzes the contract using Retrieval-Augmented Generation (RAG).
+    Cross-references the contract with the relevant Articles of legal_context.txt using DeepSeek.
+    max_tokens defaults to the answer size planned by request_budget.
+    """
+    # Call DeepSeek Chat (Fast model)
+    # Using 'deepseek-chat' for fast responses (deepseek-reasoner is too slow - 10+ minutes)
+    with span("prompt_build", scope=scope):
+        messages = build_analysis_messages(contract_text, user_prefs, legal_context, scope, terms)
+        if max_tokens is None:
+            max_tokens = request_budget(messages, contract_text, scope)["max_tokens"]
+    with span("llm_request", scope=scope, max_tokens=max_tokens) as span_attrs:
+        response = get_gateway().create(
+            model="deepseek-chat",
+            messages=messages,
+            temperature=0,
+            response_format=ANALYSIS_RESPONSE_FORMAT,
+            max_tokens=max_tokens,
+            stream=False
+        )
+        _record_request_usage(span_attrs, response.usage)
+
+    # Return the validated findings as a JSON array (bad items repaired, truncation continued)
+    choice = response.choices[0]
+    findings, _ = repair_analysis(messages, choice.message.content or "", choice.finish_reason)
+    return findings_json(findings)
+
+
+def stream_analyze_contract(contract_text, user_prefs=None, legal_context=None, terms=None, scope="full",
+                            revision=None):
+    """
+    Streaming version of analyze_contract.
+    Yields ("finding", risk_dict) as soon as each object of the JSON array is complete,
+    ("progress", received_chars) for every stream event, and finally ("done", findings_json)
+    with the validated findings (see repair_analysis).
+    """
+    with span("prompt_build", scope=scope):
+        messages = build_analysis_messages(contract_text, user_prefs, legal_context, scope, terms, revision)
+        budget = request_budget(messages, contract_text, scope)
+
+    parser = IncrementalArrayParser()
+    parts = []
+    received = 0
+    finish_reason = None
+    with span("llm_request", scope=scope, stream=True, max_tokens=budget["max_tokens"]) as span_attrs:
+        started = time.perf_counter()
+        stream = get_gateway().create(
+            model="deepseek-chat",
+            messages=messages,
+            temperature=0,
+            response_format=ANALYSIS_RESPONSE_FORMAT,
+            max_tokens=budget["max_tokens"],
+            stream=True,
+            # The last chunk carries the token usage
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.usage:
+                _record_request_usage(span_attrs, chunk.usage)
+            if not chunk.choices:
+                continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            if not parts:
+                span_attrs["first_token_seconds"] = round(time.perf_counter() - started, 4)
+            parts.append(delta)
+            received += len(delta)
+            for finding in parser.feed(delta):
+                yield "finding", finding
+            yield "progress", received
+
+    findings, added = repair_analysis(messages, "".join(parts), finish_reason)
+    for finding in added:
+        yield "finding", finding.to_dict()
+    yield "done", findings_json(findings)
+
+
+def prompt_overhead(user_prefs, legal_context, scope="full", terms=None):
+    """
+    Estimated tokens of an analysis request without the contract text (protocol, law, request header).
+    """
+    messages = build_analysis_messages("", user_prefs, legal_context, scope, terms)
+    return estimate_tokens("".join(m["content"] for m in messages))
+
+
+def analyze_contract_sharded(contract_text, user_prefs=None, legal_context=None, on_finding=None, terms=None):
+    """
+    Map-reduce analysis for long contracts: overlapping clause windows (at most SHARD_MAX_CHARS,
+    and within the token budget of token_budget.py) are analyzed concurrently (up to
+    ANALYSIS_MAX_WORKERS calls), one extra pass over the full text - condensed if it does not
+    fit the context - produces the missing protections, and the findings are merged and
+    deduplicated by quote and category across windows.
+    Returns the merged findings as a JSON array string.
+    """
+    if legal_context is None:
+        legal_context, _ = select_legal_context(contract_text, user_prefs)
+
+    def analyze_shard(shard):
+        shard_text, findings = shard
+        return parse_findings(analyze_contract(shard_text, user_prefs, legal_context, scope="clauses", terms=terms,
+                                               max_tokens=output_budget(findings)))
+
+    clauses = segment_clauses(contract_text)
+    with span("windows") as span_attrs:
+        max_chars, max_findings = window_limits(prompt_overhead(user_prefs, legal_context, "clauses", terms),
+                                                SHARD_MAX_CHARS)
+        shards = build_windows(clauses, max_chars, max_findings)
+        gaps_overhead = prompt_overhead(user_prefs, legal_context, "gaps")
+        gaps_text = contract_text
+        gaps_budget = plan_request(gaps_overhead, contract_text, "gaps")
+        if not gaps_budget["fits"]:
+            gaps_text = condense_for_gaps([c["text"] for c in clauses],
+                                          CONTEXT_TOKENS - gaps_overhead - gaps_budget["max_tokens"])
+        span_attrs.update(windows=len(shards), max_chars=max_chars, gaps_condensed=gaps_text is not contract_text)
+
+    def analyze_gaps():
+        return parse_findings(analyze_contract(gaps_text, user_prefs, legal_context, scope="gaps"))
+
+    def report(findings):
+        if on_finding:
+            for finding in findings:
+                on_finding(finding)
+
+    merged = analyze_in_shards(
+        shards, analyze_shard, analyze_gaps, max_workers=ANALYSIS_MAX_WORKERS, on_findings=report
+    )
+    return json.dumps(merged, ensure_ascii=False)
+
+
+@lru_cache(maxsize=None)
+def get_analysis_cache():
+    """
+    One SQLite-backed cache per process; the file itself is shared across processes.
+    """
+    cache = AnalysisCache(ANALYSIS_CACHE_PATH)
+    register_collector("analysis_cache", cache.stats)
+    return cache
+
+
+def extract_contract_terms(contract_text):
+    """
+    Rule-based rent, deposit, notice and indexation terms (see contract_terms.py) - no API call.
+    """
+    with span("terms") as span_attrs:
+        terms = extract_terms(contract_text)
+        span_attrs.update(rent=terms.rent, deposit=terms.deposit, deposit_exceeds_cap=terms.deposit_exceeds_cap,
+                          verified=",".join(terms.verified))
+    return terms
+
+
+def select_analysis_text(contract_text, user_prefs=None):
+    """
+    The contract without the clauses that cannot produce a finding (see relevance.py).
+    Returns (text, report) - the report has the pruned clauses and the token reduction.
+    """
+    with span("relevance") as span_attrs:
+        text, report = select_relevant_clauses(contract_text, user_prefs)
+        span_attrs.update(clauses=report["clauses"], kept=report["kept"], tokens_before=report["tokens_before"],
+                          tokens_after=report["tokens_after"], reduction=report["reduction"])
+    return text, report
+
+
+def merge_terms_findings(fact_findings, findings, terms):
+    """
+    Adds the findings computed from the extracted terms to the model's findings. The system's
+    rent clause (verified rent only) replaces any "budget" item of the model; duplicates are merged
+    by quote and category.
+    """
+    if terms.rent_verified:
+        findings = [f for f in findings if f.get("preference_category") != "budget"]
+    return merge_findings([fact_findings, findings])
+
+
+def cached_analyze_contract(contract_text, user_prefs, legal_context, on_finding=None, on_progress=None, terms=None,
+                            relevance=None):
+    """
+    Returns (analysis_results, from_cache). Identical contract + preferences + law +
+    prompt version never pay for a second DeepSeek call. Pass user_prefs=None for the
+    preference-independent analysis, which is shared by all preference settings.
+    On a cache miss the analysis is streamed: on_finding(risk) is called for every
+    completed finding and on_progress(received_chars) for every stream event.
+    Contracts longer than SHARDING_MIN_CHARS, or whose request or answer would exceed the
+    token budget (see token_budget.py), are analyzed in concurrent windows instead.
+    The verified rent and Article 25Y deposit check come from terms (extracted here if not
+    given): they are reported before the model's findings and given to it as facts.
+    Only the relevant clauses are sent (relevance: the (text, report) of select_analysis_text).
+    """
+    key = make_cache_key(contract_text, user_prefs, legal_context, PROMPT_VERSION)
+    cached = get_analysis_cache().get(key)
+    if cached is not None:
+        return cached, True
+    return _analyze_and_cache(key, contract_text, user_prefs, legal_context, on_finding, on_progress, terms,
+                              relevance), False
+
+
+def _analyze_and_cache(key, contract_text, user_prefs, legal_context, on_finding=None, on_progress=None, terms=None,
+                       relevance=None):
+    """
+    The cache-miss path of cached_analyze_contract: analyzes, stores the result under key and returns it.
+    """
+    if terms is None:
+        terms = extract_contract_terms(contract_text)
+    if relevance is None:
+        relevance = select_analysis_text(contract_text, user_prefs)
+    analysis_text = relevance[0]
+    fact_findings = terms_findings(terms)
+    if on_finding:
+        for finding in fact_findings:
+            on_finding(finding)
+
+    def report_model_finding(finding):
+        if on_finding and not (terms.rent_verified and finding.get("preference_category") == "budget"):
+            on_finding(finding)
+
+    if len(analysis_text) > SHARDING_MIN_CHARS or \
+            not plan_request(prompt_overhead(user_prefs, legal_context, "full", terms), analysis_text)["fits"]:
+        analysis_results = analyze_contract_sharded(
+            analysis_text, user_prefs, legal_context, report_model_finding, terms=terms
+        )
+    else:
+        analysis_results = "[]"
+        for event, payload in stream_analyze_contract(analysis_text, user_prefs, legal_context, terms=terms):
+            if event == "finding":
+                report_model_finding(payload)
+            elif event == "progress" and on_progress:
+                on_progress(payload)
+            elif event == "done":
+                analysis_results = payload
+
+    merged = merge_terms_findings(fact_findings, parse_findings(analysis_results), terms)
+    analysis_results = json.dumps(merged, ensure_ascii=False)
+    get_analysis_cache().set(key, analysis_results)
+    return analysis_results
+
+
+def analyze_revision(contract_text, previous_text, previous_findings, legal_context, on_finding=None,
+                     on_progress=None, terms=None):
+    """
+    Re-analysis of a revised contract against its previous version (previous_text and its
+    all-findings dicts): only the changed and added clauses are sent to the model, findings
+    of unchanged clauses are carried over with re-anchored quotes (see revisions.py).
+    Returns (analysis_results, report, from_cache) - the report has the clause diff counts,
+    the carried, new and resolved findings and the share of the contract that was sent.
+    The result is cached like a full analysis of the new text.
+    """
+    if terms is None:
+        terms = extract_contract_terms(contract_text)
+    # Rent and deposit-cap findings are recomputed from the new terms; a deposit-cap finding is
+    # carried over while the new terms cannot verify that it was fixed
+    previous_facts = terms_findings(extract_terms(previous_text))
+    fact_keys = {finding_key(f) for f in previous_facts}
+    previous_model = [f for f in previous_findings if finding_key(f) not in fact_keys]
+    resolved_facts, carried_facts = split_previous_facts(previous_facts, terms, contract_text)
+
+    with span("revision") as span_attrs:
+        plan = plan_revision(previous_text, contract_text, previous_model)
+        span_attrs.update(carried=len(plan["carried"]), stale=len(plan["stale"]),
+                          tokens_sent=plan["tokens_sent"], tokens_full=plan["tokens_full"])
+
+    cache = get_analysis_cache()
+    key = make_cache_key(contract_text, None, legal_context, PROMPT_VERSION)
+    # One lookup: a revision is counted as a single hit or miss
+    cached = cache.get(key)
+    edited_text = plan["delta_text"] + "".join(plan["removed_texts"])
+    if cached is not None or plan["tokens_sent"] > REVISION_MAX_SHARE * plan["tokens_full"] or \
+            not plan_request(prompt_overhead(None, legal_context, "revision", terms), edited_text, "revision")["fits"]:
+        # Seen before, rewritten too much for a partial analysis, or an edit over the token
+        # budget (the full analysis is windowed): compare the full results
+        from_cache = cached is not None
+        analysis_results = cached if from_cache else _analyze_and_cache(
+            key, contract_text, None, legal_context, on_finding, on_progress, terms=terms
+        )
+        findings = parse_findings(analysis_results)
+        previous_keys = {finding_key(f) for f in previous_findings}
+        delta = [f for f in findings if finding_key(f) not in previous_keys]
+        resolved = resolved_by_key(previous_model, findings) + resolved_by_key(resolved_facts, findings)
+        return analysis_results, revision_report(plan, delta, resolved), from_cache
+
+    fact_findings = terms_findings(terms)
+    carried = plan["carried"] + carried_facts
+    edited = bool(plan["delta_text"] or plan["removed_texts"])
+    if not edited:
+        # Nothing edited - the previous missing protections still apply
+        carried = carried + plan["missing"]
+    if on_finding:
+        for finding in fact_findings + carried:
+            on_finding(finding)
+
+    delta = []
+    resolved = []
+    if edited:
+        revision = {"missing": [f.get("issue_name", "") for f in plan["missing"]], "removed": plan["removed_texts"]}
+        delta_text = plan["delta_text"] or "(no changed or added clauses)"
+        for event, payload in stream_analyze_contract(delta_text, None, legal_context, terms=terms,
+                                                      scope="revision", revision=revision):
+            if event == "finding":
+                if on_finding and not (terms.rent_verified and payload.get("preference_category") == "budget") \
+                        and drop_removed_quotes(plan, [payload]):
+                    on_finding(payload)
+            elif event == "progress" and on_progress:
+                on_progress(payload)
+            elif event == "done":
+                delta = drop_removed_quotes(plan, parse_findings(payload))
+        resolved = resolved_findings(plan, delta)
+    resolved += resolved_by_key(resolved_facts, fact_findings)
+
+    merged = merge_terms_findings(fact_findings, carried + delta, terms)
+    analysis_results = json.dumps(merged, ensure_ascii=False)
+    cache.set(key, analysis_results)
+    return analysis_results, revision_report(plan, delta, resolved), False
+
+
+def extract_text_from_pdf(pdf_bytes, doc=None):
+    """
+    Extracts text from every page of the PDF (in page order; large documents in parallel).
+    Returns (full_text, text_map) - the TextMap maps character offsets to (page, bbox).
+    Pass doc if the document is already open to avoid parsing it twice.
+    """
+    with span("extract") as span_attrs:
+        text_map = extract_text_map(pdf_bytes, doc=doc)
+        span_attrs.update(pages=text_map.page_count, chars=len(text_map.text))
+    return text_map.text, text_map
+
+
+def negotiation_messages(selected_items, tone):
+    """
+    The chat messages for a negotiation draft in the given tone about the selected findings.
+    """
+    issues_summary = "\n".join([f"- {item.issue_name}: {item.explanation}" for item in selected_items])
+
+    system_prompt = f"""
+    You are the TENANT. Write a {tone} message to your potential landlord.
+    Focus ONLY on these issues: 
+    {issues_summary}
+
+    ### CRITICAL IDENTITY RULES:
+    - ALWAYS write in the FIRST person (use "I", "my", "me", "mine").
+    - NEVER speak as an advocate, lawyer, or third party.
+
+    ### WHATSAPP FORMATTING:
+    - Use single asterisks for bold: *Text*.
+    - No Markdown headers (#).
+    - Clear line breaks between paragraphs.
+
+    ### MANDATORY SIGN-OFF:
+    - You MUST end the message EXACTLY with:
+      Best regards,
+      [Your Name]
+    """
+    return [{"role": "system", "content": system_prompt}]
+
+
+def stream_negotiation_message(selected_items, tone):
+    """
+    Generates a negotiation message from the tenant's first-person perspective (consistent
+    sign-off, WhatsApp formatting) and yields its text as it arrives.
+    """
+    with span("llm_request", purpose="negotiation", tone=tone, stream=True) as span_attrs:
+        started = time.perf_counter()
+        stream = get_gateway().create(
+            model="deepseek-chat",
+            messages=negotiation_messages(selected_items, tone),
+            stream=True,
+            stream_options={"include_usage": True},
+            deadline_seconds=NEGOTIATION_DEADLINE_SECONDS
+        )
+        first = True
+        for chunk in stream:
+            if chunk.usage:
+                _record_request_usage(span_attrs, chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            if first:
+                span_attrs["first_token_seconds"] = round(time.perf_counter() - started, 4)
+                first = False
+            yield delta
+
+
+@lru_cache(maxsize=None)
+def get_draft_store():
+    """
+    One negotiation-draft memo per process, shared by all sessions.
+    """
+    return DraftStore(stream_negotiation_message)
+
+
+def analyze_pdf(pdf_bytes, user_prefs, on_finding=None, on_progress=None):
+    """
+    Full pipeline for one PDF: extraction, preference-independent analysis (cached),
+    local preference scoring and highlighting. The PDF is parsed once.
+    Returns a dict with the filtered findings, all findings, the highlighted PDF bytes
+    and the anchoring/retrieval/relevance reports, the extracted contract terms and the per-phase trace summary.
+    """
+    with trace("analyze_pdf") as pdf_trace:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        contract_text, text_map = extract_text_from_pdf(pdf_bytes, doc=doc)
+        legal_context, retrieval_report = select_legal_context(contract_text, None)
+        terms = extract_contract_terms(contract_text)
+        relevance = select_analysis_text(contract_text)
+        all_findings, from_cache = cached_analyze_contract(
+            contract_text, None, legal_context, on_finding=on_finding, on_progress=on_progress, terms=terms,
+            relevance=relevance,
+        )
+        analysis = parse_analysis(all_findings)
+        highlighted_pdf, anchor_report = highlight_pdf_with_report(
+            pdf_bytes, analysis.findings, user_prefs, anchor_index=QuoteAnchorIndex(text_map), doc=doc
+        )
+    return {
+        "findings": [f.to_dict() for f in apply_preferences(analysis.findings, user_prefs)],
+        "all_findings": analysis.to_dicts(),
+        "highlighted_pdf": highlighted_pdf,
+        "anchor_report": anchor_report,
+        "retrieval_report": retrieval_report,
+        "terms": terms.to_dict(),
+        "relevance_report": relevance[1],
+        "from_cache": from_cache,
+        "trace": pdf_trace.summary(),
+    }
+
+
+def analysis_job_key(pdf_bytes, previous_text=None):
+    """
+    Jobs with the same PDF (and the same previous version for a revision) share one analysis.
+    """
+    previous = sha256_text(previous_text) if previous_text else None
+    return hashlib.sha256(pdf_bytes).hexdigest(), previous
+
+
+def run_analysis_job(job, pdf_bytes, previous_text=None, previous_findings=None):
+    """
+    Body of an analysis job (see jobs.py): extraction and the preference-independent analysis,
+    or the revision of previous_text / previous_findings. Findings, phase and progress are
+    reported on the job as they happen. Preferences and highlighting are applied by the caller.
+    Returns the contract text, anchor index, parsed findings, the retrieval/revision reports, the
+    extracted terms and the opened document ("doc"), which the first caller takes to highlight without parsing again.
+    """
+    with trace("analysis_job", job=job.id) as job_trace:
+        def show_phase(event, record):
+            if event == "start":
+                job.update(phase=record["phase"], progress=job_trace.progress())
+
+        def show_progress(received_chars):
+            # Progress of the LLM phase: tokens received vs. the measured average answer
+            fraction = received_chars / 4 / expected_completion_tokens()
+            job.update(received_chars=received_chars, progress=job_trace.progress(fraction))
+
+        job_trace.listeners.append(show_phase)
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        contract_text, text_map = extract_text_from_pdf(pdf_bytes, doc=doc)
+        legal_context, retrieval_report = select_legal_context(contract_text, None)
+        terms = extract_contract_terms(contract_text)
+        revision_report = None
+        if previous_text is not None:
+            all_findings, revision_report, from_cache = analyze_revision(
+                contract_text, previous_text, previous_findings, legal_context,
+                on_finding=job.add_finding, on_progress=show_progress, terms=terms
+            )
+        else:
+            all_findings, from_cache = cached_analyze_contract(
+                contract_text, None, legal_context, on_finding=job.add_finding, on_progress=show_progress,
+                terms=terms
+            )
+        analysis = parse_analysis(all_findings)
+        anchor_index = QuoteAnchorIndex(text_map)
+    return {
+        "contract_text": contract_text,
+        "anchor_index": anchor_index,
+        "all_findings": analysis,
+        "retrieval_report": retrieval_report,
+        "revision_report": revision_report,
+        "terms": terms.to_dict(),
+        "from_cache": from_cache,
+        "trace": job_trace.summary(),
+        "doc": doc,
+    }
+
+
+@lru_cache(maxsize=None)
+def get_job_queue():
+    """
+    One analysis job queue per process, shared by all sessions (and page reloads).
+    """
+    queue = JobQueue(run_analysis_job)
+    register_collector("jobs", queue.stats)
+    return queue
+
+
+@lru_cache(maxsize=None)
+def get_analysis_store():
+    """
+    One persistent analysis store per process; the files are shared across processes.
+    Compacted once at startup (e.g. when the app wakes from sleep).
+    """
+    store = AnalysisStore(ANALYSIS_STORE_PATH, ANALYSIS_BLOBS_DIR)
+    store.compact()
+    register_collector("analysis_store", store.stats)
+    return store
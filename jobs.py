@@ -0,0 +1,150 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Background analysis jobs: the analysis runs on a process-wide worker pool instead of the
+# Streamlit script thread, so reruns (any click) and reconnects do not interrupt or repeat it.
+# The session keeps only its ticket for the job (also in the page URL, so a reload finds the
+# job again); step 3 polls the job and renders the findings reported so far.
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOB_MAX_WORKERS = 4
+# Finished jobs are kept for pickup (page reload) until this many newer jobs exist
+MAX_JOBS = 32
+
+
+class Job:
+    """
+    One analysis job. The worker reports its progress with update() and add_finding();
+    readers poll snapshot() or wait(). result / error are set when it finishes.
+    """
+
+    def __init__(self, key, payload):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        # The inputs that define the job (e.g. the PDF) - shared by every submission that joins it
+        self.payload = payload
+        self.status = QUEUED
+        self.phase = None
+        self.progress = 0.0
+        self.received_chars = 0
+        self.findings = []
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def add_finding(self, finding):
+        with self._lock:
+            self.findings.append(finding)
+
+    def snapshot(self, since=0):
+        """
+        Status fields and the findings reported after the first since ones.
+        """
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "phase": self.phase,
+                "progress": self.progress,
+                "received_chars": self.received_chars,
+                "findings": self.findings[since:],
+                "finding_count": len(self.findings),
+                "seconds": round((self.finished or time.time()) - self.created, 2),
+            }
+
+    def wait(self, timeout=None):
+        """
+        True once the job has finished (done or failed).
+        """
+        return self.done.wait(timeout)
+
+
+class JobQueue:
+    """
+    Process-wide jobs run by run(job, *args) on a thread pool (the analysis waits on the
+    LLM, so threads suffice). Submitting the same key again while its job is queued, running
+    or done joins that job - a retry after a disconnect is not paid twice; failed jobs
+    are retried. Jobs are kept in an LRU of max_jobs.
+    Every submission gets its own ticket, which finds the job together with that submitter's
+    data (e.g. preferences): only what defines the job belongs in the shared payload.
+    """
+
+    def __init__(self, run, max_workers=JOB_MAX_WORKERS, max_jobs=MAX_JOBS):
+        self.run = run
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._tickets = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, key, payload, *args, submitter=None):
+        """
+        Returns (job, ticket). submitter is the data of this submission only (kept with the
+        ticket, never shared with other submissions of the same job).
+        """
+        ticket = uuid.uuid4().hex
+        with self._lock:
+            job = self._jobs.get(self._by_key.get(key))
+            if job is not None and job.status != FAILED:
+                self._jobs.move_to_end(job.id)
+                self._tickets[ticket] = (job.id, submitter)
+                return job, ticket
+            job = Job(key, payload)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            self._tickets[ticket] = (job.id, submitter)
+            self._evict()
+        self._pool.submit(self._execute, job, args)
+        return job, ticket
+
+    def get(self, ticket):
+        """
+        (job, submitter) of a ticket, or (None, None) if it is unknown or its job was evicted.
+        """
+        with self._lock:
+            job_id, submitter = self._tickets.get(ticket, (None, None))
+            job = self._jobs.get(job_id)
+            return (job, submitter) if job is not None else (None, None)
+
+    def _evict(self):
+        # Oldest finished jobs first; running jobs are never dropped
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done.is_set()]:
+            if len(self._jobs) <= self.max_jobs:
+                break
+            job = self._jobs.pop(job_id)
+            if self._by_key.get(job.key) == job_id:
+                del self._by_key[job.key]
+        for ticket in [t for t, (job_id, _) in self._tickets.items() if job_id not in self._jobs]:
+            del self._tickets[ticket]
+
+    def _execute(self, job, args):
+        job.update(status=RUNNING)
+        try:
+            result = self.run(job, *args)
+            job.update(status=DONE, result=result, progress=1.0)
+        except Exception as e:
+            job.update(status=FAILED, error=e)
+        finally:
+            job.update(finished=time.time())
+            job.done.set()
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {status: sum(1 for job in jobs if job.status == status) for status in (QUEUED, RUNNING, DONE, FAILED)}
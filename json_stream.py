@@ -0,0 +1,117 @@
+import json
+import re
+
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+def repair_object(raw):
+    """
+    Best-effort parse of one malformed JSON object: raw control characters inside
+    strings and trailing commas. Returns the parsed value or None.
+    """
+    for candidate in (raw, _TRAILING_COMMA_RE.sub(r"\1", raw)):
+        try:
+            return json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+class IncrementalArrayParser:
+    """
+    Parses a JSON array of objects while it is still being generated.
+    feed() returns every top-level object that became complete with the new chunk,
+    so each risk can be shown as soon as the model finishes writing it.
+    Anything before the opening "[" (e.g. a ```json fence or the {"findings": key
+    of JSON mode) is ignored. Objects that fail to parse are repaired when possible
+    (counted in repaired) or dropped (counted in skipped / skipped_chars).
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+        self.finished = False
+        self.object_start = None
+        self.skipped = 0
+        self.skipped_chars = 0
+        self.repaired = 0
+
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+
+        while self.pos < len(self.text) and not self.finished:
+            ch = self.text[self.pos]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif not self.started:
+                if ch == "[":
+                    self.started = True
+                    self.depth = 1
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                if self.depth == 1 and ch == "{":
+                    self.object_start = self.pos
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 1 and ch == "}" and self.object_start is not None:
+                    raw = self.text[self.object_start:self.pos + 1]
+                    self.object_start = None
+                    try:
+                        completed.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        repaired = repair_object(raw)
+                        if repaired is not None:
+                            self.repaired += 1
+                            completed.append(repaired)
+                        else:
+                            # Malformed object - skip it, the rest of the array is still usable
+                            self.skipped += 1
+                            self.skipped_chars += len(raw)
+                elif self.depth == 0:
+                    self.finished = True
+
+            self.pos += 1
+
+        # Drop consumed text that no pending object needs
+        keep_from = self.object_start if self.object_start is not None else self.pos
+        self.text = self.text[keep_from:]
+        self.pos -= keep_from
+        if self.object_start is not None:
+            self.object_start = 0
+        return completed
+
+
+def salvage_array(text):
+    """
+    Recovers every complete object of a (possibly truncated or malformed) JSON array.
+    Returns (items, report); report has "repaired", "dropped", "dropped_chars",
+    "truncated" (the array was never closed) and "lost_chars" (unfinished tail).
+    """
+    parser = IncrementalArrayParser()
+    items = parser.feed(text)
+    report = {
+        "repaired": parser.repaired,
+        "dropped": parser.skipped,
+        "dropped_chars": parser.skipped_chars,
+        "truncated": not parser.finished,
+        "lost_chars": len(parser.text) if parser.object_start is not None else 0,
+    }
+    if not parser.started:
+        # No array at all - a single bare object is still a usable answer
+        value = repair_object(text[text.find("{"):text.rfind("}") + 1])
+        if isinstance(value, dict) and value and "findings" not in value:
+            items, report["truncated"] = [value], False
+    return items, report
@@ -0,0 +1,188 @@
+import math
+import re
+from collections import Counter
+
+# Articles that the analysis protocol explicitly cites ("Key laws to check").
+# They are always injected so the model can ground every mandatory check.
+CORE_ARTICLES = ("7", "8", "25H", "25T", "25Y", "25YG", "25YD")
+
+# Query expansion per user preference category. Used to pull in articles that the
+# contract text alone may not surface (e.g. a contract that is silent on subletting).
+CATEGORY_KEYWORDS = {
+    "rent_increase": "rent increase indexation adjustment payment amount",
+    "termination": "termination cancellation notice early exit extension lease term",
+    "repairs": "repair defect maintenance fit residence urgent landlord",
+    "pets": "use leased asset tenant alterations",
+    "subletting": "sublease assignment transfer consent third party",
+    "deposit": "security guarantee deposit collateral return",
+}
+
+STOPWORDS = {
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "by", "with", "as", "at",
+    "be", "is", "are", "was", "were", "this", "that", "any", "all", "such", "it", "its",
+    "from", "shall", "may", "not", "no", "if", "than", "under", "which", "who", "has",
+    "have", "been", "their", "they", "there", "these", "those", "also", "other", "same",
+}
+
+_ARTICLE_RE = re.compile(r"^Article (\w+): (.+)$")
+_CHAPTER_RE = re.compile(r"^CHAPTER ")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def estimate_tokens(text):
+    """
+    Rough token estimate (~4 characters per token for English legal text).
+    """
+    return max(1, len(text) // 4)
+
+
+def tokenize(text):
+    """
+    Lowercases the text, drops stopwords and applies a light plural stemming.
+    """
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok in STOPWORDS or len(tok) < 2:
+            continue
+        if len(tok) > 4 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def split_articles(legal_text):
+    """
+    Splits the law into Article-level chunks.
+    Returns a list of dicts: {"id", "title", "chapter", "text"} in document order.
+    """
+    articles = []
+    chapter = ""
+    current = None
+
+    for line in legal_text.splitlines():
+        stripped = line.strip()
+        if _CHAPTER_RE.match(stripped):
+            chapter = stripped
+            current = None
+            continue
+
+        match = _ARTICLE_RE.match(stripped)
+        if match:
+            current = {"id": match.group(1), "title": match.group(2), "chapter": chapter, "lines": [stripped]}
+            articles.append(current)
+        elif current is not None and stripped:
+            current["lines"].append(stripped)
+
+    for article in articles:
+        article["text"] = "\n".join(article.pop("lines"))
+    return articles
+
+
+class LegalIndex:
+    """
+    BM25 index over the Articles of the law. Built once, queried per analysis.
+    """
+
+    def __init__(self, legal_text, k1=1.5, b=0.75):
+        self.full_text = legal_text
+        self.articles = split_articles(legal_text)
+        self.k1 = k1
+        self.b = b
+
+        self.doc_terms = [Counter(tokenize(a["title"] + " " + a["text"])) for a in self.articles]
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0
+
+        doc_freq = Counter()
+        for terms in self.doc_terms:
+            doc_freq.update(terms.keys())
+        n = len(self.articles)
+        self.idf = {t: math.log(1 + (n - df + 0.5) / (df + 0.5)) for t, df in doc_freq.items()}
+
+    def score(self, query_weights):
+        """
+        Returns a BM25 score per article for a {term: weight} query.
+        """
+        scores = []
+        for terms, length in zip(self.doc_terms, self.doc_lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length)
+            total = 0.0
+            for term, weight in query_weights.items():
+                tf = terms.get(term)
+                if tf:
+                    total += weight * self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(total)
+        return scores
+
+    def build_query(self, contract_text, user_prefs):
+        """
+        Query = contract vocabulary (log-damped) + keywords of Medium/High categories
+        (all categories when user_prefs is None).
+        """
+        weights = {}
+        for term, count in Counter(tokenize(contract_text)).items():
+            if term in self.idf:
+                weights[term] = 1 + math.log(count)
+
+        for category, keywords in CATEGORY_KEYWORDS.items():
+            if user_prefs is None:
+                # Preference-independent analysis - every category is relevant
+                boost = 1.0
+            else:
+                boost = {"High": 2.0, "Medium": 1.0}.get(user_prefs.get(category))
+            if not boost:
+                continue
+            for term in tokenize(keywords):
+                if term in self.idf:
+                    weights[term] = weights.get(term, 0) + boost
+        return weights
+
+    def retrieve(self, contract_text, user_prefs, top_k=8, token_budget=3000):
+        """
+        Selects the core Articles plus the top-k most relevant ones within the token budget.
+        Returns (legal_context, report). The report lists which Articles were injected.
+        """
+        full_tokens = estimate_tokens(self.full_text)
+        if not self.articles:
+            # Unstructured knowledge (e.g. the fallback summary) - inject as is
+            report = {"articles": [], "tokens": full_tokens, "full_tokens": full_tokens, "budget": token_budget}
+            return self.full_text, report
+
+        scores = self.score(self.build_query(contract_text, user_prefs))
+        ranked = sorted(range(len(self.articles)), key=lambda i: scores[i], reverse=True)
+        core = [i for i, a in enumerate(self.articles) if a["id"] in CORE_ARTICLES]
+
+        selected = []
+        used_tokens = 0
+        extra = 0
+        for i in core + [i for i in ranked if i not in core]:
+            is_core = i in core
+            if not is_core and (extra >= top_k or scores[i] <= 0):
+                continue
+            cost = estimate_tokens(self.articles[i]["text"])
+            if used_tokens + cost > token_budget and not is_core:
+                continue
+            selected.append(i)
+            used_tokens += cost
+            if not is_core:
+                extra += 1
+
+        # Core Articles first, then the rest in document order - the core block is then a
+        # stable part of the cacheable prompt prefix for every contract
+        selected.sort(key=lambda i: (i not in core, i))
+        context = "\n\n".join(self.articles[i]["text"] for i in selected)
+        report = {
+            "articles": [
+                {
+                    "id": self.articles[i]["id"],
+                    "title": self.articles[i]["title"],
+                    "score": round(scores[i], 2),
+                    "core": i in core,
+                }
+                for i in selected
+            ],
+            "tokens": used_tokens,
+            "full_tokens": full_tokens,
+            "budget": token_budget,
+        }
+        return context, report
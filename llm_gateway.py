@@ -0,0 +1,312 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide gateway in front of the chat completions API: every LLM call of every
+# session goes through it. It caps concurrent calls (semaphore), paces new calls (token
+# bucket), retries 429/5xx and connection errors with jittered exponential backoff,
+# enforces a deadline per call and coalesces identical concurrent requests into one
+# upstream call (single flight) - streamed chunks are replayed to every caller, without
+# the token usage, so only the leader's call is counted.
+
+DEFAULT_DEADLINE_SECONDS = 180.0
+RETRY_STATUS_CODES = {408, 409, 429}
+
+
+class GatewayTimeout(TimeoutError):
+    """
+    The call's deadline passed while waiting for a slot, a rate-limit token or a retry.
+    """
+
+
+class TokenBucket:
+    """
+    Allows rate calls per second on average and bursts of up to burst calls.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline):
+        """
+        Takes one token, waiting for it until deadline (time.monotonic()). Returns False if it came too late.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class Replayed:
+    """
+    A response or stream chunk of a coalesced request, as seen by a follower: the leader's
+    content without its usage - the upstream call was billed (and recorded) once, by the leader.
+    """
+
+    __slots__ = ("_item",)
+    replayed = True
+    usage = None
+
+    def __init__(self, item):
+        self._item = item
+
+    def __getattr__(self, name):
+        return getattr(self._item, name)
+
+
+class _Flight:
+    """
+    One upstream call shared by identical concurrent requests: the leader adds the
+    response (or the streamed chunks), followers read them (as Replayed) as they arrive.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def add(self, item):
+        with self._cond:
+            self.items.append(item)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self, deadline):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.items) and not self.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise GatewayTimeout("deadline passed while waiting for a coalesced request")
+                    self._cond.wait(remaining)
+                if index < len(self.items):
+                    item = Replayed(self.items[index])
+                    index += 1
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            yield item
+
+
+def request_key(request):
+    """
+    Identity of a request for coalescing: the full request body.
+    """
+    return json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def is_retryable(error):
+    """
+    429, 5xx (and 408/409) responses and connection errors/timeouts are retried; other errors are not.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUS_CODES or status >= 500
+    try:
+        from openai import APIConnectionError
+    except ImportError:
+        return False
+    return isinstance(error, APIConnectionError)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """
+    client_factory() returns the current OpenAI-compatible client (so reconfiguring the
+    client applies to the next call). create(**request) is a drop-in replacement for
+    client.chat.completions.create: with stream=True it returns an iterator of chunks.
+    """
+
+    def __init__(self, client_factory, max_concurrency=8, requests_per_second=5.0, burst=10,
+                 max_retries=4, base_delay=0.5, max_delay=20.0, deadline_seconds=DEFAULT_DEADLINE_SECONDS):
+        self.client_factory = client_factory
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline_seconds = deadline_seconds
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(requests_per_second, burst)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "upstream_calls": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "queue_depth": 0,
+            "in_flight": 0,
+            "max_queue_depth": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "rate_limit_wait_seconds_total": 0.0,
+        }
+
+    def metrics(self):
+        with self._lock:
+            return {name: round(value, 4) if isinstance(value, float) else value
+                    for name, value in self._stats.items()}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def create(self, deadline_seconds=None, **request):
+        """
+        Sends one chat completion request, or joins an identical one already in flight.
+        Raises GatewayTimeout after deadline_seconds (default: the gateway's deadline).
+        """
+        deadline = time.monotonic() + (deadline_seconds or self.deadline_seconds)
+        key = request_key(request)
+        with self._lock:
+            self._stats["requests"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats["coalesced"] += 1
+
+        if request.get("stream"):
+            if leader:
+                return self._lead_stream(key, flight, request, deadline)
+            return flight.follow(deadline)
+        if not leader:
+            return next(flight.follow(deadline))
+
+        try:
+            response = self._call(request, deadline)
+        except BaseException as e:
+            self._land(key, flight, e)
+            raise
+        flight.add(response)
+        self._land(key, flight)
+        return response
+
+    def _land(self, key, flight, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error)
+
+    @contextmanager
+    def _slot(self, deadline):
+        """
+        Holds one of the concurrent-call slots and one rate-limit token for the enclosed call.
+        """
+        started = time.monotonic()
+        with self._lock:
+            self._stats["queue_depth"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._stats["queue_depth"])
+        acquired = self._semaphore.acquire(timeout=max(deadline - started, 0))
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats["queue_depth"] -= 1
+            self._stats["queue_wait_seconds_total"] += waited
+            self._stats["queue_wait_seconds_max"] = max(self._stats["queue_wait_seconds_max"], waited)
+            if acquired:
+                self._stats["in_flight"] += 1
+            else:
+                self._stats["timeouts"] += 1
+        if not acquired:
+            raise GatewayTimeout(f"no LLM slot free within the deadline (waited {waited:.1f}s)")
+        try:
+            rate_started = time.monotonic()
+            if not self._bucket.acquire(deadline):
+                self._count("timeouts")
+                raise GatewayTimeout("rate limit: no request token before the deadline")
+            self._count("rate_limit_wait_seconds_total", time.monotonic() - rate_started)
+            self._count("upstream_calls")
+            yield max(deadline - time.monotonic(), 0.001)
+        finally:
+            with self._lock:
+                self._stats["in_flight"] -= 1
+            self._semaphore.release()
+
+    def _backoff(self, attempt, error, deadline):
+        """
+        Sleeps before the next attempt (Retry-After if the server sent one, otherwise
+        exponential backoff with jitter). Raises GatewayTimeout if that passes the deadline.
+        """
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+        if time.monotonic() + delay > deadline:
+            self._count("timeouts")
+            raise GatewayTimeout(f"deadline passed while retrying: {error}") from error
+        self._count("retries")
+        time.sleep(delay)
+
+    def _call(self, request, deadline):
+        for attempt in range(self.max_retries + 1):
+            with self._slot(deadline) as remaining:
+                try:
+                    return self.client_factory().chat.completions.create(timeout=remaining, **request)
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        self._count("failures")
+                        raise
+                    error = e
+            self._backoff(attempt, error, deadline)
+
+    def _lead_stream(self, key, flight, request, deadline):
+        # Retried only until the first chunk arrived - a partial answer is never replayed twice
+        received = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                with self._slot(deadline) as remaining:
+                    try:
+                        for chunk in self.client_factory().chat.completions.create(timeout=remaining, **request):
+                            received = True
+                            flight.add(chunk)
+                            yield chunk
+                            if time.monotonic() > deadline:
+                                self._count("timeouts")
+                                raise GatewayTimeout("deadline passed while streaming the response")
+                        break
+                    except GatewayTimeout:
+                        raise
+                    except Exception as e:
+                        if received or attempt == self.max_retries or not is_retryable(e):
+                            self._count("failures")
+                            raise
+                        error = e
+                self._backoff(attempt, error, deadline)
+        except BaseException as e:
+            if isinstance(e, GeneratorExit):
+                # The leader stopped reading; followers get an error instead of a cut-off stream
+                e = RuntimeError("the coalesced stream was closed before it finished")
+            self._land(key, flight, e)
+            raise
+        self._land(key, flight)
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import fitz
+
+# Page-windowed viewer support: pages are rasterized at the viewer's width once per
+# (document, page, width) and served from a process-wide LRU, so a rerun only sends
+# the few page images of the current window instead of the whole PDF.
+
+VIEWER_WIDTH = 1000
+MAX_CACHED_PAGES = 256
+MAX_OPEN_DOCUMENTS = 4
+
+
+def document_hash(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def page_window(current_page, page_count, radius=1):
+    """
+    1-based page numbers around current_page, clamped to the document.
+    """
+    current_page = min(max(1, current_page), page_count)
+    return list(range(max(1, current_page - radius), min(page_count, current_page + radius) + 1))
+
+
+def risk_pages(anchor_report):
+    """
+    Sorted 1-based pages that contain at least one anchored finding.
+    """
+    return sorted({entry["page"] for entry in anchor_report["by_quote"].values() if entry.get("page")})
+
+
+class PageRenderCache:
+    """
+    LRU of rendered page images (PNG) keyed by (document hash, page, width).
+    The parsed documents are kept open (up to max_documents) so rendering a page
+    does not re-parse the PDF. Safe to share between Streamlit sessions.
+    """
+
+    def __init__(self, max_pages=MAX_CACHED_PAGES, max_documents=MAX_OPEN_DOCUMENTS):
+        self.max_pages = max_pages
+        self.max_documents = max_documents
+        self._pages = OrderedDict()
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _document(self, pdf_bytes, doc_hash):
+        doc = self._documents.get(doc_hash)
+        if doc is not None:
+            self._documents.move_to_end(doc_hash)
+            return doc
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        self._documents[doc_hash] = doc
+        while len(self._documents) > self.max_documents:
+            _, evicted = self._documents.popitem(last=False)
+            evicted.close()
+        return doc
+
+    def page_count(self, pdf_bytes, doc_hash=None):
+        doc_hash = doc_hash or document_hash(pdf_bytes)
+        with self._lock:
+            return len(self._document(pdf_bytes, doc_hash))
+
+    def render(self, pdf_bytes, page_number, width=VIEWER_WIDTH, doc_hash=None):
+        """
+        PNG bytes of 1-based page_number (with its highlight annotations), scaled to width pixels.
+        """
+        doc_hash = doc_hash or document_hash(pdf_bytes)
+        key = (doc_hash, page_number, width)
+        # fitz documents are not thread-safe - renders are serialized
+        with self._lock:
+            png = self._pages.get(key)
+            if png is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return png
+
+            self.misses += 1
+            page = self._document(pdf_bytes, doc_hash)[page_number - 1]
+            zoom = width / page.rect.width
+            png = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), annots=True).tobytes("png")
+            self._pages[key] = png
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+            return png
+
+
+render_cache = PageRenderCache()
@@ -0,0 +1,293 @@
+import multiprocessing
+import os
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from difflib import SequenceMatcher
+
+import fitz
+
+# Expand ligatures (ﬁ -> fi) so quotes copied from extracted text still match
+WORD_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+# Documents with at least this many pages are extracted in the process pool (machines with 2+ CPUs).
+# Serial extraction runs at ~700-1000 pages/s; the warm pool adds ~25% of the serial time
+# (pickling the words back) and the first call ~0.3-0.6 s of worker start-up, so smaller
+# documents are faster in-process (see benchmarks/bench_extract.py)
+PARALLEL_MIN_PAGES = 400
+
+# Fuzzy anchors below this confidence are treated as "not found"
+FUZZY_MIN_CONFIDENCE = 0.6
+
+_CHAR_TABLE = str.maketrans({
+    "“": '"', "”": '"', "„": '"', "«": '"', "»": '"', "״": '"',
+    "‘": "'", "’": "'", "‚": "'", "׳": "'", "`": "'",
+    "‐": "-", "‑": "-", "–": "-", "—": "-", "־": "-",
+})
+
+
+def normalize_word(word):
+    """
+    Canonical form of a word for matching: NFKC, unified quotes/dashes, casefolded,
+    without combining marks (e.g. Hebrew niqqud) or bidi control characters.
+    """
+    word = unicodedata.normalize("NFKC", word).translate(_CHAR_TABLE).casefold()
+    return "".join(c for c in word if unicodedata.category(c) not in ("Mn", "Cf"))
+
+
+def normalize_tokens(text):
+    """
+    Normalized tokens of a quote, re-joining words hyphenated across a line break ("main- tenance").
+    """
+    tokens = []
+    for raw in str(text).split():
+        token = normalize_word(raw)
+        if not token:
+            continue
+        if tokens and tokens[-1].endswith("-") and len(tokens[-1]) > 1 and token[:1].islower():
+            tokens[-1] = tokens[-1][:-1] + token
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def page_words(page):
+    """
+    Words of one page: (x0, y0, x1, y1, word, block_no, line_no, word_no) tuples.
+    """
+    return page.get_text("words", flags=WORD_FLAGS)
+
+
+class TextMap:
+    """
+    Extracted document text plus a character-offset -> (page, bbox) map at word level.
+    text is built line by line from the PDF words; word i spans
+    text[word_starts[i]:word_ends[i]] on page word_pages[i] inside word_rects[i].
+    """
+
+    def __init__(self, pages_words):
+        parts = []
+        self.word_starts = []
+        self.word_ends = []
+        self.word_pages = []
+        self.word_lines = []
+        self.word_rects = []
+        self.page_count = len(pages_words)
+        offset = 0
+
+        for page_number, words in enumerate(pages_words):
+            previous_line = None
+            for x0, y0, x1, y1, word, block_no, line_no, _ in words:
+                line = (page_number, block_no, line_no)
+                if previous_line is not None:
+                    separator = " " if line == previous_line else "\n"
+                    parts.append(separator)
+                    offset += 1
+                previous_line = line
+
+                self.word_starts.append(offset)
+                self.word_ends.append(offset + len(word))
+                self.word_pages.append(page_number)
+                self.word_lines.append(line)
+                self.word_rects.append((x0, y0, x1, y1))
+                parts.append(word)
+                offset += len(word)
+            parts.append("\n")
+            offset += 1
+
+        # One join at the end - no repeated string concatenation
+        self.text = "".join(parts)
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls([page_words(page) for page in doc])
+
+    def rects_for_words(self, first, last):
+        """
+        Highlight rectangles for words [first, last): {page_number: [fitz.Rect per line]}.
+        """
+        lines = {}
+        for i in range(first, last):
+            rect = fitz.Rect(self.word_rects[i])
+            key = self.word_lines[i]
+            lines[key] = lines[key] | rect if key in lines else rect
+
+        by_page = {}
+        for (page_number, _, _), rect in lines.items():
+            by_page.setdefault(page_number, []).append(rect)
+        return by_page
+
+
+class QuoteAnchorIndex:
+    """
+    Anchors LLM quotes to words of a TextMap.
+    1) Normalized exact match (whitespace, case, quotes/dashes, hyphenation, bidi marks).
+    2) Bounded fuzzy match: word 3-gram seeds vote for candidate positions, then a local
+       alignment (SequenceMatcher over tokens) around the best candidates.
+    """
+
+    def __init__(self, text_map, ngram=3):
+        self.text_map = text_map
+        self.ngram = ngram
+        self.tokens = []
+        self.token_words = []  # (first_word, last_word_exclusive) per token
+
+        lines = text_map.word_lines
+        raw_words = [text_map.text[s:e] for s, e in zip(text_map.word_starts, text_map.word_ends)]
+        i = 0
+        while i < len(raw_words):
+            token = normalize_word(raw_words[i])
+            last = i + 1
+            # Re-join a word hyphenated at the end of a line with the first word of the next line
+            while (token.endswith("-") and len(token) > 1 and last < len(raw_words)
+                   and lines[last] != lines[last - 1]):
+                following = normalize_word(raw_words[last])
+                if not following[:1].islower():
+                    break
+                token = token[:-1] + following
+                last += 1
+            if token:
+                self.tokens.append(token)
+                self.token_words.append((i, last))
+            i = last
+
+        self.token_starts = []
+        offset = 0
+        for token in self.tokens:
+            self.token_starts.append(offset)
+            offset += len(token) + 1
+        self.token_ends = [start + len(token) for start, token in zip(self.token_starts, self.tokens)]
+        self.search_text = " ".join(self.tokens)
+
+        self.seeds = defaultdict(list)
+        for i in range(len(self.tokens) - ngram + 1):
+            self.seeds[tuple(self.tokens[i:i + ngram])].append(i)
+
+    def _words(self, first_token, last_token):
+        return self.token_words[first_token][0], self.token_words[last_token - 1][1]
+
+    def anchor(self, quote):
+        """
+        Returns {"spans": [(first_word, last_word_exclusive), ...], "confidence": 0..1, "method"}
+        where method is "exact", "fuzzy" or None (not found).
+        """
+        quote_tokens = normalize_tokens(quote)
+        if not quote_tokens:
+            return {"spans": [], "confidence": 0.0, "method": None}
+
+        needle = " ".join(quote_tokens)
+        spans = []
+        start = self.search_text.find(needle)
+        while start != -1:
+            first = bisect_right(self.token_ends, start)
+            last = bisect_left(self.token_starts, start + len(needle))
+            spans.append(self._words(first, last))
+            start = self.search_text.find(needle, start + 1)
+        if spans:
+            return {"spans": spans, "confidence": 1.0, "method": "exact"}
+
+        best = self._fuzzy(quote_tokens)
+        if best is None or best[0] < FUZZY_MIN_CONFIDENCE:
+            return {"spans": [], "confidence": round(best[0], 3) if best else 0.0, "method": None}
+        confidence, first, last = best
+        return {"spans": [self._words(first, last)], "confidence": round(confidence, 3), "method": "fuzzy"}
+
+    def _fuzzy(self, quote_tokens, max_candidates=3):
+        n = self.ngram
+        if len(quote_tokens) < n:
+            return None
+
+        votes = defaultdict(int)
+        for j in range(len(quote_tokens) - n + 1):
+            for i in self.seeds.get(tuple(quote_tokens[j:j + n]), ()):
+                votes[i - j] += 1
+        if not votes:
+            return None
+
+        slack = max(3, len(quote_tokens) // 4)
+        best = None
+        for candidate, _ in sorted(votes.items(), key=lambda kv: kv[1], reverse=True)[:max_candidates]:
+            lo = max(0, candidate - slack)
+            hi = min(len(self.tokens), candidate + len(quote_tokens) + slack)
+            matcher = SequenceMatcher(None, quote_tokens, self.tokens[lo:hi], autojunk=False)
+            blocks = [b for b in matcher.get_matching_blocks() if b.size]
+            if not blocks:
+                continue
+            matched = sum(b.size for b in blocks)
+            first = lo + blocks[0].b
+            last = lo + blocks[-1].b + blocks[-1].size
+            confidence = 2 * matched / (len(quote_tokens) + (last - first))
+            if best is None or confidence > best[0]:
+                best = (confidence, first, last)
+        return best
+
+
+
+# --- Parallel extraction ---
+# One process pool per process, started on the first large document and reused: spawning the
+# workers (a fresh interpreter importing fitz each) costs more than extracting hundreds of pages.
+# Each call sends one page range per worker, with the PDF bytes; results come back in page order.
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _extraction_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # "spawn" - forking the multi-threaded Streamlit server is not safe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_extraction_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _extract_page_range(pdf_bytes, first, last):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [page_words(doc[number]) for number in range(first, last)]
+
+
+def extract_text_map(pdf_bytes, doc=None, max_workers=None):
+    """
+    Extracts the TextMap of a PDF. Small documents are read in-process (reusing doc
+    if the caller already opened it); documents with PARALLEL_MIN_PAGES or more pages
+    are split into one page range per worker and extracted in the shared process pool,
+    in page order.
+    """
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        page_count = len(doc)
+        workers = max_workers or min(os.cpu_count() or 1, 8)
+        if page_count < PARALLEL_MIN_PAGES or workers < 2:
+            return TextMap.from_document(doc)
+    finally:
+        if own_doc:
+            doc.close()
+
+    size = -(-page_count // workers)
+    ranges = [(first, min(first + size, page_count)) for first in range(0, page_count, size)]
+    pool = _extraction_pool(workers)
+    try:
+        chunks = pool.map(_extract_page_range, [pdf_bytes] * len(ranges), *zip(*ranges))
+        pages_words = [words for chunk in chunks for words in chunk]
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory): start a new pool next time, extract in-process now
+        _reset_extraction_pool(pool)
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            return TextMap.from_document(doc)
+    return TextMap(pages_words)
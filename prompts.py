@@ -0,0 +1,265 @@
+import json
+
+# Prompt assembly for the contract analysis, ordered for provider-side prefix caching
+# (DeepSeek / OpenAI reuse the longest previously seen prompt prefix):
+#   1. ANALYSIS_PROTOCOL - static, byte-identical for every request
+#   2. the legal knowledge base - identical for every request with the same Articles
+#      (the core Articles come first, see LegalIndex.retrieve)
+#   3. per-request variables (preferences, budget or extracted facts, scope), then the contract - user message
+# Nothing that depends on the user or the contract may be added before the law.
+
+ANALYSIS_PROTOCOL = """You are an expert Israeli Legal AI Assistant specializing in residential rental agreements.
+Your task: Identify clauses that relate to the Tenant's Preferences AND any clauses that VIOLATE Israeli law.
+The request lists the tenant preferences, STEP 1 (rent / budget) and the scope, followed by the contract text.
+
+---
+### ANALYSIS PROTOCOL:
+
+**STEP 1 - RENT / BUDGET (MANDATORY):** see the request.
+
+**STEP 2 - PREFERENCE-BY-PREFERENCE SCAN:**
+For EACH category below (or EACH user preference, when the request lists them), search the contract for relevant clauses.
+Use these EXACT preference_category values:
+- "rent_increase": Rent adjustment, increase, or indexation clauses
+- "termination": Early exit, cancellation, or notice period clauses
+- "repairs": Maintenance and repair responsibility clauses
+- "pets": Animal/pet policies
+- "subletting": Sublease or roommate clauses
+- "deposit": Security deposit, guarantee, or collateral terms
+
+**STEP 3 - LEGAL VIOLATIONS (CRITICAL):**
+Cross-reference ALL contract clauses against the Legal Knowledge Base.
+You MUST identify ANY clause that violates Israeli law, even if the user did not express a preference.
+
+Key laws to check:
+- Article 7 & 25H: Landlord must repair structural defects within 30 days
+- Article 25Y: SECURITY deposit cannot exceed 3 months rent; landlord must notify before using it
+- Article 25T(b): Tenant cannot be charged for building insurance or brokerage fees
+- Article 25YG: If landlord has cancellation rights, tenant must have equivalent rights
+- Article 8: "As-Is" clauses may be void if landlord knew of defects
+
+**IMPORTANT - These are NOT legal violations:**
+- Pet policies (allowing or prohibiting pets) - these are landlord's discretion
+- Pet deposits (separate from security deposit) - these are legal
+- Requiring landlord consent for subletting - this is standard and legal (Article 22)
+- Reasonable late fees - these are legal if not excessive
+
+---
+### EXACT_QUOTE RULES (CRITICAL FOR PDF HIGHLIGHTING):
+The "exact_quote" field MUST be a VERBATIM copy-paste from the contract text.
+- Quote COMPLETE SENTENCES - start from the beginning of a sentence to the period.
+- Copy the EXACT characters, including punctuation and spacing.
+- Do NOT paraphrase, summarize, or translate.
+- Include enough context for clear highlighting (aim for 50-150 characters).
+- Example GOOD quote: "The Tenant is responsible for all repairs and maintenance, including structural issues."
+- Example BAD quote: "structural issues" (too short, no context)
+
+---
+### OUTPUT FORMAT:
+Return ONLY a valid JSON object of the form {"findings": [ ... ]}. No markdown, no explanation, no ```json``` wrapper.
+
+Each object in the "findings" array MUST have these 7 fields:
+{
+    "issue_name": "Brief title",
+    "preference_category": "rent_increase" | "termination" | "repairs" | "pets" | "subletting" | "deposit" | "budget",
+    "rent_amount": 2500,  # <-- NEW: Extract the raw number found in the contract (0 if not budget related)
+    "is_legal_violation": true | false,
+    "exact_quote": "Verbatim text from contract",
+    "explanation": "A transparent justification (XAI) that clearly states: 1) The legal issue/clause involved, 2)
+    Why it is risky according to the Legal Knowledge Base, and 3) How it relates to the specific Tenant Preferences provided.",
+    "negotiation_tip": "How to fix it"
+}
+
+**STEP 4 - GAP ANALYSIS (MISSING PROTECTIONS):**
+Identify standard protective clauses that are MISSING from this contract.
+If the contract is silent on these, recommend them as "missing_protection".
+Examples include:
+- Maximum repair time (e.g., landlord must fix urgent issues within 24-48 hours).
+- Grace period for late payment (e.g., 3-5 days before a penalty).
+- Clear mechanism for renewing the contract (Option).
+- Professional cleaning requirements (making sure they are mutual).
+
+-CRITICAL RULE FOR MISSING CLAUSES:
+  If a protection is missing because a clause explicitly DENIES it (e.g., 'Tenant has NO option to extend'),
+  this is NOT a "missing_protection". It is a "termination" or "rent_increase" issue.
+  In this case, you MUST provide the "exact_quote" from the contract so it can be highlighted.
+  Use "missing_protection" ONLY if the contract is completely silent on the topic.
+
+# Update the preference_category list in the prompt to include "missing_protection"
+"preference_category": "rent_increase" | "termination" | ... | "missing_protection" | "budget",
+
+# Update the exact_quote rule:
+- If it is a "missing_protection", set "exact_quote" to "N/A (Missing Clause)".
+
+IMPORTANT:
+- Set is_legal_violation to TRUE if the clause violates any Article in the Legal Knowledge Base.
+- Legal violations MUST always be included, even for "Low" importance user preferences.
+- If no issues found, return an empty findings array: {"findings": []}
+
+STRICT ADHERENCE REQUIRED:
+1. You MUST NOT skip any clause that violates Israeli Law.
+2. You MUST NOT skip the budget check (unless the request says the system already did it).
+3. If a clause is identified as 'is_legal_violation: true', it is MANDATORY to include it in the JSON array.
+4. If a clause is identified as 'is_legal_violation: true' OR it conflicts with a Tenant Preference, it is MANDATORY to include it in the JSON array.
+
+FAILURE TO INCLUDE LEGAL VIOLATIONS IS A CRITICAL SYSTEM ERROR.
+"""
+
+LEGAL_KNOWLEDGE_HEADER = "\n---\n### LEGAL KNOWLEDGE BASE (Ground Truth - Israeli Law):\n"
+
+NO_PREFERENCES = """### TENANT PREFERENCES:
+Not provided. Report EVERY clause that falls into one of the categories of STEP 2,
+regardless of importance - preferences and budget are applied afterwards by the system.
+"""
+
+RENT_STEP = """
+**STEP 1 - RENT CLAUSE (MANDATORY):**
+- Find the monthly rent amount in the contract (usually in NIS/Shekels).
+- Ensure you convert or recognize the currency correctly as Israeli New Shekels (NIS).
+- ALWAYS include the rent clause with preference_category "budget" and the raw number in "rent_amount".
+"""
+
+WITH_PREFERENCES = """### TENANT PREFERENCES (User Input):
+{preferences}
+In STEP 2, scan EACH user preference.
+"""
+
+BUDGET_STEP = """
+**STEP 1 - BUDGET CHECK (MANDATORY):**
+- Find the monthly rent amount in the contract (usually in NIS/Shekels).
+- User's maximum budget is: ₪{budget} per month.
+- Ensure you convert or recognize the currency correctly as Israeli New Shekels (NIS).
+- ONLY if rent is GREATER than budget → Include with preference_category "budget".
+- Do NOT include rent if it is LESS THAN or EQUAL TO the budget - this is fine!
+"""
+
+# Replaces STEP 1 when the rent was extracted by the system (see contract_terms.py)
+FACTS = """
+### FACTS EXTRACTED BY THE SYSTEM (verified - use them, do not re-derive them):
+{facts}
+**STEP 1 - RENT / BUDGET: already done by the system.**
+- Do NOT return any "budget" item.
+{deposit_rule}"""
+HINTS = """
+### HINTS EXTRACTED BY THE SYSTEM (NOT verified - check them against the contract text before relying on them):
+{hints}
+"""
+DEPOSIT_CHECKED = (
+    "- The security amount was already checked against the Article 25Y cap: do NOT report the amount of the\n"
+    "  security. Other deposit terms (e.g. realizing it without notice) must still be reported.\n"
+)
+
+SCOPES = {
+    "full": "",
+    "clauses": """
+### SCOPE (EXCERPT ANALYSIS):
+The contract text below is an EXCERPT of a longer contract; other parts are analyzed separately.
+- Perform STEPS 1-3 on this excerpt only. Perform STEP 1 only if the rent amount appears in it.
+- Do NOT perform STEP 4 and never return "missing_protection" items.
+""",
+    "gaps": """
+### SCOPE (GAP ANALYSIS ONLY):
+Perform ONLY STEP 4 on the full contract below.
+Return ONLY "missing_protection" items (or {"findings": []} if nothing is missing).
+""",
+    "revision": """
+### SCOPE (REVISED CONTRACT - CHANGED CLAUSES ONLY):
+The contract text below contains ONLY the clauses that were changed or added in a revised version of the
+contract; the unchanged clauses were analyzed before and their findings are kept by the system.
+- Perform STEPS 1-3 on these clauses only. Perform STEP 1 only if the rent amount appears in them.
+- STEP 4 is limited to the revision below: return a "missing_protection" item ONLY for a protection listed
+  as previously missing that these clauses still do not provide (repeat its issue_name exactly), or for a
+  protection the removed clauses provided.
+""",
+}
+
+# Appended to the "revision" scope (see revisions.py)
+REVISION_CONTEXT = """
+Previously missing protections:
+{missing}
+Clauses removed in the revision:
+{removed}
+"""
+
+
+def system_prompt(legal_context):
+    """
+    The cacheable part: the static protocol followed by the retrieved law.
+    """
+    return ANALYSIS_PROTOCOL + LEGAL_KNOWLEDGE_HEADER + legal_context.strip() + "\n"
+
+
+def facts_prompt(terms):
+    """
+    The extracted contract terms for the prompt: the verified ones as facts (only with a verified
+    rent - otherwise the model does STEP 1), the others as hints ("" when nothing was extracted).
+    """
+    if terms is None:
+        return ""
+    facts, hints = [], []
+
+    def add(field, line):
+        (facts if terms.rent_verified and field in terms.verified else hints).append(line)
+
+    if terms.rent:
+        add("rent", f"- Monthly rent: ₪{terms.rent:,.0f}")
+    if terms.deposit_verified:
+        check = "ABOVE" if terms.deposit_exceeds_cap else "within"
+        facts.append(f"- Security deposit: ₪{terms.deposit:,.0f} ({terms.deposit_months:g} months' rent) - "
+                     f"{check} the Article 25Y cap of ₪{terms.deposit_cap:,.0f}")
+    elif terms.deposit:
+        hints.append(f"- Security deposit: ₪{terms.deposit:,.0f}")
+    if terms.notice_days:
+        add("notice_days", f"- Notice period: {terms.notice_days:g} days")
+    if terms.lease_months:
+        add("lease_months", f"- Lease period: {terms.lease_months:g} months")
+    if terms.indexation_quote:
+        hints.append("- The rent is linked to an index")
+    if terms.increase_percent:
+        hints.append(f"- Rent increase: {terms.increase_percent:g}%")
+
+    prompt = ""
+    if facts:
+        prompt += FACTS.format(facts="\n".join(facts), deposit_rule=DEPOSIT_CHECKED if terms.deposit_verified else "")
+    if hints:
+        prompt += HINTS.format(hints="\n".join(hints))
+    return prompt
+
+
+def revision_prompt(revision):
+    """
+    The previous missing protections and the removed clauses of a revision ("" without a revision).
+    """
+    if revision is None:
+        return ""
+    missing = "\n".join(f"- {name}" for name in revision.get("missing", ())) or "- none"
+    removed = "".join(revision.get("removed", ())).strip() or "- none"
+    return REVISION_CONTEXT.format(missing=missing, removed=removed)
+
+
+def request_prompt(contract_text, user_prefs=None, scope="full", terms=None, revision=None):
+    """
+    The per-request part: preferences and budget (serialized with sorted keys, so equal
+    preferences give equal bytes), STEP 1 (without a verified rent; never for the gap analysis,
+    which performs only STEP 4), the extracted facts and hints, the scope and the contract text.
+    revision ({"missing": [issue names], "removed": [clause texts]}) completes the "revision" scope.
+    """
+    if user_prefs is None:
+        preferences = NO_PREFERENCES
+    else:
+        preferences = WITH_PREFERENCES.format(
+            preferences=json.dumps(user_prefs, sort_keys=True, ensure_ascii=False),
+        )
+    facts = facts_prompt(terms)
+    if scope != "gaps" and (terms is None or not terms.rent_verified):
+        rent_step = RENT_STEP if user_prefs is None else BUDGET_STEP.format(budget=user_prefs.get("budget", "Not specified"))
+        facts = rent_step + facts
+    scope_text = SCOPES[scope] + revision_prompt(revision)
+    return f"{preferences}{facts}{scope_text}\n### CONTRACT TEXT TO ANALYZE:\n{contract_text}"
+
+
+def build_messages(contract_text, legal_context, user_prefs=None, scope="full", terms=None, revision=None):
+    return [
+        {"role": "system", "content": system_prompt(legal_context)},
+        {"role": "user", "content": request_prompt(contract_text, user_prefs, scope, terms, revision)},
+    ]
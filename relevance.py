@@ -0,0 +1,114 @@
+import math
+import re
+from collections import Counter
+
+from clauses import count_clause_headings, segment_clauses
+from legal_retrieval import estimate_tokens
+
+# Local relevance filter for the analysis input: every clause is scored against the
+# finding categories (keyword stems weighted by TF-IDF over the contract's clauses) and
+# clauses that match nothing - party details, premises description, signatures - are not
+# sent to the model. Pruning is conservative: a clause is kept if it matches any category
+# or any term of the legal checks, so recall on violations comes first.
+
+CATEGORY_TERMS = {
+    "rent_increase": "rent increase index indexation linked adjust raise cpi consumer price payment pay fee fine "
+                     "penalt interest late arrear שכירות שכר מדד הצמדה צמוד העלא תשלום קנס ריבית פיגור",
+    "termination": "terminat cancel notice early exit evict vacate extend extension renew option expir breach "
+                   "ביטול סיום הודעה התראה פינוי הארכה אופציה הפרה",
+    "repairs": "repair defect maintenan damage fix structur plumb electric leak mold mould wear condition as-is "
+               "תיקון ליקוי פגם תחזוק נזק בלאי",
+    "pets": "pet animal dog cat חיית חיות כלב חתול",
+    "subletting": "sublet sublease assign transfer roommate third occupant משנה העבר שותף שלישי",
+    "deposit": "deposit guarantee security collateral promissory bond פיקדון פקדון ערבות ערבון בטוחה שטר",
+}
+# Terms of the other legal checks (Articles 8, 25T, entry, liability) - always kept
+LEGAL_TERMS = ("insurance broker brokerage commission tax arnona municipal entry enter access inspect privacy "
+               "consent liab indemn waive clean key deliver possession utilit ביטוח תיווך ארנונה כניסה ניקיון "
+               "מפתח אחריות שיפוי ויתור מסירה")
+# Categories whose clauses are never legal violations (see the analysis protocol):
+# with explicit preferences, they are pruned when marked "Low"
+NON_VIOLATION_CATEGORIES = ("pets", "subletting")
+# Hebrew attaches prepositions and the article to the word (ה, ו, ב, ל, מ, ש, כ)
+HEBREW_PREFIXES = "הובלמשכ"
+# Contracts with fewer numbered clauses are sent unchanged (no reliable clause boundaries)
+MIN_CLAUSE_HEADINGS = 3
+
+_TOKEN_RE = re.compile(r"[\w'-]+")
+_STEMS = {category: terms.split() for category, terms in CATEGORY_TERMS.items()}
+_STEMS["legal"] = LEGAL_TERMS.split()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _matches(token, stem):
+    if token.startswith(stem):
+        return True
+    return len(token) > len(stem) and token[0] in HEBREW_PREFIXES and token[1:].startswith(stem)
+
+
+def classify_clauses(clause_texts):
+    """
+    TF-IDF keyword scores of every clause: a list of {category: score} (only matched
+    categories, "legal" for the other legal checks). IDF is computed over the clauses,
+    so terms that appear everywhere weigh less than distinctive ones.
+    """
+    token_lists = [tokenize(text) for text in clause_texts]
+    doc_freq = Counter()
+    for tokens in token_lists:
+        doc_freq.update(set(tokens))
+    n = len(token_lists)
+
+    # Categories of every distinct token, matched once per contract
+    token_categories = {
+        token: [category for category, stems in _STEMS.items() if any(_matches(token, stem) for stem in stems)]
+        for token in doc_freq
+    }
+
+    scores = []
+    for tokens in token_lists:
+        norm = math.sqrt(len(tokens)) or 1.0
+        clause_scores = {}
+        for token, count in Counter(tokens).items():
+            for category in token_categories[token]:
+                weight = count * (math.log((1 + n) / (1 + doc_freq[token])) + 1)
+                clause_scores[category] = clause_scores.get(category, 0.0) + weight
+        scores.append({category: round(score / norm, 3) for category, score in clause_scores.items()})
+    return scores
+
+
+def select_relevant_clauses(contract_text, user_prefs=None):
+    """
+    Returns (text, report): the contract without the clauses that cannot produce a finding,
+    and {"clauses", "kept", "pruned": [{"start", "preview"}], "tokens_before", "tokens_after",
+    "reduction"}. With user_prefs, clauses that only match a "Low" category of
+    NON_VIOLATION_CATEGORIES are pruned too. Unstructured contracts are returned unchanged.
+    """
+    tokens_before = estimate_tokens(contract_text)
+    report = {"clauses": 0, "kept": 0, "pruned": [], "tokens_before": tokens_before,
+              "tokens_after": tokens_before, "reduction": 0.0}
+    if count_clause_headings(contract_text) < MIN_CLAUSE_HEADINGS:
+        return contract_text, report
+
+    ignored = set()
+    if user_prefs:
+        ignored = {c for c in NON_VIOLATION_CATEGORIES if user_prefs.get(c) == "Low"}
+
+    clauses = segment_clauses(contract_text)
+    kept = []
+    for clause, scores in zip(clauses, classify_clauses([c["text"] for c in clauses])):
+        if set(scores) - ignored:
+            kept.append(clause["text"])
+        else:
+            report["pruned"].append({"start": clause["start"], "preview": " ".join(clause["text"].split())[:60]})
+
+    if not kept:
+        # Nothing matched - rather send everything than nothing
+        report["pruned"] = []
+        return contract_text, report
+    text = "".join(kept)
+    report.update(clauses=len(clauses), kept=len(kept), tokens_after=estimate_tokens(text),
+                  reduction=round(1 - estimate_tokens(text) / tokens_before, 3))
+    return text, report
@@ -0,0 +1,94 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger("rightrent.timing")
+
+_lock = threading.Lock()
+_file_cache = {}
+
+
+def _process_start_time():
+    # Linux: process start from /proc (the Streamlit server starts before the first script run)
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+# Process-wide timing report (cold start, lazy imports, reruns)
+PROCESS_STARTED = _process_start_time()
+timings = {
+    "first_run_seconds": None,
+    "imports": {},
+    "resources": {},
+    "reruns": 0,
+    "last_rerun_seconds": None,
+    "max_rerun_seconds": 0.0,
+}
+
+
+def cached_file_resource(path, loader=None):
+    """
+    Returns loader(file_text) for path, computed once per process and recomputed
+    only when the file's mtime changes. With no loader the text itself is returned.
+    """
+    mtime = os.path.getmtime(path)
+    # Key by the loader's name - Streamlit re-creates functions defined in app.py on every rerun
+    loader_name = f"{loader.__module__}.{loader.__qualname__}" if loader is not None else None
+    key = (os.path.abspath(path), loader_name)
+    with _lock:
+        cached = _file_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        started = time.perf_counter()
+        with open(path, encoding="utf-8") as f:
+            value = f.read()
+        if loader is not None:
+            value = loader(value)
+        _file_cache[key] = (mtime, value)
+        elapsed = time.perf_counter() - started
+        timings["resources"][os.path.basename(path)] = round(elapsed, 4)
+        logger.info("loaded %s in %.3fs", path, elapsed)
+        return value
+
+
+def lazy_import(name):
+    """
+    Imports a module on first use and records how long the import took.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - started
+    timings["imports"][name] = round(elapsed, 3)
+    logger.info("imported %s in %.3fs", name, elapsed)
+    return module
+
+
+def record_rerun(seconds):
+    """
+    Records one script run. The first one is the cold start (e.g. after sleep mode).
+    """
+    with _lock:
+        if timings["first_run_seconds"] is None:
+            timings["first_run_seconds"] = round(time.time() - PROCESS_STARTED, 3)
+            logger.info("cold start: first run finished %.3fs after process start", timings["first_run_seconds"])
+        timings["reruns"] += 1
+        timings["last_rerun_seconds"] = round(seconds, 3)
+        timings["max_rerun_seconds"] = round(max(timings["max_rerun_seconds"], seconds), 3)
+    logger.debug("rerun took %.3fs", seconds)
+
+
+def timing_report():
+    return dict(timings, uptime_seconds=round(time.time() - PROCESS_STARTED, 1))
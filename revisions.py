@@ -0,0 +1,240 @@
+import difflib
+import re
+
+from clauses import segment_clauses
+from legal_retrieval import estimate_tokens
+from sharding import finding_key, normalize_quote
+
+# Revision-aware re-analysis of an amended contract: the new text is diffed against the
+# previous version clause by clause (ignoring renumbering and whitespace), only changed and
+# added clauses go to the model, and the findings of unchanged clauses are carried over with
+# their quotes re-anchored in the new text. Findings of edited or removed clauses that the
+# model no longer reports are the resolved risks.
+
+# Clause number at the start of a clause ("7.", "5.2)", "Section 4", "סעיף 3")
+_HEADING_RE = re.compile(r"^\s*(?:\d{1,3}(?:\.\d{1,3})*[.)]|(?:Section|Article|Clause)\s+\d+|סעיף\s+\d+)",
+                         re.IGNORECASE)
+
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+ADDED = "added"
+REMOVED = "removed"
+
+
+def clause_key(text):
+    """
+    Comparison key of a clause: normalized text without its number, so renumbered clauses match.
+    """
+    return normalize_quote(_HEADING_RE.sub("", text, count=1))
+
+
+def _heading(text):
+    match = _HEADING_RE.match(text)
+    return match.group().strip() if match else ""
+
+
+def diff_clauses(previous_text, contract_text):
+    """
+    Clause-level diff of two versions. Returns (previous_clauses, clauses): the clauses of
+    both versions (see clauses.segment_clauses), each with a "status" (unchanged, changed,
+    added or removed), a "block" id shared by the old and new side of one edit, and for
+    unchanged clauses the index of their counterpart in "match". Moved clauses are unchanged.
+    """
+    old = [dict(c, status=REMOVED, block=None, match=None) for c in segment_clauses(previous_text)]
+    new = [dict(c, status=ADDED, block=None, match=None) for c in segment_clauses(contract_text)]
+    old_keys = [clause_key(c["text"]) for c in old]
+    new_keys = [clause_key(c["text"]) for c in new]
+
+    matcher = difflib.SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for block, (tag, i1, i2, j1, j2) in enumerate(matcher.get_opcodes()):
+        if tag == "equal":
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                old[i].update(status=UNCHANGED, match=j)
+                new[j].update(status=UNCHANGED, match=i)
+            continue
+        for clause in old[i1:i2]:
+            clause["block"] = block
+        for clause in new[j1:j2]:
+            clause.update(block=block, status=CHANGED if tag == "replace" else ADDED)
+
+    # A clause that moved shows up as removed in one place and added in another
+    unmatched = {}
+    for i, clause in enumerate(old):
+        if clause["status"] == REMOVED:
+            unmatched.setdefault(old_keys[i], []).append(i)
+    for j, clause in enumerate(new):
+        if clause["status"] != UNCHANGED and unmatched.get(new_keys[j]):
+            i = unmatched[new_keys[j]].pop(0)
+            old[i].update(status=UNCHANGED, match=j, block=None)
+            clause.update(status=UNCHANGED, match=i, block=None)
+
+    # Old clauses of a replaced block that found no counterpart are edited, not removed
+    edited_blocks = {c["block"] for c in new if c["status"] == CHANGED}
+    for clause in old:
+        if clause["status"] == REMOVED and clause["block"] in edited_blocks:
+            clause["status"] = CHANGED
+    return old, new
+
+
+def _locate(finding, clauses):
+    """
+    Index of the clause that contains the finding's quote (None for missing protections or unknown quotes).
+    """
+    if finding.get("preference_category") == "missing_protection":
+        return None
+    quote = normalize_quote(finding.get("exact_quote", ""))
+    if not quote:
+        return None
+    for i, clause in enumerate(clauses):
+        if quote in normalize_quote(clause["text"]):
+            return i
+    return None
+
+
+def reanchor_quote(quote, old_clause, new_clause):
+    """
+    The quote as it reads in the new version of an unchanged clause: a clause number that
+    changed (renumbering) is replaced, everything else is kept verbatim.
+    """
+    old_heading, new_heading = _heading(old_clause["text"]), _heading(new_clause["text"])
+    if old_heading and old_heading != new_heading and quote.lstrip().startswith(old_heading):
+        return quote.replace(old_heading, new_heading, 1)
+    return quote
+
+
+def plan_revision(previous_text, contract_text, previous_findings):
+    """
+    Splits the previous findings by the diff: findings of unchanged clauses are carried over
+    (quotes re-anchored), findings of changed or removed clauses are stale and re-checked.
+    Returns a dict with "previous_clauses", "clauses", "delta_text" (the changed and added
+    clauses to analyze), "removed_texts", "carried", "stale" (the diff block of each in
+    "stale_blocks"), "missing" (previous missing protections) and the delta vs. full token counts.
+    """
+    old, new = diff_clauses(previous_text, contract_text)
+    carried, stale, stale_blocks, missing = [], [], [], []
+    for finding in previous_findings:
+        category = finding.get("preference_category")
+        if category == "missing_protection":
+            missing.append(finding)
+            continue
+        i = _locate(finding, old)
+        if i is None:
+            # Quote not found in one clause (spans clauses): carry it only if it still reads the same
+            if normalize_quote(finding.get("exact_quote", "")) in normalize_quote(contract_text):
+                carried.append(finding)
+            else:
+                stale.append(finding)
+                stale_blocks.append(None)
+        elif old[i]["status"] == UNCHANGED:
+            quote = reanchor_quote(finding.get("exact_quote", ""), old[i], new[old[i]["match"]])
+            carried.append(dict(finding, exact_quote=quote))
+        else:
+            stale.append(finding)
+            stale_blocks.append(old[i]["block"])
+
+    delta_text = "".join(c["text"] for c in new if c["status"] in (CHANGED, ADDED))
+    removed_texts = [c["text"] for c in old if c["status"] == REMOVED]
+    return {
+        "previous_clauses": old,
+        "clauses": new,
+        "delta_text": delta_text,
+        "removed_texts": removed_texts,
+        "carried": carried,
+        "stale": stale,
+        "stale_blocks": stale_blocks,
+        "missing": missing,
+        "tokens_sent": estimate_tokens(delta_text + "".join(removed_texts)),
+        "tokens_full": estimate_tokens(contract_text),
+    }
+
+
+def drop_removed_quotes(plan, delta_findings):
+    """
+    The delta findings without those quoting a removed clause (given to the model as context only).
+    """
+    removed = [normalize_quote(text) for text in plan["removed_texts"]]
+    current = [normalize_quote(c["text"]) for c in plan["clauses"] if c["status"] != UNCHANGED]
+    kept = []
+    for finding in delta_findings:
+        quote = normalize_quote(finding.get("exact_quote", ""))
+        if quote and any(quote in text for text in removed) and not any(quote in text for text in current):
+            continue
+        kept.append(finding)
+    return kept
+
+
+def resolved_findings(plan, delta_findings):
+    """
+    The previous risks that no longer apply: a stale finding is still present if the delta
+    analysis reports the same quote, or the same category in the new side of its edit without
+    dropping a legal violation; a previous missing protection is still present if it is reported again.
+    """
+    new = plan["clauses"]
+    reported_keys = {finding_key(f) for f in delta_findings}
+    reported_names = {normalize_quote(f.get("issue_name", "")) for f in delta_findings
+                      if f.get("preference_category") == "missing_protection"}
+    in_block = []
+    for finding in delta_findings:
+        i = _locate(finding, new)
+        if i is not None and new[i]["block"] is not None:
+            in_block.append((new[i]["block"], finding))
+
+    resolved = []
+    for finding, block in zip(plan["stale"], plan["stale_blocks"]):
+        if finding_key(finding) in reported_keys or finding.get("preference_category") == "budget":
+            continue
+        if any(b == block and f.get("preference_category") == finding.get("preference_category")
+               and (f.get("is_legal_violation") or not finding.get("is_legal_violation")) for b, f in in_block):
+            continue
+        resolved.append(finding)
+    for finding in plan["missing"]:
+        if normalize_quote(finding.get("issue_name", "")) not in reported_names:
+            resolved.append(finding)
+    return resolved
+
+
+def resolved_by_key(previous_findings, findings):
+    """
+    Previous findings (other than the rent) whose quote and category no longer appear in findings.
+    """
+    keys = {finding_key(f) for f in findings}
+    return [f for f in previous_findings
+            if f.get("preference_category") != "budget" and finding_key(f) not in keys]
+
+
+def split_previous_facts(previous_facts, terms, contract_text):
+    """
+    Splits the previous deposit-cap findings (computed from the terms) into (resolved, carried).
+    Only a verified rent and deposit within the cap resolve them - a reworded rent or deposit
+    that can no longer be verified does not. While unresolved, a finding whose quote is still in
+    the new text is carried over; a reworded quote is part of the delta analysis, and a cap
+    exceeded again is reported by the new terms.
+    """
+    previous = [f for f in previous_facts if f.get("preference_category") != "budget"]
+    if terms.deposit_verified and not terms.deposit_exceeds_cap:
+        return previous, []
+    if terms.deposit_verified:
+        return [], []
+    text = normalize_quote(contract_text)
+    return [], [f for f in previous if normalize_quote(f.get("exact_quote", "")) in text]
+
+
+def revision_report(plan, delta_findings, resolved):
+    """
+    Summary for the UI and the trace: clause counts per status, carried/new/resolved findings
+    and the share of the contract that was sent to the model.
+    """
+    counts = {status: 0 for status in (UNCHANGED, CHANGED, ADDED, REMOVED)}
+    for clause in plan["clauses"]:
+        counts[clause["status"]] += 1
+    counts[REMOVED] = len(plan["removed_texts"])
+    previous_keys = {finding_key(f) for f in plan["carried"] + plan["stale"] + plan["missing"]}
+    return {
+        **counts,
+        "carried": len(plan["carried"]),
+        "new": [f for f in delta_findings if finding_key(f) not in previous_keys],
+        "resolved": resolved,
+        "tokens_sent": plan["tokens_sent"],
+        "tokens_full": plan["tokens_full"],
+        "sent_share": round(plan["tokens_sent"] / plan["tokens_full"], 3) if plan["tokens_full"] else 0.0,
+    }
@@ -0,0 +1,47 @@
+# Deterministic preference logic applied on top of the LLM findings.
+# The LLM reports every categorized clause once; budget, importance levels and
+# legal-violation overrides are resolved here, so a preference change needs no API call.
+
+CATEGORIES = ("rent_increase", "termination", "repairs", "pets", "subletting", "deposit")
+
+
+def parse_amount(raw_amount):
+    """
+    Parses an amount such as 9,200 / "₪9,200" / "9200 NIS" into a float (0 if unreadable).
+    """
+    cleaned = str(raw_amount).replace(',', '').replace('$', '').replace('₪', '').replace('NIS', '').strip()
+    try:
+        return float(cleaned)
+    except ValueError:
+        return 0
+
+
+def resolve_importance(finding, user_prefs):
+    """
+    Importance ("Low" / "Medium" / "High") of a single Finding for this user.
+    """
+    # LEGAL VIOLATIONS are ALWAYS High, regardless of user preference
+    if finding.is_legal_violation:
+        return "High"
+
+    category = finding.preference_category
+
+    # Special handling for budget - verify with Python math (AI can't be trusted with math)
+    if category == "budget":
+        user_budget = float(user_prefs.get("budget", 0) or 0)
+        return "High" if finding.rent_amount > user_budget else "Low"
+
+    # Missing protections are recommendations - always shown
+    if category == "missing_protection":
+        return "Medium"
+
+    # Look up the user's importance level for this category
+    return user_prefs.get(category, "Medium")  # Default to Medium if unknown
+
+
+def apply_preferences(findings, user_prefs):
+    """
+    Filters the full list of findings down to what matters for this user.
+    Low-importance clauses are dropped unless they violate the law.
+    """
+    return [finding for finding in findings if resolve_importance(finding, user_prefs) != "Low"]
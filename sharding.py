@@ -0,0 +1,96 @@
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def normalize_quote(quote):
+    """
+    Normalizes a quote for deduplication (case, whitespace, surrounding punctuation).
+    """
+    return re.sub(r"\s+", " ", str(quote)).strip(" \t\n.,;:\"'“”").lower()
+
+
+def finding_key(finding):
+    category = finding.get("preference_category", "")
+    if category == "missing_protection":
+        # Missing clauses have no quote - dedupe by their title instead
+        return category, normalize_quote(finding.get("issue_name", ""))
+    return category, normalize_quote(finding.get("exact_quote", ""))
+
+
+def merge_findings(finding_lists):
+    """
+    Merges per-shard findings in order, deduplicating by (category, quote).
+    If the same clause is reported twice, the legal-violation flag wins.
+    """
+    merged = {}
+    for findings in finding_lists:
+        for finding in findings:
+            key = finding_key(finding)
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = finding
+            elif finding.get("is_legal_violation") and not existing.get("is_legal_violation"):
+                merged[key] = finding
+    return list(merged.values())
+
+
+def merge_window_findings(finding_lists):
+    """
+    merge_findings for overlapping windows: a finding whose quote is part of the quote of a
+    finding of the same category from another window is the same clause quoted less fully,
+    and is dropped (its legal-violation flag is kept on the longer one).
+    """
+    source = {}
+    for index, findings in enumerate(finding_lists):
+        for finding in findings:
+            source.setdefault(finding_key(finding), index)
+    merged = merge_findings(finding_lists)
+    quotes = [normalize_quote(f.get("exact_quote", "")) for f in merged]
+    sources = [source[finding_key(f)] for f in merged]
+
+    dropped = set()
+    for i, finding in enumerate(merged):
+        if finding.get("preference_category") == "missing_protection" or not quotes[i]:
+            continue
+        for j, other in enumerate(merged):
+            if (j != i and j not in dropped and sources[j] != sources[i]
+                    and other.get("preference_category") == finding.get("preference_category")
+                    and len(quotes[j]) > len(quotes[i]) and quotes[i] in quotes[j]):
+                dropped.add(i)
+                if finding.get("is_legal_violation") and not other.get("is_legal_violation"):
+                    merged[j] = dict(other, is_legal_violation=True)
+                break
+    return [f for i, f in enumerate(merged) if i not in dropped]
+
+
+def analyze_in_shards(shards, analyze_shard, analyze_gaps, max_workers=4, on_findings=None):
+    """
+    Map-reduce analysis: analyze_shard(shard) runs concurrently for every shard
+    (at most max_workers calls in flight) next to one global analyze_gaps() pass.
+    Both callables return a list of finding dicts. on_findings(findings) is called on
+    the calling thread whenever a call completes, so the UI can render partial results.
+    Returns the merged, deduplicated list in document order (missing protections last);
+    shards may overlap (see merge_window_findings).
+    """
+    results = [None] * len(shards)
+    gaps = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Each call runs in a copy of the caller's context, so it joins the caller's trace
+        futures = {
+            pool.submit(contextvars.copy_context().run, analyze_shard, shard): i for i, shard in enumerate(shards)
+        }
+        futures[pool.submit(contextvars.copy_context().run, analyze_gaps)] = None
+
+        for future in as_completed(futures):
+            findings = future.result()
+            index = futures[future]
+            if index is None:
+                gaps = findings
+            else:
+                results[index] = findings
+            if on_findings:
+                on_findings(findings)
+
+    return merge_window_findings(results + [gaps])
@@ -0,0 +1,87 @@
+from contract_terms import extract_terms, terms_findings
+from prompts import facts_prompt
+
+RENT = "The monthly rent shall be 4,000 NIS."
+
+
+def test_late_fee_is_not_the_rent():
+    terms = extract_terms(
+        "Late payment of rent will incur a fee of 150 NIS per month of delay. "
+        "The Tenant shall provide a security deposit of 12,000 NIS."
+    )
+    assert terms.rent == 0
+    assert terms_findings(terms) == []
+
+
+def test_rent_after_a_late_fee_clause():
+    terms = extract_terms("Late payment of rent will incur a fee of 150 NIS per month of delay. " + RENT)
+    assert terms.rent == 4000
+    assert terms.rent_verified
+
+
+def test_label_and_amount():
+    terms = extract_terms("Rent: 7000 ₪ per month. Deposit: 21,000 ₪.")
+    assert terms.rent == 7000
+    assert terms.deposit == 21000
+    assert terms.deposit_verified
+    assert not terms.deposit_exceeds_cap
+
+
+def test_hyphenated_notice_period():
+    terms = extract_terms(RENT + " Either party may end the lease with a 14-day notice.")
+    assert terms.notice_days == 14
+
+
+def test_notice_period_is_the_duration_next_to_the_notice():
+    terms = extract_terms(
+        "The Landlord reserves the right to increase the monthly rent by any amount at the end of the first "
+        "six months of the lease, provided a 14-day written notice is given."
+    )
+    assert terms.notice_days == 14
+    # A rent increase sentence does not state the rent
+    assert not terms.rent_verified
+
+
+def test_hebrew_deposit_in_months_of_rent():
+    terms = extract_terms("דמי השכירות החודשיים יהיו 5,000 ש\"ח. השוכר ימסור למשכיר פיקדון בסך ארבעה חודשי שכירות.")
+    assert terms.rent == 5000
+    assert terms.deposit == 20000
+    assert terms.deposit_months == 4
+    findings = terms_findings(terms)
+    assert [f["issue_name"] for f in findings] == ["Monthly rent", "Security deposit above the legal cap"]
+    assert findings[1]["is_legal_violation"]
+
+
+def test_deposit_violation_needs_verified_rent_and_deposit():
+    verified = extract_terms(RENT + " The Tenant shall provide a bank guarantee of 30,000 NIS.")
+    assert [f["preference_category"] for f in terms_findings(verified)] == ["budget", "deposit"]
+
+    # Two different amounts in the deposit sentence: not verified, no legal finding
+    ambiguous = extract_terms(RENT + " The deposit of 30,000 NIS will be reduced to 8,000 NIS after a year.")
+    assert ambiguous.deposit == 30000
+    assert not ambiguous.deposit_verified
+    assert [f["preference_category"] for f in terms_findings(ambiguous)] == ["budget"]
+
+
+def test_unverified_terms_are_hints():
+    prompt = facts_prompt(extract_terms(
+        "The rent will increase from 4,000 NIS to 4,500 NIS per month. Notice: 60 days before the end."
+    ))
+    assert "FACTS EXTRACTED" not in prompt
+    assert "HINTS" in prompt
+    assert "Monthly rent: ₪4,000" in prompt
+
+    prompt = facts_prompt(extract_terms(RENT + " The Tenant shall provide a bank guarantee of 30,000 NIS."))
+    assert "FACTS EXTRACTED" in prompt
+    assert "ABOVE the Article 25Y cap" in prompt
+
+
+def test_personal_guarantee_is_not_a_deposit():
+    for text in (
+        RENT + " A guarantor shall sign a personal guarantee for up to 100,000 NIS.",
+        RENT + " The Tenant shall provide a guarantee for up to 100,000 NIS.",
+        "דמי השכירות החודשיים יהיו 4,000 ש\"ח. הערב יחתום על ערבות אישית בסך 100,000 ש\"ח.",
+    ):
+        terms = extract_terms(text)
+        assert terms.deposit == 0
+        assert [f["preference_category"] for f in terms_findings(terms)] == ["budget"]
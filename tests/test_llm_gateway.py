@@ -0,0 +1,40 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from llm_gateway import LLMGateway
+
+
+class SlowStreamClient:
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, timeout=None, **request):
+        self.calls += 1
+        for text in ("a", "b"):
+            time.sleep(0.05)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+        yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10))
+
+
+def test_coalesced_stream_reports_usage_once():
+    client = SlowStreamClient()
+    gateway = LLMGateway(lambda: client)
+    results = []
+
+    def call():
+        chunks = list(gateway.create(model="m", messages=[], stream=True))
+        results.append(([c.choices[0].delta.content for c in chunks if c.choices],
+                        [c.usage.prompt_tokens for c in chunks if c.usage]))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.calls == 1
+    assert [texts for texts, _ in results] == [["a", "b"]] * 3
+    # Only the leader sees the usage of the one billed call
+    assert sorted(usage for _, usage in results) == [[], [], [100]]
@@ -0,0 +1,21 @@
+import pytest
+
+from check_prompt_prefix import check_prefix, contracts, measure_cache_hits
+from prompts import ANALYSIS_PROTOCOL
+
+
+@pytest.fixture(scope="module")
+def texts():
+    return contracts()
+
+
+def test_prompt_prefix_is_byte_stable(texts):
+    assert check_prefix(texts) == []
+
+
+def test_later_requests_hit_the_prefix_cache(texts):
+    hits = measure_cache_hits(texts)
+    protocol_tokens = len(ANALYSIS_PROTOCOL) // 4
+    # Every request after the first one reuses at least the protocol (64-token cache units)
+    for index, prefs, cached, prompt in hits[1:]:
+        assert cached >= protocol_tokens - 64, (index, prefs, cached, prompt)
@@ -0,0 +1,12 @@
+from contract_terms import extract_terms
+from prompts import request_prompt
+
+
+def test_gap_analysis_has_no_rent_step():
+    unverified = extract_terms("The rent will increase from 4,000 NIS to 4,500 NIS per month.")
+    for user_prefs in (None, {"budget": 5000}):
+        for terms in (None, unverified):
+            prompt = request_prompt("contract", user_prefs, "gaps", terms)
+            assert "STEP 1" not in prompt
+            assert "GAP ANALYSIS ONLY" in prompt
+    assert "STEP 1 - RENT CLAUSE" in request_prompt("contract", None, "full")
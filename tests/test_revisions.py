@@ -0,0 +1,24 @@
+from contract_terms import extract_terms, terms_findings
+from revisions import split_previous_facts
+
+PREVIOUS = "The monthly rent shall be 4,000 NIS. The Tenant shall provide a security deposit of 20,000 NIS."
+
+
+def test_unverifiable_rent_does_not_resolve_the_deposit_cap():
+    previous_facts = terms_findings(extract_terms(PREVIOUS))
+    assert [f["preference_category"] for f in previous_facts] == ["budget", "deposit"]
+
+    # The rent sentence was reworded; the deposit is unchanged
+    revised = "The rent will increase from 4,000 NIS to 4,500 NIS per month. " \
+              "The Tenant shall provide a security deposit of 20,000 NIS."
+    resolved, carried = split_previous_facts(previous_facts, extract_terms(revised), revised)
+    assert resolved == []
+    assert [f["issue_name"] for f in carried] == ["Security deposit above the legal cap"]
+
+
+def test_deposit_within_the_cap_resolves_it():
+    previous_facts = terms_findings(extract_terms(PREVIOUS))
+    revised = "The monthly rent shall be 4,000 NIS. The Tenant shall provide a security deposit of 8,000 NIS."
+    resolved, carried = split_previous_facts(previous_facts, extract_terms(revised), revised)
+    assert [f["issue_name"] for f in resolved] == ["Security deposit above the legal cap"]
+    assert carried == []
@@ -0,0 +1,128 @@
+from clauses import segment_clauses, split_clauses
+from legal_retrieval import estimate_tokens
+from relevance import classify_clauses
+
+# Token-budget planner for the analysis requests: every request is sized up front (prompt
+# plus the answer expected from the number of clauses that can produce a finding), so the
+# prompt never exceeds the model's context and max_tokens leaves room for the whole
+# findings array. Text that does not fit one request is split into clause windows.
+
+# deepseek-chat limits
+CONTEXT_TOKENS = 65536
+MAX_OUTPUT_TOKENS = 8192
+MIN_OUTPUT_TOKENS = 1024
+# One finding object (quote, explanation, tip) is ~150-250 tokens
+TOKENS_PER_FINDING = 220
+OUTPUT_OVERHEAD_TOKENS = 64
+OUTPUT_SAFETY = 1.25
+# Missing protections a gap analysis usually returns
+GAP_FINDINGS = 5
+# A finding needs at least this much contract text (its 50-150 character quote and the sentence
+# around it) - bounds the estimate where most clauses match a category
+MIN_TOKENS_PER_FINDING = 50
+# A window that starts inside a clause split on lines repeats the previous piece, so the
+# sentences around the cut are seen together
+WINDOW_OVERLAP_PIECES = 1
+
+
+def expected_findings(contract_text, scope="full", clause_texts=None):
+    """
+    Findings a request is expected to return: one per clause that matches a finding
+    category (see relevance.classify_clauses), plus the missing protections for the
+    scopes that include the gap analysis.
+    """
+    gaps = GAP_FINDINGS if scope in ("full", "gaps", "revision") else 0
+    if scope == "gaps":
+        return gaps
+    if clause_texts is None:
+        clause_texts = [c["text"] for c in segment_clauses(contract_text)]
+    matching = sum(1 for scores in classify_clauses(clause_texts) if scores)
+    return _bounded(matching, len(contract_text)) + gaps
+
+
+def _bounded(matching, chars):
+    return min(matching, chars // 4 // MIN_TOKENS_PER_FINDING + 1)
+
+
+def output_budget(findings):
+    """
+    max_tokens for a request expected to return this many findings.
+    """
+    tokens = int(findings * TOKENS_PER_FINDING * OUTPUT_SAFETY) + OUTPUT_OVERHEAD_TOKENS
+    return max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, tokens))
+
+
+def plan_request(fixed_tokens, contract_text, scope="full"):
+    """
+    Size of one request: {"prompt_tokens", "expected_findings", "max_tokens", "fits"}.
+    fixed_tokens is the prompt without the contract (protocol, law, request header).
+    fits is False when the prompt and answer exceed the context or the answer exceeds MAX_OUTPUT_TOKENS.
+    """
+    findings = expected_findings(contract_text, scope)
+    needed = int(findings * TOKENS_PER_FINDING * OUTPUT_SAFETY) + OUTPUT_OVERHEAD_TOKENS
+    prompt_tokens = fixed_tokens + estimate_tokens(contract_text)
+    max_tokens = output_budget(findings)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "expected_findings": findings,
+        "max_tokens": max_tokens,
+        "fits": needed <= MAX_OUTPUT_TOKENS and prompt_tokens + max_tokens <= CONTEXT_TOKENS,
+    }
+
+
+def window_limits(fixed_tokens, max_chars):
+    """
+    (max_chars, max_findings) of one window: the shard size, lowered so that the prompt and
+    the largest answer fit the context, and the findings whose answer fits MAX_OUTPUT_TOKENS.
+    """
+    room = CONTEXT_TOKENS - fixed_tokens - MAX_OUTPUT_TOKENS
+    if room <= 0:
+        raise ValueError("The analysis prompt leaves no room for the contract - lower LEGAL_TOKEN_BUDGET")
+    max_findings = int((MAX_OUTPUT_TOKENS - OUTPUT_OVERHEAD_TOKENS) / OUTPUT_SAFETY / TOKENS_PER_FINDING)
+    return min(max_chars, room * 4), max_findings
+
+
+def build_windows(clauses, max_chars, max_findings, overlap=WINDOW_OVERLAP_PIECES):
+    """
+    Packs consecutive clauses (see clauses.segment_clauses; longer ones split on lines, see
+    clauses.split_clauses) into windows of at most max_chars characters and max_findings
+    expected findings. A window that starts inside a split clause repeats the last overlap
+    pieces of the previous one. Returns [(window_text, expected_findings)] in document order.
+    """
+    pieces, continued = [], []
+    for clause in clauses:
+        parts = split_clauses([clause], max_chars)
+        pieces.extend(parts)
+        continued.extend([False] + [True] * (len(parts) - 1))
+    matches = [bool(scores) for scores in classify_clauses(pieces)]
+
+    windows = []
+    start = 0
+    while start < len(pieces):
+        end, chars, matching = start, 0, 0
+        while end < len(pieces) and (end == start or (
+                chars + len(pieces[end]) <= max_chars
+                and _bounded(matching + matches[end], chars + len(pieces[end])) <= max_findings)):
+            chars += len(pieces[end])
+            matching += matches[end]
+            end += 1
+        windows.append(("".join(pieces[start:end]), _bounded(matching, chars)))
+        if end >= len(pieces):
+            break
+        # Step back for the overlap (only inside a split clause), but always advance
+        start = max(end - overlap, start + 1) if continued[end] else end
+    return windows
+
+
+def condense_for_gaps(clause_texts, max_tokens):
+    """
+    The contract for the gap analysis when it does not fit whole: every clause cut to the same
+    length (headings and first sentences, which say what each clause covers) within max_tokens.
+    Clauses past the budget (thousands of clauses) are cut off.
+    """
+    limit = max(80, max_tokens * 4 // max(len(clause_texts), 1))
+    condensed = []
+    for text in clause_texts:
+        text = " ".join(text.split())
+        condensed.append((text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " ...") + "\n")
+    return "".join(condensed)[:max_tokens * 4]
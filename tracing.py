@@ -0,0 +1,307 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Per-phase tracing of one analysis (extraction, retrieval, prompt build, LLM requests,
+# highlighting): wall time, token usage, page count and highlight hit rate.
+# Every finished span is logged as one JSON line and aggregated into process-wide
+# metrics, served locally by start_metrics_server() (Prometheus text and JSON).
+
+logger = logging.getLogger("rightrent.trace")
+
+PIPELINE_PHASES = ("extract", "retrieval", "prompt_build", "llm_request", "highlight")
+# Expected phase durations until real measurements exist (seconds)
+DEFAULT_PHASE_SECONDS = {"extract": 0.5, "retrieval": 0.1, "prompt_build": 0.01, "llm_request": 30.0, "highlight": 0.5}
+DEFAULT_COMPLETION_TOKENS = 1500
+METRICS_PORT = int(os.environ.get("RIGHTRENT_METRICS_PORT", "9464"))
+
+_current = contextvars.ContextVar("rightrent_trace", default=None)
+_metrics_lock = threading.Lock()
+metrics = {
+    "traces": 0,
+    "phases": {},
+    "llm_requests": 0,
+    "tokens": {"prompt": 0, "completion": 0, "cached": 0},
+    "pages": 0,
+    "highlight_quotes": {"anchored": 0, "unanchored": 0},
+}
+
+
+def usage_tokens(usage):
+    """
+    (prompt, completion, cached) tokens of an OpenAI-style usage object.
+    DeepSeek reports cache hits as prompt_cache_hit_tokens, OpenAI as prompt_tokens_details.cached_tokens.
+    """
+    if usage is None:
+        return 0, 0, 0
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    return usage.prompt_tokens or 0, usage.completion_tokens or 0, cached or 0
+
+
+def _record_metrics(record):
+    with _metrics_lock:
+        phase = metrics["phases"].setdefault(record["phase"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        phase["count"] += 1
+        phase["total_seconds"] = round(phase["total_seconds"] + record["seconds"], 4)
+        phase["max_seconds"] = max(phase["max_seconds"], record["seconds"])
+        attrs = record["attrs"]
+        if record["phase"] == "llm_request":
+            metrics["llm_requests"] += 1
+        metrics["pages"] += attrs.get("pages", 0)
+        if "anchored" in attrs:
+            metrics["highlight_quotes"]["anchored"] += attrs["anchored"]
+            metrics["highlight_quotes"]["unanchored"] += attrs["unanchored"]
+
+
+def expected_seconds(phase):
+    """
+    Mean measured duration of a phase in this process (default estimate before the first run).
+    """
+    with _metrics_lock:
+        stats = metrics["phases"].get(phase)
+        if stats and stats["count"]:
+            return stats["total_seconds"] / stats["count"]
+    return DEFAULT_PHASE_SECONDS.get(phase, 0.1)
+
+
+def expected_completion_tokens():
+    with _metrics_lock:
+        requests = metrics["llm_requests"]
+        completion = metrics["tokens"]["completion"]
+    # Requests without reported usage (e.g. coalesced followers) leave the average at 0
+    return completion / requests if requests and completion else DEFAULT_COMPLETION_TOKENS
+
+
+class Trace:
+    """
+    Spans and token usage of one analysis. Listeners get ("start" | "end", span record)
+    for spans on the thread that created the trace (so they may update the UI).
+    """
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.tokens = {"prompt": 0, "completion": 0, "cached": 0}
+        self.listeners = []
+        self.current_phase = None
+        self.current_started = None
+        self.started = time.perf_counter()
+        self._thread = threading.get_ident()
+        self._lock = threading.Lock()
+
+    def _notify(self, event, record):
+        if threading.get_ident() == self._thread:
+            for listener in self.listeners:
+                listener(event, record)
+
+    @contextmanager
+    def span(self, phase, **attrs):
+        started = time.perf_counter()
+        record = {"phase": phase, "attrs": attrs, "started": round(started - self.started, 4)}
+        if threading.get_ident() == self._thread:
+            self.current_phase, self.current_started = phase, started
+        self._notify("start", record)
+        try:
+            yield attrs
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 4)
+            with self._lock:
+                self.spans.append(record)
+            _record_metrics(record)
+            logger.info(json.dumps({"trace": self.name, **record}, default=str))
+            self._notify("end", record)
+
+    def record_usage(self, usage):
+        prompt, completion, cached = usage_tokens(usage)
+        with self._lock:
+            self.tokens["prompt"] += prompt
+            self.tokens["completion"] += completion
+            self.tokens["cached"] += cached
+
+    def progress(self, fraction=None):
+        """
+        Estimated completion 0..1 of the pipeline, from the measured phase durations.
+        fraction overrides the elapsed-time estimate of the current phase (e.g. tokens received).
+        """
+        weights = [expected_seconds(phase) for phase in PIPELINE_PHASES]
+        done = {record["phase"] for record in self.spans}
+        completed = sum(w for phase, w in zip(PIPELINE_PHASES, weights) if phase in done)
+        if self.current_phase in PIPELINE_PHASES and self.current_phase not in done:
+            weight = weights[PIPELINE_PHASES.index(self.current_phase)]
+            if fraction is None:
+                fraction = (time.perf_counter() - self.current_started) / weight if weight else 1.0
+            completed += weight * min(max(fraction, 0.0), 0.95)
+        return min(completed / sum(weights), 1.0)
+
+    def summary(self):
+        phases = {}
+        with self._lock:
+            for record in self.spans:
+                phases[record["phase"]] = round(phases.get(record["phase"], 0.0) + record["seconds"], 4)
+            tokens = dict(self.tokens)
+        return {
+            "name": self.name,
+            "attrs": self.attrs,
+            "seconds": round(time.perf_counter() - self.started, 4),
+            "phases": phases,
+            "tokens": tokens,
+        }
+
+
+@contextmanager
+def trace(name, **attrs):
+    """
+    Makes a new Trace current for the enclosed code (and the threads started with
+    contextvars.copy_context()). Logs its summary when it ends.
+    """
+    new_trace = Trace(name, **attrs)
+    token = _current.set(new_trace)
+    try:
+        yield new_trace
+    finally:
+        _current.reset(token)
+        with _metrics_lock:
+            metrics["traces"] += 1
+            for kind, count in new_trace.tokens.items():
+                metrics["tokens"][kind] += count
+        logger.info(json.dumps({"trace_summary": new_trace.summary()}, default=str))
+
+
+@contextmanager
+def span(phase, **attrs):
+    """
+    Times one phase in the current trace. Without a trace the phase still counts in the metrics.
+    Yields the span's attribute dict, so results (hit rate, pages) can be added to it.
+    """
+    current = _current.get()
+    if current is not None:
+        with current.span(phase, **attrs) as span_attrs:
+            yield span_attrs
+        return
+
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record = {"phase": phase, "attrs": attrs, "seconds": round(time.perf_counter() - started, 4)}
+        _record_metrics(record)
+        logger.info(json.dumps(record, default=str))
+
+
+def record_usage(usage):
+    """
+    Adds a response's token usage to the current trace (or directly to the metrics).
+    """
+    current = _current.get()
+    if current is not None:
+        current.record_usage(usage)
+        return
+    prompt, completion, cached = usage_tokens(usage)
+    with _metrics_lock:
+        metrics["tokens"]["prompt"] += prompt
+        metrics["tokens"]["completion"] += completion
+        metrics["tokens"]["cached"] += cached
+
+
+# Other components' metrics (name -> function returning a flat dict of numbers), e.g. the LLM gateway
+collectors = {}
+
+
+def register_collector(name, report):
+    collectors[name] = report
+
+
+def metrics_report():
+    with _metrics_lock:
+        report = json.loads(json.dumps(metrics))
+    for name, collect in list(collectors.items()):
+        report[name] = collect()
+    return report
+
+
+def prometheus_text():
+    report = metrics_report()
+    lines = [
+        "# TYPE rightrent_traces_total counter",
+        f"rightrent_traces_total {report['traces']}",
+        "# TYPE rightrent_phase_seconds_total counter",
+    ]
+    for phase, stats in report["phases"].items():
+        lines.append(f'rightrent_phase_seconds_total{{phase="{phase}"}} {stats["total_seconds"]}')
+    lines.append("# TYPE rightrent_phase_count_total counter")
+    for phase, stats in report["phases"].items():
+        lines.append(f'rightrent_phase_count_total{{phase="{phase}"}} {stats["count"]}')
+    lines.append("# TYPE rightrent_phase_max_seconds gauge")
+    for phase, stats in report["phases"].items():
+        lines.append(f'rightrent_phase_max_seconds{{phase="{phase}"}} {stats["max_seconds"]}')
+    lines += [
+        "# TYPE rightrent_llm_requests_total counter",
+        f"rightrent_llm_requests_total {report['llm_requests']}",
+        "# TYPE rightrent_tokens_total counter",
+    ]
+    for kind, count in report["tokens"].items():
+        lines.append(f'rightrent_tokens_total{{kind="{kind}"}} {count}')
+    lines += [
+        "# TYPE rightrent_pdf_pages_total counter",
+        f"rightrent_pdf_pages_total {report['pages']}",
+        "# TYPE rightrent_highlight_quotes_total counter",
+    ]
+    for result, count in report["highlight_quotes"].items():
+        lines.append(f'rightrent_highlight_quotes_total{{result="{result}"}} {count}')
+    for name in collectors:
+        for key, value in report.get(name, {}).items():
+            lines.append(f"rightrent_{name}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(metrics_report()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = prometheus_text().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=METRICS_PORT, host="127.0.0.1"):
+    """
+    Serves /metrics (Prometheus text) and /metrics.json on a daemon thread, once per process.
+    Returns the server, or None if the port is taken (e.g. by another app process).
+    """
+    global _metrics_server
+    with _metrics_lock:
+        if _metrics_server is not None:
+            return _metrics_server or None
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            # Not retried on every rerun
+            _metrics_server = False
+            logger.warning("metrics endpoint not started on %s:%s: %s", host, port, e)
+            return None
+        _metrics_server.daemon_threads = True
+    threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    logger.info("metrics on http://%s:%s/metrics", host, port)
+    return _metrics_server